@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+from common import Indicators, Columns, Signal
+from technical import UP, DOWN
+
+
+# Backtest of indicator outputs with array operations. A position (+1 long,
+# -1 short, 0 flat) is decided at the close of each bar and held until the
+# close of the bar it changes on, so bar i earns position[i - 1] *
+# (close[i] - close[i - 1]). Every unit traded pays spread / 2 plus the
+# commission, a reversal trades two units.
+#
+#   VWAP(data, [8, 16, 20], 0.6, 4, 4, 4)
+#   result = backtest(data, signal_position(data[Indicators.VWAP_SIGNAL]), spread=5.0)
+#   result['summary'], result['trades']
+#
+#   result = backtest_column(data, Indicators.SUPERTREND, spread=5.0)
+
+
+def signal_position(signal):
+    # LONG / SHORT signals (nan elsewhere) to the position, stop and reverse
+    # at every signal, flat before the first one
+    signal = np.asarray(signal, dtype=np.float64)
+    given = ~np.isnan(signal)
+    last = np.maximum.accumulate(np.where(given, np.arange(len(signal)), -1))
+    position = np.where(last >= 0, signal[np.maximum(last, 0)], 0.0)
+    return np.where(position == Signal.LONG, 1.0, np.where(position == Signal.SHORT, -1.0, 0.0))
+
+def trend_position(trend):
+    # UP / DOWN trend (SUPERTREND, ATR_TRAIL_TREND) to the position, flat
+    # where the trend is not defined
+    trend = np.asarray(trend, dtype=np.float64)
+    return np.where(trend == UP, 1.0, np.where(trend == DOWN, -1.0, 0.0))
+
+def backtest(data, position, spread=0.0, commission=0.0):
+    close = np.asarray(data[Columns.CLOSE], dtype=np.float64)
+    position = np.asarray(position, dtype=np.float64)
+    n = len(close)
+    if len(position) != n:
+        raise Exception('Dimension error')
+    unit_cost = spread / 2 + commission
+    pnl = np.zeros(n)
+    if n > 1:
+        pnl[1:] = np.nan_to_num(position[:-1] * np.diff(close))
+    traded = np.abs(np.diff(position, prepend=0.0))
+    cost = traded * unit_cost
+    equity = np.cumsum(pnl - cost)
+    drawdown = equity - np.maximum.accumulate(np.maximum(equity, 0.0))
+    trades = trade_list(data, position, close, unit_cost)
+    return {'pnl': pnl - cost, 'equity': equity, 'drawdown': drawdown, 'trades': trades, 'summary': summary(trades, equity, drawdown)}
+
+def backtest_column(data, column: str, spread=0.0, commission=0.0):
+    # VWAP_SIGNAL is a signal, SUPERTREND and ATR_TRAIL_TREND are trends
+    if column == Indicators.VWAP_SIGNAL:
+        position = signal_position(data[column])
+    else:
+        position = trend_position(data[column])
+    return backtest(data, position, spread=spread, commission=commission)
+
+def trade_list(data, position, close, unit_cost):
+    # one row per run of a non zero position, the last trade is open when
+    # the position is not flat at the end (no exit cost)
+    n = len(position)
+    if n == 0:
+        return pd.DataFrame(columns=['entry', 'exit', 'side', 'entry_price', 'exit_price', 'profit', 'closed'])
+    begin = np.flatnonzero(np.diff(position, prepend=0.0) != 0)
+    end = np.append(begin[1:], n - 1)
+    side = position[begin]
+    held = side != 0
+    begin = begin[held]
+    end = end[held]
+    side = side[held]
+    closed = position[end] != side
+    profit = side * (close[end] - close[begin]) - unit_cost * (1 + closed) * np.abs(side)
+    time = data[Columns.JST] if Columns.JST in data else np.arange(n)
+    if not isinstance(time, pd.Index):
+        time = np.asarray(time)
+    return pd.DataFrame({'entry': time[begin],
+                         'exit': time[end],
+                         'side': side,
+                         'entry_price': close[begin],
+                         'exit_price': close[end],
+                         'profit': profit,
+                         'closed': closed})
+
+def summary(trades, equity, drawdown):
+    profit = trades['profit'].to_numpy()
+    gain = profit[profit > 0].sum()
+    loss = -profit[profit < 0].sum()
+    return {'profit': equity[-1] if len(equity) > 0 else 0.0,
+            'trades': len(profit),
+            'win_rate': np.mean(profit > 0) if len(profit) > 0 else np.nan,
+            'profit_factor': gain / loss if loss > 0 else np.nan,
+            'max_drawdown': -drawdown.min() if len(drawdown) > 0 else 0.0}
+
+
+def test():
+    import time
+    from mt5_api import Mt5Api
+    from mt5_offline import SyntheticBackend
+    from technical import VWAP, ATR, SUPERTREND, ATR_TRAIL
+
+    api = Mt5Api(backend=SyntheticBackend(seed=1))
+    data = api.get_rates('NIKKEI', 'M1', 100000)
+    VWAP(data, [8, 16, 20], 0.6, 4, 4, 4)
+    ATR(data, 14, None)
+    SUPERTREND(data, 2.0)
+    ATR_TRAIL(data, 50, 2.0, 10)
+    for column in [Indicators.VWAP_SIGNAL, Indicators.SUPERTREND, Indicators.ATR_TRAIL_TREND]:
+        t0 = time.time()
+        result = backtest_column(data, column, spread=5.0)
+        print(column, result['summary'], 'Elapsed Time:', time.time() - t0)
+
+
+if __name__ == '__main__':
+    test()
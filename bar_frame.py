@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+from collections.abc import MutableMapping
+from dateutil import tz
+from common import Columns
+
+JST = tz.gettz('Asia/Tokyo')
+
+# typed bar columns, every other column is an indicator
+BAR_COLUMNS = { Columns.OPEN: np.float64,
+                Columns.HIGH: np.float64,
+                Columns.LOW: np.float64,
+                Columns.CLOSE: np.float64,
+                Columns.VOLUME: np.int64}
+
+
+def to_epoch(times):
+    # int64 unix seconds from datetimes, numpy datetime64 or epoch numbers
+    if isinstance(times, (pd.DatetimeIndex, pd.Series)):
+        # utc datetime64 values, whatever the timezone and resolution
+        times = pd.DatetimeIndex(times).values
+    times = np.asarray(times)
+    if np.issubdtype(times.dtype, np.datetime64):
+        return times.astype('datetime64[s]').astype(np.int64)
+    if np.issubdtype(times.dtype, np.number):
+        return times.astype(np.int64)
+    return np.fromiter((t.timestamp() for t in times), dtype=np.float64, count=len(times)).astype(np.int64)
+
+
+class BarFrame(MutableMapping):
+    # Bars as typed numpy columns: epoch (int64 utc seconds), open, high,
+    # low, close (float64), tick_volume (int64) and the indicator columns
+    # technical.* add, registered in `indicators` in the order they were
+    # added. It reads and writes like the dict of columns used before:
+    # frame['close'], frame['VWAP'] = values, keys(), items(). 'time' (utc)
+    # and 'jst' are tz aware DatetimeIndex derived from epoch on first use.
+    # Slices are views sharing memory with the frame they come from.
+    def __init__(self, epoch, columns=None):
+        self.epoch = np.asarray(epoch, dtype=np.int64)
+        self.columns = {}
+        self.indicators = []
+        self.times = None
+        if columns is not None:
+            for key, value in columns.items():
+                self[key] = value
+
+    @staticmethod
+    def from_dict(dic, time_column=Columns.TIME):
+        if isinstance(dic, BarFrame):
+            return dic
+        columns = {key: value for key, value in dic.items() if key not in [Columns.TIME, Columns.JST, time_column]}
+        return BarFrame(to_epoch(dic[time_column]), columns)
+
+    @property
+    def size(self):
+        return len(self.epoch)
+
+    @property
+    def time(self):
+        if self.times is None:
+            utc = pd.to_datetime(self.epoch, unit='s', utc=True)
+            self.times = (utc, utc.tz_convert(JST))
+        return self.times[0]
+
+    @property
+    def jst(self):
+        self.time
+        return self.times[1]
+
+    def __getitem__(self, key):
+        if key == Columns.TIME:
+            return self.time
+        if key == Columns.JST:
+            return self.jst
+        return self.columns[key]
+
+    def __setitem__(self, key, value):
+        if key in [Columns.TIME, Columns.JST]:
+            raise Exception('Time columns are derived from epoch')
+        dtype = BAR_COLUMNS.get(key)
+        if dtype is not None:
+            array = np.ascontiguousarray(value, dtype=dtype)
+        else:
+            array = np.asarray(value)
+            if array.dtype == object:
+                array = array.astype(np.float64)
+        if len(array) != self.size:
+            raise Exception('Dimension error')
+        if dtype is None and key not in self.columns:
+            self.indicators.append(key)
+        self.columns[key] = array
+
+    def __delitem__(self, key):
+        if key not in self.indicators:
+            raise Exception('Only indicator columns can be removed')
+        self.indicators.remove(key)
+        del self.columns[key]
+
+    def __iter__(self):
+        yield Columns.TIME
+        yield Columns.JST
+        for key in self.columns.keys():
+            yield key
+
+    def __len__(self):
+        return len(self.columns) + 2
+
+    def __contains__(self, key):
+        return key in [Columns.TIME, Columns.JST] or key in self.columns
+
+    def register(self, key, dtype=np.float64):
+        # empty (nan) indicator column
+        if key not in self.columns:
+            self[key] = np.full(self.size, np.nan, dtype=dtype)
+        return self.columns[key]
+
+    def slice(self, begin: int, end: int):
+        frame = BarFrame(self.epoch[begin: end])
+        frame.columns = {key: array[begin: end] for key, array in self.columns.items()}
+        frame.indicators = list(self.indicators)
+        if self.times is not None:
+            frame.times = (self.times[0][begin: end], self.times[1][begin: end])
+        return frame
+
+    def slice_last(self, length: int):
+        return self.slice(max(self.size - length, 0), self.size)
+
+    def copy(self):
+        frame = BarFrame(self.epoch.copy())
+        frame.columns = {key: array.copy() for key, array in self.columns.items()}
+        frame.indicators = list(self.indicators)
+        frame.times = self.times
+        return frame
+
+    def to_dict(self):
+        return dict(self.items())
+
+
+def concat(frames):
+    # the columns all frames have, in a new frame
+    columns = [key for key in frames[0].columns.keys() if all(key in frame.columns for frame in frames)]
+    epoch = np.concatenate([frame.epoch for frame in frames])
+    return BarFrame(epoch, {key: np.concatenate([frame.columns[key] for frame in frames]) for key in columns})
+
+
+def test():
+    frame = BarFrame([1717376400, 1717376460, 1717376520], {'open': [1, 2, 3], 'high': [2, 3, 4], 'low': [0, 1, 2], 'close': [2, 3, 4], 'tick_volume': [10, 20, 30]})
+    frame['MA'] = [np.nan, 2.5, 3.5]
+    last = frame.slice_last(2)
+    last['close'][-1] = 5
+    print(frame.indicators, list(frame.keys()), frame['close'], last['jst'])
+    print(pd.DataFrame(frame.to_dict()))
+
+
+if __name__ == '__main__':
+    test()
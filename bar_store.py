@@ -0,0 +1,105 @@
+import os
+import numpy as np
+from bar_frame import BarFrame
+from common import Columns
+
+
+# Bar history on disk, one directory per (symbol, timeframe) holding a raw
+# little endian file per column. Files are only appended to, so readers
+# (another process included) always see a consistent prefix. load() maps
+# the files into memory (np.memmap) and returns a BarFrame without reading
+# or parsing rows, pages are read when the columns are touched.
+#
+#   store = BarStore('./bars')
+#   api = Mt5Api(store=store)                   # reads through the store
+#   frame = store.load('NIKKEI', 'M1')          # whole history
+#   frame.slice_last(100000)
+
+EPOCH = 'epoch'
+# epoch is written last, so it never counts a bar whose columns are missing
+STORE_COLUMNS = {   Columns.OPEN: np.dtype('<f8'),
+                    Columns.HIGH: np.dtype('<f8'),
+                    Columns.LOW: np.dtype('<f8'),
+                    Columns.CLOSE: np.dtype('<f8'),
+                    Columns.VOLUME: np.dtype('<i8'),
+                    EPOCH: np.dtype('<i8')}
+
+
+class BarStore:
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, symbol: str, timeframe: str, column: str):
+        return os.path.join(self.directory, symbol + '_' + timeframe, column + '.bin')
+
+    def count(self, symbol: str, timeframe: str):
+        # bars completely written in every column
+        counts = []
+        for column, dtype in STORE_COLUMNS.items():
+            path = self.path(symbol, timeframe, column)
+            if not os.path.exists(path):
+                return 0
+            counts.append(os.path.getsize(path) // dtype.itemsize)
+        return min(counts)
+
+    def load(self, symbol: str, timeframe: str):
+        n = self.count(symbol, timeframe)
+        columns = {}
+        for column, dtype in STORE_COLUMNS.items():
+            if n == 0:
+                columns[column] = np.zeros(0, dtype=dtype)
+            else:
+                columns[column] = np.memmap(self.path(symbol, timeframe, column), dtype=dtype, mode='r', shape=(n,))
+        epoch = columns.pop(EPOCH)
+        return BarFrame(epoch, columns)
+
+    def last_epoch(self, symbol: str, timeframe: str):
+        n = self.count(symbol, timeframe)
+        if n == 0:
+            return None
+        dtype = STORE_COLUMNS[EPOCH]
+        with open(self.path(symbol, timeframe, EPOCH), 'rb') as f:
+            f.seek((n - 1) * dtype.itemsize)
+            return int(np.frombuffer(f.read(dtype.itemsize), dtype=dtype)[0])
+
+    def append(self, symbol: str, timeframe: str, frame: BarFrame):
+        # writes the bars after the last stored one, returns their number
+        n = self.count(symbol, timeframe)
+        begin = 0
+        if n > 0:
+            begin = int(np.searchsorted(frame.epoch, self.last_epoch(symbol, timeframe), side='right'))
+        if begin >= frame.size:
+            return 0
+        os.makedirs(os.path.dirname(self.path(symbol, timeframe, EPOCH)), exist_ok=True)
+        for column, dtype in STORE_COLUMNS.items():
+            if column == EPOCH:
+                values = frame.epoch[begin:]
+            else:
+                values = frame.columns[column][begin:]
+            path = self.path(symbol, timeframe, column)
+            with open(path, 'ab') as f:
+                if f.tell() != n * dtype.itemsize:
+                    # left over from an interrupted append
+                    f.truncate(n * dtype.itemsize)
+                    f.seek(0, os.SEEK_END)
+                f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+        return frame.size - begin
+
+
+def test():
+    import time
+    import tempfile
+    from mt5_api import Mt5Api, TimeFrame
+    from mt5_offline import SyntheticBackend
+
+    directory = tempfile.mkdtemp()
+    backend = SyntheticBackend(seed=1)
+    api = Mt5Api(backend=backend, store=BarStore(directory))
+    api.get_rates('NIKKEI', TimeFrame.M1, 500000)
+    t0 = time.time()
+    frame = BarStore(directory).load('NIKKEI', TimeFrame.M1)
+    print('bars', frame.size, frame['jst'][-1], 'Elapsed Time:', time.time() - t0)
+
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,181 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+import warnings
+import numpy as np
+
+from common import Indicators, Columns
+from mt5_api import Mt5Api, TimeFrame
+from mt5_offline import SyntheticBackend
+from technical import VWAP, BB, BBRATE, ATR, ADX, POLARITY, ATR_TRAIL, SUPERTREND
+from technical import slope, linearity, pivot2, vwap_pivot
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+# Indicator benchmarks on synthetic M1 bars (SyntheticBackend).
+#
+#   python benchmark.py                          time all indicators
+#   python benchmark.py --save                   store the result as baseline
+#                                                (benchmark_baseline.json)
+#   python benchmark.py --threshold 0.3          fail (exit 1) when time or peak
+#                                                memory per bar is 30% above
+#                                                the baseline
+#   python benchmark.py --sizes 1000 10000 --indicators VWAP ADX
+#
+# Timings are absolute, they only compare on the configuration they were
+# recorded on (cpu, python, numpy and numba versions, numba installed or
+# not). The baseline stores its configuration and the comparison is
+# refused (exit 2) on any other one: re-record the baseline with --save on
+# the machine that runs the check, and again after upgrading numpy/numba.
+
+SIZES = [1000, 10000, 100000, 1000000]
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+VWAP_PARAM = ([8, 16, 20], 0.6, 4, 4, 4)
+
+
+def prepare_atr(data):
+    ATR(data, 14, None)
+
+def prepare_vwap(data):
+    VWAP(data, *VWAP_PARAM)
+
+BENCHMARKS = {
+    'VWAP': (None, lambda data: VWAP(data, *VWAP_PARAM)),
+    'BB': (None, lambda data: BB(data, 20, 20, 2.0)),
+    'BBRATE': (None, lambda data: BBRATE(data, 20, 20)),
+    'ADX': (prepare_atr, lambda data: ADX(data, 14, 14, 100)),
+    'POLARITY': (prepare_atr, lambda data: POLARITY(data, 14)),
+    'ATR_TRAIL': (None, lambda data: ATR_TRAIL(data, 50, 2.0, 10)),
+    'SUPERTREND': (prepare_atr, lambda data: SUPERTREND(data, 2.0)),
+    'slope': (None, lambda data: slope(data[Columns.CLOSE], 10, 1)),
+    'linearity': (None, lambda data: linearity(data[Columns.CLOSE], 10)),
+    'pivot2': (prepare_vwap, lambda data: pivot2(data[Indicators.VWAP_UP], 0.6)),
+    'vwap_pivot': (prepare_vwap, lambda data: vwap_pivot(data[Indicators.VWAP_RATE], 0.6, 4, 4, 4)),
+}
+
+
+def cpu_name():
+    if os.path.exists('/proc/cpuinfo'):
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    return platform.processor()
+
+def configuration():
+    return {'cpu': cpu_name(),
+            'cpu_count': os.cpu_count(),
+            'system': platform.system(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'numba': None if numba is None else numba.__version__}
+
+def synthetic_data(size: int, seed=0):
+    api = Mt5Api(backend=SyntheticBackend(seed=seed), cache_series=1)
+    return api.download_rates('BENCH', TimeFrame.M1, size)
+
+def measure(name: str, data: dict, repeat: int):
+    # one untimed run first (imports, numba cache loading, allocator warm
+    # up), then the median of repeat timed runs
+    prepare, function = BENCHMARKS[name]
+    elapsed = []
+    for i in range(repeat + 1):
+        dic = data.copy()
+        if prepare is not None:
+            prepare(dic)
+        t0 = time.perf_counter()
+        function(dic)
+        if i > 0:
+            elapsed.append(time.perf_counter() - t0)
+    dic = data.copy()
+    if prepare is not None:
+        prepare(dic)
+    tracemalloc.start()
+    function(dic)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return float(np.median(elapsed)), peak
+
+def run(names, sizes, repeat: int):
+    result = {}
+    for size in sizes:
+        data = synthetic_data(size)
+        for name in names:
+            elapsed, peak = measure(name, data, repeat)
+            key = name + '@' + str(size)
+            result[key] = {'indicator': name,
+                           'bars': size,
+                           'seconds': elapsed,
+                           'usec_per_bar': elapsed / size * 1e6,
+                           'peak_bytes': peak,
+                           'bytes_per_bar': peak / size}
+            print('{:12s} {:>8d} bars {:10.4f} s {:10.3f} us/bar {:10.1f} MB peak'.format(
+                    name, size, elapsed, elapsed / size * 1e6, peak / 1024 / 1024))
+            sys.stdout.flush()
+    return result
+
+def compare(result: dict, baseline: dict, threshold: float):
+    # per bar time and memory above baseline * (1 + threshold)
+    regressions = []
+    for key, current in result.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for column in ['usec_per_bar', 'bytes_per_bar']:
+            if current[column] > base[column] * (1.0 + threshold):
+                regressions.append((key, column, base[column], current[column]))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='technical.py benchmarks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--indicators', nargs='+', default=list(BENCHMARKS.keys()), choices=list(BENCHMARKS.keys()))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--save', action='store_true', help='store the result as baseline')
+    args = parser.parse_args(argv)
+
+    warnings.simplefilter('ignore', RuntimeWarning)
+    config = configuration()
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    # results of another configuration are dropped (--save) or not compared
+    same = baseline.get('configuration') == config
+    if not args.save:
+        if len(baseline.get('results', {})) == 0:
+            print('No baseline', args.baseline)
+            return 0
+        if not same:
+            print('Baseline recorded on another configuration, re-record it with --save')
+            print('  baseline', baseline.get('configuration'))
+            print('  current ', config)
+            return 2
+    result = run(args.indicators, args.sizes, args.repeat)
+    if args.save:
+        if not same:
+            baseline = {'configuration': config, 'results': {}}
+        baseline['results'].update(result)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print('Baseline saved', args.baseline)
+        return 0
+    baseline = baseline['results']
+    regressions = compare(result, baseline, args.threshold)
+    for key, column, base, current in regressions:
+        print('Regression', key, column, '{:.3f} -> {:.3f} ({:+.0f}%)'.format(base, current, (current / base - 1) * 100))
+    return 1 if len(regressions) > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,7 +4,6 @@ Created on Thu Dec 14 19:59:00 2023
 
 @author: docs9
 """
-import MetaTrader5 as mt5
 
 
 HOLD = 0
@@ -22,6 +21,7 @@ class Columns:
     HIGH = 'high'
     LOW = 'low'
     CLOSE = 'close'    
+    VOLUME = 'tick_volume'
     ASK = 'ask'
     BID = 'bid'
     MID = 'mid'
@@ -37,14 +37,15 @@ class TimeFrame:
     D1 = 'D1'
     W1 = 'W1'
     
-    timeframes = {  M1: mt5.TIMEFRAME_M1, 
-                    M5: mt5.TIMEFRAME_M5,
-                    M15: mt5.TIMEFRAME_M15,
-                    M30: mt5.TIMEFRAME_M30,
-                    H1: mt5.TIMEFRAME_H1,
-                    H4: mt5.TIMEFRAME_H4,
-                    D1: mt5.TIMEFRAME_D1,
-                    W1: mt5.TIMEFRAME_W1}
+    # values of mt5.TIMEFRAME_*
+    timeframes = {  M1: 1, 
+                    M5: 5,
+                    M15: 15,
+                    M30: 30,
+                    H1: 16385,
+                    H4: 16388,
+                    D1: 16408,
+                    W1: 32769}
             
     @staticmethod 
     def const(timeframe_str: str):
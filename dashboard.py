@@ -14,6 +14,11 @@ import numpy as np
 import pandas as pd
 from datetime import datetime, date
 import time
+import uuid
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 import dash
 import dash_bootstrap_components as dbc
@@ -21,15 +26,19 @@ from dash import Dash, dcc, html, dash_table
 from dash.dependencies import Input, Output, State
 
 import plotly
+import plotly.subplots
 import plotly.graph_objs as go
-from plotly.figure_factory import create_candlestick
 
 from ta.trend import MACD
 from ta.momentum import StochasticOscillator
-from technical import VWAP, BB, ATR_TRAIL, ADX
+from common import Indicators
+from pipeline import BARS, compute_columns
 
-from utils import Utils
 from mt5_api import Mt5Api
+from bar_store import BarStore
+from bar_frame import BarFrame, to_epoch
+from downsample import downsample
+from poller import Poller, frozen
 
 TICKERS = ['NIKKEI', 'DOW', 'NSDQ', 'USDJPY']
 TIMEFRAMES = ['M1', 'M5', 'M15', 'M30', 'H1', 'H4', 'D1']
@@ -38,6 +47,14 @@ HOURS = list(range(0, 24))
 MINUTES = list(range(0, 60))
 
 INTERVAL_MSEC = 30 * 1000
+# bar history kept between restarts
+BAR_STORE_DIR = './bars'
+CHART_WIDTH = 1100
+# line traces are drawn with WebGL above this number of bars
+WEBGL_POINTS = 1000
+# line indicators are downsampled (LTTB) to about one point per pixel,
+# candles, volume and signal markers are always drawn bar by bar
+LINE_POINTS = CHART_WIDTH
 
 technical_param1 = {'vwap_begin_hour_list': [8, 16, 20], 
                     'pivot_threshold':0.6, 
@@ -49,7 +66,24 @@ technical_param2 = {'atr_window': 50, 'atr_multiply': 2.0, 'peak_hold_term': 10}
 VWAP_BEGIN_HOUR = [8, 16, 20]
 VWAP_BEGIN_HOUR_FX = [8]
 
-api = Mt5Api()
+# the terminal is connected on first use (get_api), assign api before to
+# use another backend, e.g. Mt5Api(backend=SyntheticBackend())
+api = None
+api_lock = threading.Lock()
+# the indicators of each panel are computed in a process of its own
+# (compute_indicators), the two panels compute in parallel and the GIL of
+# this process stays free. A process keeps the indicator cache (Pipeline)
+# of its panel between calls. The chart panels are built in threads, the
+# figures (plotly) are built under the GIL.
+executor = ThreadPoolExecutor(max_workers=2)
+compute_pools = [None, None]
+pool_lock = threading.Lock()
+# bars and indicators of the shown panels are refreshed in the background
+# on their own threads, update_chart only reads the latest snapshot and
+# builds the figures
+POLL_SECONDS = 5
+poll_executor = ThreadPoolExecutor(max_workers=4)
+poller = Poller(POLL_SECONDS, 3 * INTERVAL_MSEC / 1000, poll_executor)
 app = Dash(__name__, external_stylesheets=[dbc.themes.FLATLY])
 
 # ----
@@ -140,7 +174,7 @@ contents = html.Div([
                                 ],
                                 style={"height": "3vh"}, className='bg-primary text-white'),
                         dbc.Row([
-                                    html.Div(id='chart'),
+                                    html.Div(id='chart', children=[dcc.Graph(id='graph1'), dcc.Graph(id='graph2')]),
                                 ],
                                 style={"height": "400vh"}, className='bg-white'),
                         dbc.Row([
@@ -148,6 +182,9 @@ contents = html.Div([
                                 ],
                                 #style={"height": "20vh"}, className='bg-primary text-white'
                                 ),
+                        # version of the figure each graph shows, kept per client
+                        dcc.Store(id='figure_version1'),
+                        dcc.Store(id='figure_version2'),
                         dcc.Interval(
                                         id='timer',
                                         interval=INTERVAL_MSEC,
@@ -167,8 +204,125 @@ app.layout = dbc.Container([
 
 # -----
 
+class PanelState:
+    # What one client shows in one graph: the key (symbol, timeframe,
+    # parameters), the bar times, the series of each trace and the layout.
+    # Traces on the bar axis (x is the time column) are patched point by
+    # point, the others (markers) are replaced whole when they change.
+    def __init__(self, key, epoch, series, layout):
+        self.key = key
+        self.epoch = epoch
+        self.series = series
+        self.layout = layout
+    
+    def shift(self, key, epoch):
+        # number of bars the chart moved, None when it has to be rebuilt
+        if key != self.key or len(epoch) != len(self.epoch) or len(epoch) == 0:
+            return None
+        i = int(np.searchsorted(epoch, self.epoch[-1]))
+        if i >= len(epoch) or epoch[i] != self.epoch[-1]:
+            return None
+        shift = len(epoch) - 1 - i
+        if shift > len(epoch) // 2:
+            return None
+        return shift
+    
+    def patch(self, jst, shift, series, layout):
+        n = len(jst)
+        patch = dash.Patch()
+        for t, (old, new) in enumerate(zip(self.series, series)):
+            if new['x'] is not jst:
+                if not (equal(old['x'], new['x']) and equal(old['y'], new['y'])):
+                    patch['data'][t]['x'] = to_list(new['x'])
+                    patch['data'][t]['y'] = to_list(new['y'])
+                continue
+            for key, values in new.items():
+                parent = patch['data'][t]
+                names = key.split('.')
+                for name in names[:-1]:
+                    parent = parent[name]
+                prop = parent[names[-1]]
+                index = []
+                if key != 'x':
+                    # old points still on the chart against their new values
+                    index = np.flatnonzero(~equal_values(old[key][shift:], values[:n - shift]))
+                    if len(index) > n // 4:
+                        parent[names[-1]] = to_list(values)
+                        continue
+                for i in range(shift):
+                    del prop[0]
+                for i in index:
+                    prop[int(i)] = to_list(values[i: i + 1])[0]
+                if shift > 0:
+                    prop.extend(to_list(values[n - shift:]))
+        if layout['title'] != self.layout['title']:
+            patch['layout']['title']['text'] = layout['title']
+        xaxis = layout['xaxis']
+        if xaxis['ticktext'] != self.layout['xaxis']['ticktext']:
+            patch['layout']['xaxis']['ticktext'] = xaxis['ticktext']
+            patch['layout']['xaxis']['tickvals'] = xaxis['tickvals']
+        return patch
+
+
+class PanelStates:
+    # The states rendered for one graph by version. Every client keeps the
+    # version of the figure it shows in a dcc.Store and sends it with the
+    # next request, the figure is patched (dash Patch) when the server still
+    # holds that version and sent whole otherwise (page load, unknown or
+    # evicted version). Tabs have their own versions, and a lost response
+    # leaves the client on its old version, which is patched again.
+    def __init__(self, size=32):
+        self.size = size
+        self.states = OrderedDict()
+        self.lock = threading.Lock()
+
+    def render(self, version, key, jst, series, layout, build):
+        # returns the figure (or Patch) and its version
+        epoch = to_epoch(jst)
+        with self.lock:
+            state = self.states.get(version)
+            if state is not None:
+                self.states.move_to_end(version)
+        shift = None if state is None else state.shift(key, epoch)
+        if shift is None:
+            out = build(series)
+            out['layout'].update(layout)
+        else:
+            out = state.patch(jst, shift, series, layout)
+        version = uuid.uuid4().hex
+        with self.lock:
+            self.states[version] = PanelState(key, epoch, series, layout)
+            while len(self.states) > self.size:
+                self.states.popitem(last=False)
+        return out, version
+
+def to_list(values):
+    # plain lists, plotly sends numpy arrays as binary blocks which Patch
+    # operations can't index into
+    if isinstance(values, list):
+        return values
+    return np.asarray(values).tolist()
+
+def equal_values(a, b):
+    a = np.asarray(a)
+    b = np.asarray(b)
+    same = a == b
+    if a.dtype.kind == 'f' and b.dtype.kind == 'f':
+        same |= np.isnan(a) & np.isnan(b)
+    return same
+
+def equal(a, b):
+    return len(a) == len(b) and bool(np.all(equal_values(a, b)))
+
+panel_states = [PanelStates(), PanelStates()]
+CHART1_INDICATORS = [Indicators.VWAP_UPPER + '3', Indicators.VWAP_SLOPE, Indicators.VWAP_RATE, Indicators.VWAP_SIGNAL, Indicators.VWAP_UP]
+CHART2_INDICATORS = [Indicators.ATR_TRAIL_UP]
+
 @app.callback(
-    Output('chart', 'children'),
+    Output('graph1', 'figure'),
+    Output('graph2', 'figure'),
+    Output('figure_version1', 'data'),
+    Output('figure_version2', 'data'),
     Input('timer', 'n_intervals'),
     
     State('symbol_dropdown1', 'value'), 
@@ -180,7 +334,9 @@ app.layout = dbc.Container([
     State('barsize_dropdown2', 'value'),
     State('atr_window', 'value'), 
     State('atr_multiply', 'value'), 
-    State('peak_hold_term', 'value')
+    State('peak_hold_term', 'value'),
+    State('figure_version1', 'data'),
+    State('figure_version2', 'data')
 )
 def update_chart(interval,
                  symbol1,
@@ -191,39 +347,81 @@ def update_chart(interval,
                  num_bars2,
                  atr_window,
                  atr_multiply,
-                 peak_hold_term
+                 peak_hold_term,
+                 version1,
+                 version2
                  ):
 
     
     num_bars1 = int(num_bars1)
-    data1 = api.get_rates(symbol1, timeframe1, num_bars1 + 60 * 8)
-    fig1 = create_chart1(symbol1, data1, num_bars1)
-
     technical_param2['atr_window'] = atr_window
     technical_param2['atr_multiply'] = atr_multiply
     technical_param2['peak_hold_term'] = peak_hold_term
-    
     num_bars2 = int(num_bars2)
-    data2 = api.get_rates(symbol2, timeframe2, num_bars2 + 60 * 8)
-    fig2 = create_chart2(data2, num_bars2)
-    return create_graph(symbol1, timeframe1, fig1, data1), create_graph(symbol2, timeframe2, fig2, data2)
+    
+    future1 = executor.submit(panel1, symbol1, timeframe1, num_bars1, dict(technical_param1), version1)
+    future2 = executor.submit(panel2, symbol2, timeframe2, num_bars2, dict(technical_param2), version2)
+    figure1, version1 = future1.result()
+    figure2, version2 = future2.result()
+    return figure1, figure2, version1, version2
+
+def panel1(symbol, timeframe, num_bars, param, version):
+    # version: of the figure the client shows, None on a page load
+    key = (symbol, timeframe, num_bars, str(param))
+    data = poller.get((1, ) + key, lambda: load1(symbol, timeframe, num_bars, param)).value
+    jst, series = chart1_series(data, num_bars)
+    layout = graph_layout(symbol, timeframe, data)
+    return panel_states[0].render(version, key, jst, series, layout, lambda s: create_chart1(symbol, timeframe, s))
+
+def panel2(symbol, timeframe, num_bars, param, version):
+    key = (symbol, timeframe, num_bars, str(param))
+    data = poller.get((2, ) + key, lambda: load2(symbol, timeframe, num_bars, param)).value
+    jst, series = chart2_series(data, num_bars)
+    layout = graph_layout(symbol, timeframe, data)
+    return panel_states[1].render(version, key, jst, series, layout, lambda s: create_chart2(symbol, timeframe, s))
+
+def get_api():
+    global api
+    with api_lock:
+        if api is None:
+            api = Mt5Api(store=BarStore(BAR_STORE_DIR), resample=True)
+        return api
+
+def load1(symbol, timeframe, num_bars, param):
+    t0 = time.time()
+    data = get_api().get_rates(symbol, timeframe, num_bars + 60 * 8)
+    pid, t1, t2 = indicators1(symbol, timeframe, data, param)
+    print('Elapsed Time:', time.time() - t0, 'compute', t2 - t1, 'pid', pid)
+    return frozen(data)
+
+def load2(symbol, timeframe, num_bars, param):
+    t0 = time.time()
+    data = get_api().get_rates(symbol, timeframe, num_bars + 60 * 8)
+    pid, t1, t2 = compute_indicators(1, (symbol, timeframe), data, CHART2_INDICATORS, param)
+    print('Elapsed Time2:', time.time() - t0, 'compute', t2 - t1, 'pid', pid)
+    return frozen(data)
 
-def indicators1(symbol, data, param):
+def indicators1(symbol, timeframe, data, param):
     if symbol.lower() == 'usdjpy':
-        hours = VWAP_BEGIN_HOUR_FX
-    else:
-        hours = param['vwap_begin_hour_list']
-    
-    VWAP(data,
-         hours,
-         param['pivot_threshold'],
-         param['pivot_left_len'],
-         param['pivot_center_len'],
-         param['pivot_right_len']
-         )
-    #ADX(data, 20, 20, 100)
+        param = dict(param)
+        param['vwap_begin_hour_list'] = VWAP_BEGIN_HOUR_FX
+    return compute_indicators(0, (symbol, timeframe), data, CHART1_INDICATORS, param)
+
+def compute_indicators(panel, key, data, names, param):
+    # indicators in the process of panel (only stale nodes are recomputed
+    # there), returns the span (pid, start, end) of the computation
+    with pool_lock:
+        if compute_pools[panel] is None:
+            # spawn as on Windows, the poller threads are not forked
+            compute_pools[panel] = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+        pool = compute_pools[panel]
+    bars = BarFrame(data.epoch, {column: data[column] for column in BARS})
+    columns, span = pool.submit(compute_columns, key, bars, names, param).result()
+    for name, value in columns.items():
+        data[name] = value
+    return span
     
-def create_markers(time, signal, data, value, symbol, color):
+def marker_points(time, signal, data, value):
     x = []
     y = []
     for t, s, d in zip(time, signal, data) :
@@ -232,27 +430,55 @@ def create_markers(time, signal, data, value, symbol, color):
         if s == value:
             x.append(t)
             y.append(d)
+    return {'x': x, 'y': y}
+    
+def create_markers(points, symbol, color):
     #print('Marker ', symbol, x, y)
     markers = go.Scatter(
                             mode='markers',
-                            x=x,
-                            y=y,
+                            x=points['x'],
+                            y=points['y'],
                             opacity=0.9,
                             marker_symbol=symbol,
                             marker=dict(color=color, size=20, line=dict(color='White', width=2)),
                             showlegend=False
                         )
     return markers
-       
 
-def create_chart1(symbol, data, num_bars):
-    t0 = time.time()
-    indicators1(symbol, data, technical_param1)
-    data = Utils.sliceDictLast(data, num_bars)
+def line_points(jst, vector):
+    if len(vector) <= LINE_POINTS:
+        return {'x': jst, 'y': vector}
+    index = downsample(vector, LINE_POINTS)
+    return {'x': jst[index], 'y': np.asarray(vector)[index]}
+
+def line_trace(n):
+    if n > WEBGL_POINTS:
+        return go.Scattergl
+    return go.Scatter
+
+def volume_colors(data):
+    return np.where(data['open'] - data['close'] >= 0, 'green', 'red')
+
+def chart1_series(data, num_bars):
+    # columns of each trace of chart1, in trace order
+    data = data.slice_last(num_bars)
     jst = data['jst']
-    n = len(jst)
-    print('Elapsed Time:', time.time() - t0)
-    #print(time[:5])
+    series = [{'x': jst, 'open': data['open'], 'high': data['high'], 'low': data['low'], 'close': data['close']}]
+    for i in range(1, 4):
+        series.append(line_points(jst, data['VWAP_UPPER' + str(i)]))
+        series.append(line_points(jst, data['VWAP_LOWER' + str(i)]))
+    series.append({'x': jst, 'y': data['tick_volume'], 'marker.color': volume_colors(data)})
+    series.append(line_points(jst, data['VWAP_SLOPE']))
+    series.append(line_points(jst, data['VWAP_RATE']))
+    series.append(marker_points(jst, data['VWAP_SIGNAL'], data['VWAP_RATE'], 1))
+    series.append(marker_points(jst, data['VWAP_SIGNAL'], data['VWAP_RATE'], -1))
+    series.append(line_points(jst, data['VWAP_UP']))
+    series.append(line_points(jst, data['VWAP_DOWN']))
+    return jst, series
+
+def create_chart1(symbol, timeframe, series):
+    candle, upper1, lower1, upper2, lower2, upper3, lower3, volume, vwap_slope, vwap_rate, up_markers, down_markers, vwap_up, vwap_down = series
+    Line = line_trace(len(candle['x']))
     # Declare plotly figure (go)
     fig=go.Figure()
 
@@ -261,38 +487,39 @@ def create_chart1(symbol, data, num_bars):
                     vertical_spacing=0.01, 
                     row_heights=[0.5, 0.1, 0.2,  0.2, 0.1])
 
-    fig.add_trace(go.Candlestick(x=jst,
-                    open=data['open'],
-                    high=data['high'],
-                    low=data['low'],
-                    close=data['close'], name = 'market data'))
+    fig.add_trace(go.Candlestick(x=to_list(candle['x']),
+                    open=to_list(candle['open']),
+                    high=to_list(candle['high']),
+                    low=to_list(candle['low']),
+                    close=to_list(candle['close']), name = 'market data'))
         
     colors1 = ['Cyan', 'Lime', 'Blue']
     colors2 = ['Yellow', 'Orange', 'Red']
+    uppers = [upper1, upper2, upper3]
+    lowers = [lower1, lower2, lower3]
     for i in range(1, 4):
-        fig.add_trace(go.Scatter(x=jst, 
-                         y=data['VWAP_UPPER' + str(i)], 
+        fig.add_trace(Line(x=to_list(uppers[i - 1]['x']), 
+                         y=to_list(uppers[i - 1]['y']), 
                          opacity=0.7, 
                          line=dict(color=colors1[i - 1], width=2), 
                          name='VWAP Upper'))
  
-        fig.add_trace(go.Scatter(x=jst, 
-                         y=data['VWAP_LOWER' + str(i)], 
+        fig.add_trace(Line(x=to_list(lowers[i - 1]['x']), 
+                         y=to_list(lowers[i - 1]['y']), 
                          opacity=0.7, 
                          line=dict(color=colors2[i - 1], width=2), 
                          name='VWAP lower'))
 
-    colors = ['green' if data['open'][i] - data['close'][i] >= 0 else 'red' for i in range(n)]
-    fig.add_trace(go.Bar(x=jst, y=data['tick_volume'], marker_color=colors), row=2, col=1)
+    fig.add_trace(go.Bar(x=to_list(volume['x']), y=to_list(volume['y']), marker_color=to_list(volume['marker.color'])), row=2, col=1)
     
-    fig.add_trace(go.Scatter(x=jst, y=data['VWAP_SLOPE'], line=dict(color='Green', width=2)), row=3, col=1)
+    fig.add_trace(Line(x=to_list(vwap_slope['x']), y=to_list(vwap_slope['y']), line=dict(color='Green', width=2)), row=3, col=1)
     
-    fig.add_trace(go.Scatter(x=jst, y=data['VWAP_RATE'], line=dict(color='blue', width=2)), row=4, col=1)
-    fig.add_trace(create_markers(jst, data['VWAP_SIGNAL'], data['VWAP_RATE'], 1, 'triangle-up', 'Green'), row=4, col=1)
-    fig.add_trace(create_markers(jst, data['VWAP_SIGNAL'], data['VWAP_RATE'], -1, 'triangle-down', 'Red'), row=4, col=1)
+    fig.add_trace(Line(x=to_list(vwap_rate['x']), y=to_list(vwap_rate['y']), line=dict(color='blue', width=2)), row=4, col=1)
+    fig.add_trace(create_markers(up_markers, 'triangle-up', 'Green'), row=4, col=1)
+    fig.add_trace(create_markers(down_markers, 'triangle-down', 'Red'), row=4, col=1)
     
-    fig.add_trace(go.Scatter(x=jst, y=data['VWAP_UP'], line=dict(color='blue', width=2)), row=5, col=1)
-    fig.add_trace(go.Scatter(x=jst, y=data['VWAP_DOWN'], line=dict(color='red', width=2)), row=5, col=1)
+    fig.add_trace(Line(x=to_list(vwap_up['x']), y=to_list(vwap_up['y']), line=dict(color='blue', width=2)), row=5, col=1)
+    fig.add_trace(Line(x=to_list(vwap_down['x']), y=to_list(vwap_down['y']), line=dict(color='red', width=2)), row=5, col=1)
 
 
     # update y-axis label
@@ -300,17 +527,21 @@ def create_chart1(symbol, data, num_bars):
     fig.update_yaxes(title_text="Volume", row=2, col=1)
     fig.update_yaxes(title_text="VWAP Slope", showgrid=False, row=3, col=1)
     fig.update_yaxes(title_text="VWAP Rate", row=4, col=1)     
-    return fig
-
+    return create_figure(symbol, timeframe, fig)
 
-def create_chart2(data, num_bars):
-    t0 = time.time()
-    ATR_TRAIL(data, technical_param2['atr_window'], technical_param2['atr_multiply'], technical_param2['peak_hold_term'])
-    data = Utils.sliceDictLast(data, num_bars)
+def chart2_series(data, num_bars):
+    # columns of each trace of chart2, in trace order
+    data = data.slice_last(num_bars)
     jst = data['jst']
-    n = len(jst)
-    print('Elapsed Time2:', time.time() - t0)
-    #print(time[:5])
+    series = [{'x': jst, 'open': data['open'], 'high': data['high'], 'low': data['low'], 'close': data['close']},
+              line_points(jst, data['ATR_TRAIL_UP']),
+              line_points(jst, data['ATR_TRAIL_DOWN']),
+              {'x': jst, 'y': data['tick_volume'], 'marker.color': volume_colors(data)}]
+    return jst, series
+
+def create_chart2(symbol, timeframe, series):
+    candle, trail_up, trail_down, volume = series
+    Line = line_trace(len(candle['x']))
     # Declare plotly figure (go)
     fig=go.Figure()
 
@@ -319,36 +550,49 @@ def create_chart2(data, num_bars):
                     vertical_spacing=0.01, 
                     row_heights=[0.5,0.1,0.2,0.2])
 
-    fig.add_trace(go.Candlestick(x=jst,
-                    open=data['open'],
-                    high=data['high'],
-                    low=data['low'],
-                    close=data['close'], name = 'market data'))
+    fig.add_trace(go.Candlestick(x=to_list(candle['x']),
+                    open=to_list(candle['open']),
+                    high=to_list(candle['high']),
+                    low=to_list(candle['low']),
+                    close=to_list(candle['close']), name = 'market data'))
     
-    fig.add_trace(go.Scatter(x=jst, 
-                         y=data['ATR_TRAIL_UP'], 
+    fig.add_trace(Line(x=to_list(trail_up['x']), 
+                         y=to_list(trail_up['y']), 
                          opacity=0.7, 
                          line=dict(color='blue', width=2), 
                          name='ATR Trail Up'))
 
-    fig.add_trace(go.Scatter(x=jst, 
-                         y=data['ATR_TRAIL_DOWN'], 
+    fig.add_trace(Line(x=to_list(trail_down['x']), 
+                         y=to_list(trail_down['y']), 
                          opacity=0.7, 
                          line=dict(color='orange', width=2), 
                          name='ATR Trail down'))
     
-    colors = ['green' if data['open'][i] - data['close'][i] >= 0 else 'red' for i in range(n)]
-    fig.add_trace(go.Bar(x=jst, 
-                     y=data['tick_volume'],
-                     marker_color=colors
+    fig.add_trace(go.Bar(x=to_list(volume['x']), 
+                     y=to_list(volume['y']),
+                     marker_color=to_list(volume['marker.color'])
                     ), row=2, col=1)
     
     # update y-axis label
     fig.update_yaxes(title_text="Price", row=1, col=1)
     fig.update_yaxes(title_text="Volume", row=2, col=1)  
+    return create_figure(symbol, timeframe, fig)
+
+def create_figure(symbol, timeframe, fig):
+    # update layout by changing the plot size, hiding legends & rangeslider, and removing gaps between dates
+    fig.update_layout(height=900, width=CHART_WIDTH, 
+                    showlegend=False, 
+                    xaxis_rangeslider_visible=False)
+                    
+
+    # Make the title dynamic to reflect whichever stock we are analyzing
+    fig.update_layout(
+        title= symbol + '(' + timeframe + ') ' + 'Live Share Price:',
+        yaxis_title='Stock Price') 
     return fig
 
-def create_graph(symbol, timeframe, fig, data):
+def graph_layout(symbol, timeframe, data):
+    # the layout properties that move with the data
     jst = data['jst']
     #print(symbol, timeframe, time[:10])
     #print(df.columns)
@@ -359,30 +603,15 @@ def create_graph(symbol, timeframe, fig, data):
         form = '%m-%d'
     else:
         form = '%d/%H:%M'
-    # update layout by changing the plot size, hiding legends & rangeslider, and removing gaps between dates
-    fig.update_layout(height=900, width=1100, 
-                    showlegend=False, 
-                    xaxis_rangeslider_visible=False)
-                    
-
-    # Make the title dynamic to reflect whichever stock we are analyzing
-    fig.update_layout(
-        title= symbol + '(' + timeframe + ') ' + 'Live Share Price:',
-        yaxis_title='Stock Price') 
-
-      
-
-    fig['layout'].update({
-                            'title': symbol + '  ' + timeframe + '  ('  +  str(tfrom) + ')  ...  (' + str(tto) + ')',
-                            'xaxis':{
-                                        'title': 'Time',
-                                        'showgrid': True,
-                                        'ticktext': [x.strftime(form) for x in jst][xtick::5],
-                                        'tickvals': np.arange(xtick, len(jst), 5)
-                                    }
-                        })
-                            
-    return dcc.Graph(id='stock-graph', figure=fig)
+    return {
+            'title': symbol + '  ' + timeframe + '  ('  +  str(tfrom) + ')  ...  (' + str(tto) + ')',
+            'xaxis':{
+                        'title': 'Time',
+                        'showgrid': True,
+                        'ticktext': [x.strftime(form) for x in jst][xtick::5],
+                        'tickvals': np.arange(xtick, len(jst), 5).tolist()
+                    }
+            }
 
 if __name__ == '__main__':
     app.run_server(debug=True, port=3333)
@@ -2,6 +2,7 @@ import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from dateutil import tz
+from bar_frame import BarFrame, to_epoch
 
 JST = tz.gettz('Asia/Tokyo')
 UTC = tz.gettz('utc') 
@@ -15,50 +16,112 @@ def time_utc(year: int, month: int, day: int, hour: int, minute: int):
     t = datetime(year, month, day, hour, minute)
     return t.replace(tzinfo=UTC)    
 
+def empty_value(dtype):
+    if np.issubdtype(dtype, np.floating):
+        return np.nan
+    if np.issubdtype(dtype, np.integer):
+        return 0
+    if np.issubdtype(dtype, np.datetime64):
+        return np.datetime64('NaT')
+    return None
+
 
 class DataBuffer:
-    def __init__(self, time_column: str):
+    # Columns live in preallocated numpy arrays of `capacity` elements.
+    # The buffer holds the last `size` bars in storage[end - size: end],
+    # appends write after end and, when the storage is full, the live bars
+    # are moved back to the front. Appending costs O(new bars) amortized,
+    # and every column seen from outside is a contiguous view (no copy).
+    # Bars come in and go out as BarFrame (dicts of columns are converted,
+    # with time_column as the bar time). Bar times are kept as sorted int64
+    # epoch seconds (time index), incoming bars are located in it by binary
+    # search.
+    def __init__(self, time_column: str, capacity=None):
         self.time_column = time_column
         self.size = 0
+        self.updated_length = 0
+        self.capacity = capacity
+        self.storage = {}
+        self.epoch = None
+        self.end = 0
         
     def initilize(self, arrays: dict):
-        self.arrays = arrays
-        self.keys = list(self.arrays.keys())
-        self.size = len(arrays[self.keys[0]])    
+        frame = BarFrame.from_dict(arrays, self.time_column)
+        self.size = frame.size
+        if self.capacity is None or self.capacity < 2 * self.size:
+            self.capacity = 2 * self.size
+        self.storage = {}
+        for key, array in frame.columns.items():
+            self.storage[key] = self.allocate(array.dtype)
+            self.storage[key][:self.size] = array
+        self.keys = list(frame.keys())
+        self.epoch = np.zeros(self.capacity, dtype=np.int64)
+        self.epoch[:self.size] = frame.epoch
+        self.end = self.size
+        self.updated_length = self.size
+
+    def allocate(self, dtype):
+        return np.full(self.capacity, empty_value(dtype), dtype=dtype)
+        
+    @property
+    def arrays(self):
+        return self.frame(self.end - self.size, self.end)
+
+    def frame(self, begin: int, end: int):
+        frame = BarFrame(self.epoch[begin: end])
+        for key, array in self.storage.items():
+            frame[key] = array[begin: end]
+        return frame
         
     def time_array(self):
-        return self.arrays[self.time_column]
+        return self.arrays.time
         
     def time_last(self):
-        time = self.time_array()
-        return time[-1]
+        return pd.Timestamp(int(self.epoch[self.end - 1]), unit='s', tz='utc')
+
+    def time_index(self):
+        return self.epoch[self.end - self.size: self.end]
         
     def add_empty(self, keys: [str]):
         for key in keys:
-            self.arrays[key] = nans(self.size)
+            self.storage[key] = self.allocate(np.float64)
         self.keys = list(self.arrays.keys())
         
-    def shift(self, length=1):
-        for key, array in self.arrays.items():
-            new_array = array[length:] + nans(length)
-            self.arrays[key] = new_array
+    def reserve(self, length: int):
+        # room for length more bars after end, returns the first new index
+        if self.end + length > self.capacity:
+            keep = max(self.size - length, 0)
+            for array in list(self.storage.values()) + [self.epoch]:
+                array[:keep] = array[self.end - keep: self.end]
+            self.end = keep
+        begin = self.end
+        self.end += length
+        return begin
+        
+    def shift(self, length=1, step=None):
+        # empty bars after the last one, their times continue every step
+        # seconds (the spacing of the last two bars by default) so the time
+        # index stays sorted
+        length = min(length, self.size)
+        if length <= 0:
+            return
+        last = int(self.epoch[self.end - 1])
+        if step is None:
+            step = last - int(self.epoch[self.end - 2]) if self.size > 1 else 60
+        begin = self.reserve(length)
+        self.epoch[begin: self.end] = last + step * np.arange(1, length + 1, dtype=np.int64)
+        for array in self.storage.values():
+            array[begin: self.end] = empty_value(array.dtype)
             
-    def slice_dic(self, data: dict, begin: int, end: int):
-        dic = {}
-        for key, array in data.items():
-            dic[key] = array[begin: end + 1]
-        return dic, (end - begin + 1)
+    def slice_dic(self, data: BarFrame, begin: int, end: int):
+        return data.slice(begin, end + 1), (end - begin + 1)
             
-    def split_data(self, data: dict):
-        t_last = self.time_last()
-        time = data[self.time_column]
+    def split_data(self, data: BarFrame):
+        t_last = self.epoch[self.end - 1]
+        time = data.epoch
         n = len(time)
-        index = None
-        for i, t in enumerate(time):
-            if t > t_last:
-                index = i
-                break
-        if index is None:
+        index = int(np.searchsorted(time, t_last, side='right'))
+        if index == n:
             return (data, None, 0)
         
         replace_data, length = self.slice_dic(data, 0, index - 1)
@@ -66,15 +129,15 @@ class DataBuffer:
         return (replace_data, new_data, new_length)
         
     def update(self, data: dict):
-        length = None
-        for key, value in data.items():
-            if length is None:
-                length = len(value)
-            else:
-                if length != len(value):
-                    raise Exception('Dimension error')
+        # a BarFrame checks the column lengths
+        data = BarFrame.from_dict(data, self.time_column)
         replace_data, new_data, new_length = self.split_data(data)
-        self.replace(replace_data)
+        first = self.replace(replace_data)
+        # number of bars at the end of the buffer touched by this update
+        if first is None:
+            self.updated_length = min(new_length, self.size)
+        else:
+            self.updated_length = min(self.size - first + new_length, self.size)
         if new_length > 0:
             self.add_data(new_data, new_length)
             return new_length
@@ -82,38 +145,50 @@ class DataBuffer:
             return 0
                 
     
-    def replace(self, data: dict):
-        time = self.time_array()
-        t_list = data[self.time_column]
-        for i, t in enumerate(t_list):
-            for j, t0 in enumerate(time):
-                if t == t0:
-                    for key, array in data.items():
-                        self.arrays[key][j] = array[i]
-                    break
+    def replace(self, data: BarFrame):
+        # overwrite bars with the same time, returns the first replaced
+        # index in the buffer (None when nothing matched)
+        t_list = data.epoch
+        if len(t_list) == 0:
+            return None
+        index = self.time_index()
+        pos = np.minimum(np.searchsorted(index, t_list), self.size - 1)
+        found = index[pos] == t_list
+        if not found.any():
+            return None
+        rows = pos[found] + (self.end - self.size)
+        for key, array in data.columns.items():
+            self.storage[key][rows] = array[found]
+        return int(pos[found][0])
                 
                 
-    def add_data(self, data: dict, length: int):
-        for key in self.keys:
-            if key in data.keys():
-                new_array =  self.arrays[key][length:] + data[key]                
+    def add_data(self, data: BarFrame, length: int):
+        skip = max(length - self.size, 0)
+        length -= skip
+        begin = self.reserve(length)
+        self.epoch[begin: self.end] = data.epoch[skip:]
+        for key, array in self.storage.items():
+            if key in data.columns:
+                array[begin: self.end] = data.columns[key][skip:]
             else:
-                new_array = self.arrays[key][length:] + nans(length)
-            self.arrays[key] = new_array
+                array[begin: self.end] = empty_value(array.dtype)
 
     def get_data(self, key: str):
         return self.arrays[key]
     
     def data_last(self, key: str, length: int):
-        array = self.arrays[key]
-        return array[-length:]
+        return self.slice_last(length)[key]
+
+    def slice_last(self, length: int):
+        length = min(length, self.size)
+        return self.frame(self.end - length, self.end)
+
+    def nbytes(self):
+        return sum([array.nbytes for array in self.storage.values()]) + self.epoch.nbytes
 
     def update_data(self, key, data):
         length = len(data)
-        array = self.arrays[key]
-        begin = self.size - length
-        for i, d in enumerate(data):
-            array[begin + i] = d 
+        self.storage[key][self.end - length: self.end] = data
             
     
 def test():
@@ -139,11 +214,11 @@ def test():
             n = buffer.update(data)
             print('#', i, 'Update data size', n)
         time.sleep(interval)
-    df = pd.DataFrame(buffer.arrays)
+    df = pd.DataFrame(buffer.arrays.to_dict())
     df.to_csv('./bufferd_data.xlsx', index=False)
     
     data = api.get_rates(symbol, timeframe, bars)
-    df = pd.DataFrame(data)
+    df = pd.DataFrame(data.to_dict())
     df.to_csv('./refference.xlsx', index=False)
     
 def test2():
@@ -160,7 +235,7 @@ def test2():
     api.connect()
     data = api.get_rates(symbol, timeframe, bars)
     VWAP(data, 1.8, [8, 16, 20])
-    df = pd.DataFrame(data)
+    df = pd.DataFrame(data.to_dict())
     df.to_csv('./usdjpy_debug.csv', index=False)    
     
     
@@ -0,0 +1,67 @@
+import numpy as np
+
+
+# Largest triangle three buckets (Steinarsson 2013). The first and the last
+# point are kept, the points in between are split in threshold - 2 buckets
+# and from each bucket the point forming the largest triangle with the
+# point kept from the previous bucket and the average of the next bucket
+# is kept.
+
+def lttb(x, y, threshold: int):
+    # indices of the kept points
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        raise Exception('threshold must be 3 or more')
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(np.int64)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    avg_x = np.append(avg_x[1:], x[n - 1])
+    avg_y = np.append(avg_y[1:], y[n - 1])
+    index = np.empty(threshold, dtype=np.int64)
+    index[0] = 0
+    index[-1] = n - 1
+    a = 0
+    for b in range(threshold - 2):
+        begin = edges[b]
+        end = edges[b + 1]
+        area = np.abs((x[a] - avg_x[b]) * (y[begin: end] - y[a]) - (x[a] - x[begin: end]) * (avg_y[b] - y[a]))
+        a = begin + int(np.argmax(area))
+        index[b + 1] = a
+    return index
+
+def downsample(vector, threshold: int):
+    # indices of about threshold points of an indicator, lttb over each run
+    # of finite values (x is the bar index). One nan is kept for each gap,
+    # so lines stay broken where the indicator is undefined.
+    y = np.asarray(vector, dtype=np.float64)
+    n = len(y)
+    if n <= threshold:
+        return np.arange(n)
+    finite = np.isfinite(y)
+    change = np.flatnonzero(np.diff(finite.astype(np.int8))) + 1
+    bounds = np.concatenate([[0], change, [n]])
+    out = []
+    for begin, end in zip(bounds[:-1], bounds[1:]):
+        if not finite[begin]:
+            out.append([begin])
+            continue
+        m = max(int(round(threshold * (end - begin) / n)), 3)
+        out.append(begin + lttb(np.arange(begin, end), y[begin: end], m))
+    return np.concatenate(out).astype(np.int64)
+
+
+def test():
+    n = 3000
+    y = np.cumsum(np.random.default_rng(0).normal(0, 1, n))
+    y[1000: 1100] = np.nan
+    index = downsample(y, 1100)
+    print('points', len(index), 'max kept', y[index][np.isfinite(y[index])].max(), 'max', np.nanmax(y))
+
+
+if __name__ == '__main__':
+    test()
@@ -2,37 +2,122 @@ import os
 import sys
 sys.path.append('../Libraries/trade')
 
-import MetaTrader5 as mt5
+import time
+import threading
+from collections import OrderedDict
+try:
+    import MetaTrader5 as mt5
+except ImportError:
+    # Windows only, the offline backends (mt5_offline.py) run without it
+    mt5 = None
+import numpy as np
 import pandas as pd
 from dateutil import tz
 from datetime import datetime, timedelta, timezone
-from time_utils import TimeUtils
+from data_buffer import DataBuffer
+from bar_frame import BarFrame, concat
+from common import Columns
 JST = tz.gettz('Asia/Tokyo')
 UTC = tz.gettz('utc')  
+
+# numpy structured array returned by copy_rates_from_pos
+RATE_DTYPE = np.dtype([ ('time', '<i8'),
+                        ('open', '<f8'),
+                        ('high', '<f8'),
+                        ('low', '<f8'),
+                        ('close', '<f8'),
+                        ('tick_volume', '<u8'),
+                        ('spread', '<i4'),
+                        ('real_volume', '<u8')])
+
+# numpy structured array returned by copy_ticks_range / copy_ticks_from,
+# time is server time epoch seconds, time_msc in milliseconds
+TICK_DTYPE = np.dtype([ ('time', '<i8'),
+                        ('bid', '<f8'),
+                        ('ask', '<f8'),
+                        ('last', '<f8'),
+                        ('volume', '<u8'),
+                        ('time_msc', '<i8'),
+                        ('flags', '<u4'),
+                        ('volume_real', '<f8')])
+
+# Server time is GMT+3 from the 2nd sunday of March to the 1st sunday of
+# November, GMT+2 otherwise
+SUMMER_TIME_BEGIN = (3, 2)
+SUMMER_TIME_END = (11, 1)
+DELTA_HOUR_FROM_GMT_IN_SUMMER = 3.0
         
-def server_time(begin_month, begin_sunday, end_month, end_sunday, delta_hour_from_gmt_in_summer):
-    now = datetime.now(JST)
-    dt, tz = TimeUtils.delta_hour_from_gmt(now, begin_month, begin_sunday, end_month, end_sunday, delta_hour_from_gmt_in_summer)
-    #delta_hour_from_gmt  = dt
-    #server_timezone = tz
-    #print('SeverTime GMT+', dt, tz)
-    return dt, tz  
-  
-def adjust_summer_time(time: datetime):
-    dt, tz = server_time(3, 2, 11, 1, 3.0)
-    return time - dt
-
-def adjust(time):
-    utc = []
-    jst = []
-    for ts in time:
-        t0 = pd.to_datetime(ts)
-        t0 = t0.replace(tzinfo=UTC)
-        t = adjust_summer_time(t0)
-        utc.append(t)
-        tj = t.astimezone(JST)
-        jst.append(tj)  
-    return utc, jst
+def nth_sunday(year, month, n):
+    t = datetime(year, month, 1)
+    t += timedelta(days=(6 - t.weekday()) % 7)
+    return t + timedelta(days=7 * (n - 1))
+
+def dst_table(year_from, year_to, begin_month, begin_sunday, end_month, end_sunday, delta_hour_from_gmt_in_summer):
+    # Transitions as server time epoch seconds, and the offset from GMT in
+    # seconds before the first / after each transition
+    summer = int(delta_hour_from_gmt_in_summer * 3600)
+    winter = summer - 3600
+    epoch = datetime(1970, 1, 1)
+    bounds = []
+    offsets = [winter]
+    for year in range(year_from, year_to + 1):
+        begin = nth_sunday(year, begin_month, begin_sunday)
+        end = nth_sunday(year, end_month, end_sunday)
+        bounds += [(begin - epoch) // timedelta(seconds=1), (end - epoch) // timedelta(seconds=1)]
+        offsets += [summer, winter]
+    return np.array(bounds, dtype=np.int64), np.array(offsets, dtype=np.int64)
+
+def server_to_utc(epochs):
+    # server time epoch seconds (int64 array) -> utc epoch seconds, every
+    # bar gets the offset in effect at its own date
+    epochs = np.asarray(epochs, dtype=np.int64)
+    if len(epochs) == 0:
+        return epochs
+    epoch = datetime(1970, 1, 1)
+    year_from = (epoch + timedelta(seconds=int(epochs.min()))).year
+    year_to = (epoch + timedelta(seconds=int(epochs.max()))).year
+    bounds, offsets = dst_table(year_from, year_to, *SUMMER_TIME_BEGIN, *SUMMER_TIME_END, DELTA_HOUR_FROM_GMT_IN_SUMMER)
+    return epochs - offsets[np.searchsorted(bounds, epochs, side='right')]
+
+def utc_to_server(epochs):
+    # utc epoch seconds -> server time epoch seconds, the inverse of
+    # server_to_utc. A transition at server time b with offset o before it
+    # happens at utc b - o.
+    epochs = np.asarray(epochs, dtype=np.int64)
+    if len(epochs) == 0:
+        return epochs
+    epoch = datetime(1970, 1, 1)
+    year_from = (epoch + timedelta(seconds=int(epochs.min()))).year
+    year_to = (epoch + timedelta(seconds=int(epochs.max()) + 4 * 3600)).year
+    bounds, offsets = dst_table(year_from, year_to, *SUMMER_TIME_BEGIN, *SUMMER_TIME_END, DELTA_HOUR_FROM_GMT_IN_SUMMER)
+    bounds = bounds - offsets[:-1]
+    return epochs + offsets[np.searchsorted(bounds, epochs, side='right')]
+
+def resample_rates(data: BarFrame, timeframe: str, partial=True):
+    # Bars of timeframe from M1 bars. Buckets start on server time
+    # boundaries, so H4 and D1 follow the server day across DST changes,
+    # and only hold the minutes traded (no bars for closed sessions).
+    # partial: bars before data may be missing, the first bucket is dropped
+    # as it may be incomplete. Pass one M1 bar more than needed: when that
+    # bar closes its bucket, the next bucket is complete.
+    if data.size == 0:
+        return BarFrame(data.epoch, {key: data[key] for key in [Columns.OPEN, Columns.HIGH, Columns.LOW, Columns.CLOSE, Columns.VOLUME]})
+    seconds = TimeFrame.seconds(timeframe)
+    server = utc_to_server(data.epoch)
+    ids = server // seconds
+    first = np.flatnonzero(np.diff(ids, prepend=ids[0] - 1) != 0)
+    if partial:
+        first = first[1:]
+    if len(first) == 0:
+        return resample_rates(data.slice(0, 0), timeframe)
+    last = np.append(first[1:], data.size) - 1
+    columns = {Columns.OPEN: data[Columns.OPEN][first],
+               Columns.HIGH: np.maximum.reduceat(data[Columns.HIGH], first),
+               Columns.LOW: np.minimum.reduceat(data[Columns.LOW], first),
+               Columns.CLOSE: data[Columns.CLOSE][last],
+               Columns.VOLUME: np.add.reduceat(data[Columns.VOLUME], first)}
+    return BarFrame(server_to_utc(ids[first] * seconds), columns)
+
             
 class TimeFrame:
     TICK = 'TICK'
@@ -44,51 +129,237 @@ class TimeFrame:
     H4 = 'H4'
     D1 = 'D1'
     W1 = 'W1'
-    timeframes = {  M1: mt5.TIMEFRAME_M1, 
-                    M5: mt5.TIMEFRAME_M5,
-                    M15: mt5.TIMEFRAME_M15,
-                    M30: mt5.TIMEFRAME_M30,
-                    H1: mt5.TIMEFRAME_H1,
-                    H4: mt5.TIMEFRAME_H4,
-                    D1: mt5.TIMEFRAME_D1,
-                    W1: mt5.TIMEFRAME_W1}
+    # values of mt5.TIMEFRAME_*
+    timeframes = {  M1: 1, 
+                    M5: 5,
+                    M15: 15,
+                    M30: 30,
+                    H1: 16385,
+                    H4: 16388,
+                    D1: 16408,
+                    W1: 32769}
+    minutes = { M1: 1,
+                M5: 5,
+                M15: 15,
+                M30: 30,
+                H1: 60,
+                H4: 240,
+                D1: 60 * 24,
+                W1: 60 * 24 * 7}
             
     @staticmethod 
     def const(timeframe_str: str):
         return TimeFrame.timeframes[timeframe_str]            
+
+    @staticmethod 
+    def seconds(timeframe_str: str):
+        return TimeFrame.minutes[timeframe_str] * 60
             
+
+class RateCache:
+    # DataBuffer per (symbol, timeframe), least recently used ones are
+    # dropped when there are more than max_series or they use more than
+    # max_bytes
+    def __init__(self, max_series: int, max_bytes: int):
+        self.max_series = max_series
+        self.max_bytes = max_bytes
+        self.buffers = OrderedDict()
+
+    def get(self, key):
+        buffer = self.buffers.get(key)
+        if buffer is not None:
+            self.buffers.move_to_end(key)
+        return buffer
+
+    def put(self, key, buffer: DataBuffer):
+        self.buffers[key] = buffer
+        self.buffers.move_to_end(key)
+        while len(self.buffers) > 1:
+            if len(self.buffers) <= self.max_series and self.nbytes() <= self.max_bytes:
+                break
+            self.buffers.popitem(last=False)
+
+    def remove(self, key):
+        self.buffers.pop(key, None)
+
+    def nbytes(self):
+        return sum([buffer.nbytes() for buffer in self.buffers.values()])
+
+
+class Mt5Backend:
+    # MetaTrader5 terminal. Other backends (mt5_offline.py) provide the
+    # same methods and return rates in the same RATE_DTYPE layout.
+    def initialize(self):
+        if mt5 is None:
+            raise Exception('MetaTrader5 module is not installed')
+        return mt5.initialize()
+
+    def version(self):
+        return mt5.version()
+
+    def last_error(self):
+        return mt5.last_error()
+
+    def copy_rates_from_pos(self, symbol: str, timeframe: str, pos: int, count: int):
+        return mt5.copy_rates_from_pos(symbol,  TimeFrame.const(timeframe), pos, count)
+
+    def copy_ticks_range(self, symbol: str, begin: int, end: int):
+        # begin, end: server time epoch seconds
+        return mt5.copy_ticks_range(symbol, begin, end, mt5.COPY_TICKS_ALL)
+
+    def copy_ticks_from(self, symbol: str, begin: int, count: int):
+        return mt5.copy_ticks_from(symbol, begin, count, mt5.COPY_TICKS_ALL)
+
+    def time(self):
+        # utc epoch seconds now
+        return time.time()
+
+
+# timeframes get_rates(resample=True) derives from M1, W1 is downloaded as
+# MT5 weeks begin on sunday
+RESAMPLE_TIMEFRAMES = [TimeFrame.M5, TimeFrame.M15, TimeFrame.M30, TimeFrame.H1, TimeFrame.H4, TimeFrame.D1]
+DAY_MINUTES = 24 * 60
+
+
 class Mt5Api:
-    def __init__(self):
+    def __init__(self, backend=None, cache_series=16, cache_bytes=256 * 1024 * 1024, store=None, resample=False, resample_limit=100000):
+        # store: BarStore keeping the closed bars on disk, history is read
+        # from it and only the bars after it are downloaded
+        # resample: M5 ... D1 are resampled from the cached M1 bars, unless
+        # that needs more than resample_limit M1 bars
+        if backend is None:
+            backend = Mt5Backend()
+        self.backend = backend
+        self.cache = RateCache(cache_series, cache_bytes)
+        self.store = store
+        self.resample = resample
+        self.resample_limit = resample_limit
+        # the MetaTrader5 module is not thread safe, every terminal call
+        # and cache update goes through this lock
+        self.lock = threading.RLock()
         self.connect()
         
     def connect(self):
-        if mt5.initialize():
-            print('Connected to MT5 Version', mt5.version())
-        else:
-            print('initialize() failed, error code = ', mt5.last_error())
+        with self.lock:
+            if self.backend.initialize():
+                print('Connected to MT5 Version', self.backend.version())
+            else:
+                print('initialize() failed, error code = ', self.backend.last_error())
 
     def get_rates(self, symbol: str, timeframe: str, length: int):
+        # Served from the cache, only the bars after the last cached one
+        # (and the still forming last bar) are downloaded. The returned
+        # columns are a copy, later updates from other threads don't
+        # change them.
+        if timeframe == TimeFrame.TICK:
+            raise Exception('Ticks are read with get_ticks')
+        with self.lock:
+            if self.resample and timeframe in RESAMPLE_TIMEFRAMES:
+                data = self.resampled_rates(symbol, timeframe, length)
+                if data is not None:
+                    return data
+            return self.cached_rates(symbol, timeframe, length)
+
+    def resampled_rates(self, symbol: str, timeframe: str, length: int):
+        # None when more than resample_limit M1 bars would be needed. The
+        # count is rounded up to whole days, so the estimate of the second
+        # pass keeps the size of the cached M1 buffer from call to call
+        # instead of growing it (a full download) by a few bars.
+        count = (length + 1) * TimeFrame.minutes[timeframe]
+        for i in range(2):
+            count = -(-count // DAY_MINUTES) * DAY_MINUTES
+            if count > self.resample_limit:
+                return None
+            # one bar more tells whether the first bucket is complete, with
+            # fewer bars the history starts in the data
+            m1 = self.cached_rates(symbol, TimeFrame.M1, count + 1)
+            data = resample_rates(m1, timeframe, partial=(m1.size > count))
+            if data.size >= length or m1.size <= count:
+                break
+            # closed sessions leave fewer bars than minutes
+            count = int(count * (length + 1) / max(data.size, 1)) + 1
+        return data.slice_last(length)
+
+    def cached_rates(self, symbol: str, timeframe: str, length: int):
+        key = (symbol, timeframe)
+        buffer = self.cache.get(key)
+        if buffer is not None and buffer.size >= length:
+            if self.update_cache(buffer, symbol, timeframe):
+                return self.snapshot(buffer, length)
+        data = self.load_rates(symbol, timeframe, length)
+        buffer = DataBuffer('time')
+        buffer.initilize(data)
+        self.cache.put(key, buffer)
+        return self.snapshot(buffer, length)
+
+    def snapshot(self, buffer: DataBuffer, length: int):
+        return buffer.slice_last(length).copy()
+
+    def update_cache(self, buffer: DataBuffer, symbol: str, timeframe: str):
+        # The bars since t_last are estimated from the clock, which counts
+        # weekends and closed sessions too, so the download is capped at
+        # the buffer size. The cache is reloaded only when the download
+        # does not reach back to t_last.
+        t_last = buffer.time_index()[-1]
+        count = int((self.backend.time() - t_last) // TimeFrame.seconds(timeframe)) + 2
+        count = min(count, buffer.size)
+        data = self.download_rates(symbol, timeframe, count)
+        if data.size == 0 or data.epoch[0] > t_last:
+            # bars are missing between the cache and the download
+            return False
+        buffer.update(data)
+        self.store_rates(symbol, timeframe, data)
+        return True
+
+    def load_rates(self, symbol: str, timeframe: str, length: int):
+        if self.store is not None:
+            stored = self.store.load(symbol, timeframe)
+            if stored.size > 0:
+                t_last = stored.epoch[-1]
+                count = int((self.backend.time() - t_last) // TimeFrame.seconds(timeframe)) + 2
+                data = self.download_rates(symbol, timeframe, min(count, length))
+                if data.size > 0 and data.epoch[0] <= t_last:
+                    self.store_rates(symbol, timeframe, data)
+                    new = data.slice(int(np.searchsorted(data.epoch, t_last, side='right')), data.size)
+                    if stored.size + new.size >= length:
+                        return concat([stored.slice_last(length - new.size), new])
+        data = self.download_rates(symbol, timeframe, length)
+        self.store_rates(symbol, timeframe, data)
+        return data
+
+    def store_rates(self, symbol: str, timeframe: str, data: BarFrame):
+        # closed bars only, the last one is still forming
+        if self.store is not None and data.size > 1:
+            self.store.append(symbol, timeframe, data.slice(0, data.size - 1))
+
+    def download_rates(self, symbol: str, timeframe: str, length: int):
         #print(symbol, timeframe)
         
-        rates = mt5.copy_rates_from_pos(symbol,  TimeFrame.const(timeframe), 0, length)
+        with self.lock:
+            rates = self.backend.copy_rates_from_pos(symbol, timeframe, 0, length)
         if rates is None:
             raise Exception('get_rates error')
         return self.parse_rates(rates)
 
+    def get_ticks(self, symbol: str, begin: int, end=None, count=None):
+        # ticks (TICK_DTYPE) from server time epoch seconds begin, up to end
+        # or count ticks. tick_bars.TickBars builds bars of them.
+        with self.lock:
+            if count is None:
+                ticks = self.backend.copy_ticks_range(symbol, int(begin), int(end))
+            else:
+                ticks = self.backend.copy_ticks_from(symbol, int(begin), int(count))
+        if ticks is None:
+            raise Exception('get_ticks error')
+        return ticks
+
     def parse_rates(self, rates):
-        df = pd.DataFrame(rates)
-        t0 = pd.to_datetime(df['time'], unit='s') 
-        utc, jst = adjust(t0)
-        
-        dic = {}
-        dic['time'] = utc
-        dic['jst'] = jst
-        dic['open'] = df['open'].to_list()
-        dic['high'] = df['high'].to_list()
-        dic['low'] = df['low'].to_list()
-        dic['close'] = df['close'].to_list()
-        dic['tick_volume'] = df['tick_volume'].to_list()        
-        return dic
+        # BarFrame converts the columns to their types, time and jst are
+        # derived from the utc epoch
+        columns = {}
+        for key in ['open', 'high', 'low', 'close', 'tick_volume']:
+            columns[key] = rates[key]
+        return BarFrame(server_to_utc(rates['time']), columns)
         
 
 
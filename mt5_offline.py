@@ -0,0 +1,262 @@
+import os
+import time
+import zlib
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from mt5_api import RATE_DTYPE, TICK_DTYPE, TimeFrame, server_to_utc
+
+
+# Stand-ins for the MetaTrader5 terminal, to run Mt5Api on machines
+# without a broker connection:
+#
+#   api = Mt5Api(backend=SyntheticBackend(seed=1))
+#   api = Mt5Api(backend=ReplayBackend('./history'))
+#
+# Both keep a server time clock (epoch seconds in server time, like the
+# rates MT5 returns) and serve the bars up to it. advance() moves the
+# clock to let new bars arrive. Bars are only served on weekdays (server
+# time), as on the real feeds.
+
+WEEK = 7 * 24 * 60 * 60
+TRADING_WEEK = 5 * 24 * 60 * 60
+# monday 2020-01-06 00:00 server time
+ORIGIN = int((datetime(2020, 1, 6) - datetime(1970, 1, 1)).total_seconds())
+# monday 2024-06-03 10:00:30 server time
+CLOCK = int((datetime(2024, 6, 3, 10, 0, 30) - datetime(1970, 1, 1)).total_seconds())
+
+
+def bars_per_week(timeframe: str):
+    return max(TRADING_WEEK // TimeFrame.seconds(timeframe), 1)
+
+def bar_time(index, timeframe: str):
+    # server time of the index-th weekday bar since ORIGIN
+    index = np.asarray(index, dtype=np.int64)
+    per_week = bars_per_week(timeframe)
+    week = index // per_week
+    return ORIGIN + week * WEEK + (index - week * per_week) * TimeFrame.seconds(timeframe)
+
+def bar_index(server_time: int, timeframe: str):
+    # index of the last bar opened at or before server_time
+    per_week = bars_per_week(timeframe)
+    t = int(server_time) - ORIGIN
+    week = t // WEEK
+    i = min((t - week * WEEK) // TimeFrame.seconds(timeframe), per_week - 1)
+    return week * per_week + i
+
+def history_dtype(timeframe: str):
+    return TICK_DTYPE if timeframe == TimeFrame.TICK else RATE_DTYPE
+
+def save_history(directory: str, symbol: str, timeframe: str, rates, csv=False):
+    # record rates (RATE_DTYPE array, e.g. from a live Mt5Backend) for
+    # ReplayBackend, ticks (TICK_DTYPE) with timeframe TimeFrame.TICK.
+    # csv: a .csv file with a column per field instead of .npy
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, symbol + '_' + timeframe)
+    rates = np.asarray(rates)
+    if csv:
+        pd.DataFrame({name: rates[name] for name in rates.dtype.names}).to_csv(path + '.csv', index=False)
+    else:
+        np.save(path + '.npy', rates)
+
+
+class OfflineBackend:
+    # the clock and the terminal calls shared by the stand-ins, subclasses
+    # provide copy_rates_from_pos and copy_ticks_range
+    def __init__(self, clock: int, latency: float):
+        self.clock = int(clock)
+        self.latency = latency
+
+    def initialize(self):
+        return True
+
+    def version(self):
+        return (self.__class__.__name__, 0, '')
+
+    def last_error(self):
+        return (1, 'Success')
+
+    def time(self):
+        return float(server_to_utc([self.clock])[0])
+
+    def advance(self, seconds: int):
+        self.clock += int(seconds)
+
+    def wait(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def copy_ticks_from(self, symbol: str, begin: int, count: int):
+        # copy_ticks_range over a growing range until count ticks or the clock
+        end = int(begin) + max(int(count), 1)
+        while True:
+            ticks = self.copy_ticks_range(symbol, begin, end)
+            if len(ticks) >= count or end > self.clock:
+                return ticks[:count]
+            end += end - int(begin)
+
+
+class SyntheticBackend(OfflineBackend):
+    # Seeded random walk per (symbol, timeframe) starting at ORIGIN, with
+    # volatility as the standard deviation of M1 log returns. The bars
+    # depend only on the seed, so every run sees the same prices. The bar
+    # containing the clock is still forming and grows towards its final
+    # values.
+    CHUNK = 65536
+
+    def __init__(self, seed=0, latency=0.0, price=30000.0, volatility=0.0005, clock=CLOCK):
+        OfflineBackend.__init__(self, clock, latency)
+        self.seed = seed
+        self.price = price
+        self.volatility = volatility
+        self.series = {}
+
+    def generate(self, symbol: str, timeframe: str, length: int):
+        key = (symbol, timeframe)
+        data = self.series.get(key)
+        if data is not None and len(data['close']) >= length:
+            return data
+        chunks = []
+        last = self.price
+        if data is not None:
+            chunks.append(data)
+            last = data['close'][-1]
+        begin = 0 if data is None else len(data['close']) // self.CHUNK
+        end = -(-length // self.CHUNK)
+        for c in range(begin, end):
+            seed = [self.seed, zlib.crc32(symbol.encode()), TimeFrame.seconds(timeframe), c]
+            rng = np.random.default_rng(seed)
+            sigma = self.volatility * np.sqrt(TimeFrame.minutes[timeframe])
+            close = last * np.exp(np.cumsum(rng.normal(0.0, sigma, self.CHUNK)))
+            op = np.concatenate([[last], close[:-1]])
+            wick = op * np.abs(rng.normal(0.0, sigma / 2, (2, self.CHUNK)))
+            chunk = {'open': op,
+                     'high': np.maximum(op, close) + wick[0],
+                     'low': np.minimum(op, close) - wick[1],
+                     'close': close,
+                     'tick_volume': rng.integers(1, 200, self.CHUNK) * TimeFrame.minutes[timeframe]}
+            chunks.append(chunk)
+            last = close[-1]
+        data = {}
+        for column in chunks[0].keys():
+            data[column] = np.concatenate([chunk[column] for chunk in chunks])
+        self.series[key] = data
+        return data
+
+    def copy_ticks_range(self, symbol: str, begin: int, end: int):
+        # One tick a second on weekdays (server time), up to the clock. The
+        # mid moves from the open to the close of the M1 bar with some
+        # noise, bid and ask are spread apart around it.
+        self.wait()
+        seconds = np.arange(max(int(begin), ORIGIN), min(int(end), self.clock + 1), dtype=np.int64)
+        seconds = seconds[(seconds - ORIGIN) % WEEK < TRADING_WEEK]
+        ticks = np.zeros(len(seconds), dtype=TICK_DTYPE)
+        if len(seconds) == 0:
+            return ticks
+        t = seconds - ORIGIN
+        week = t // WEEK
+        minute = week * bars_per_week(TimeFrame.M1) + (t - week * WEEK) // 60
+        data = self.generate(symbol, TimeFrame.M1, int(minute[-1]) + 1)
+        op = data['open'][minute]
+        cl = data['close'][minute]
+        # deterministic noise in [0, 1) from the time
+        noise = np.modf(np.abs(np.sin(seconds * 12.9898 + self.seed)) * 43758.5453)[0]
+        mid = op + (cl - op) * ((t % 60) / 60) + (noise - 0.5) * op * self.volatility / 4
+        spread = op * self.volatility / 10
+        ticks['time'] = seconds
+        ticks['time_msc'] = seconds * 1000 + (noise * 1000).astype(np.int64)
+        ticks['bid'] = mid - spread / 2
+        ticks['ask'] = mid + spread / 2
+        ticks['volume'] = 1
+        return ticks
+
+    def copy_rates_from_pos(self, symbol: str, timeframe: str, pos: int, count: int):
+        self.wait()
+        last = bar_index(self.clock, timeframe)
+        end = last + 1 - pos
+        begin = max(end - count, 0)
+        if end <= 0:
+            return np.zeros(0, dtype=RATE_DTYPE)
+        data = self.generate(symbol, timeframe, end)
+        rates = np.zeros(end - begin, dtype=RATE_DTYPE)
+        rates['time'] = bar_time(np.arange(begin, end), timeframe)
+        for column in data.keys():
+            rates[column] = data[column][begin: end]
+        if pos == 0:
+            # forming bar
+            f = min((self.clock - rates['time'][-1]) / TimeFrame.seconds(timeframe), 1.0)
+            bar = rates[-1]
+            o = bar['open']
+            c = o + (bar['close'] - o) * f
+            rates['close'][-1] = c
+            rates['high'][-1] = max(o, c) + (bar['high'] - max(o, bar['close'])) * f
+            rates['low'][-1] = min(o, c) - (min(o, bar['close']) - bar['low']) * f
+            rates['tick_volume'][-1] = max(int(bar['tick_volume'] * f), 1)
+        return rates
+
+
+class ReplayBackend(OfflineBackend):
+    # Recorded history, one file per series in directory:
+    # <symbol>_<timeframe>.npy (RATE_DTYPE, see save_history) or
+    # <symbol>_<timeframe>.csv with time (server epoch seconds), open, high,
+    # low, close, tick_volume columns. Ticks are <symbol>_TICK.npy
+    # (TICK_DTYPE) or .csv with its fields (time, bid, ask, time_msc ...).
+    # By default the clock is at the end of the history, pass clock to
+    # replay from an earlier time.
+    def __init__(self, directory: str, clock=None, latency=0.0):
+        OfflineBackend.__init__(self, 0 if clock is None else clock, latency)
+        self.directory = directory
+        self.series = {}
+        self.fixed_clock = clock is not None
+
+    def load(self, symbol: str, timeframe: str):
+        key = (symbol, timeframe)
+        rates = self.series.get(key)
+        if rates is not None:
+            return rates
+        path = os.path.join(self.directory, symbol + '_' + timeframe)
+        if os.path.exists(path + '.npy'):
+            rates = np.load(path + '.npy')
+        elif os.path.exists(path + '.csv'):
+            df = pd.read_csv(path + '.csv', float_precision='round_trip')
+            dtype = history_dtype(timeframe)
+            rates = np.zeros(len(df), dtype=dtype)
+            for column in dtype.names:
+                if column in df.columns:
+                    rates[column] = df[column].to_numpy()
+        else:
+            raise Exception('No history for ' + symbol + ' ' + timeframe)
+        self.series[key] = rates
+        if not self.fixed_clock:
+            self.clock = max(self.clock, int(rates['time'][-1]))
+        return rates
+
+    def copy_rates_from_pos(self, symbol: str, timeframe: str, pos: int, count: int):
+        self.wait()
+        rates = self.load(symbol, timeframe)
+        end = int(np.searchsorted(rates['time'], self.clock, side='right')) - pos
+        if end <= 0:
+            return np.zeros(0, dtype=RATE_DTYPE)
+        return rates[max(end - count, 0): end].copy()
+
+    def copy_ticks_range(self, symbol: str, begin: int, end: int):
+        self.wait()
+        ticks = self.load(symbol, TimeFrame.TICK)
+        end = min(int(end), self.clock + 1)
+        return ticks[np.searchsorted(ticks['time'], int(begin)): np.searchsorted(ticks['time'], end)].copy()
+
+
+def test():
+    from mt5_api import Mt5Api
+
+    backend = SyntheticBackend(seed=1, latency=0.05)
+    api = Mt5Api(backend=backend)
+    for i in range(10):
+        t0 = time.time()
+        data = api.get_rates('NIKKEI', TimeFrame.M1, 3000)
+        print('#', i, data['jst'][-1], data['close'][-1], 'Elapsed Time:', time.time() - t0)
+        backend.advance(20)
+
+
+if __name__ == '__main__':
+    test()
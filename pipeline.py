@@ -0,0 +1,211 @@
+import os
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from common import Indicators, Columns
+from technical import array, true_range, moving_average, directional_movement, directional_index
+from technical import session_begin, session_vwap, vwap_rate, slope, band, band_position, probability
+from technical import cross_value, vwap_pivot, atr_trail, supertrend, subtract, UP, DOWN
+
+
+# Indicators as a graph of nodes. Each node declares the columns or node
+# outputs it reads and the parameters it takes, and its outputs are cached
+# by (series version, parameters, inputs). compute() asks for outputs by
+# name and runs only the nodes that are stale, so TR and the directional
+# movement are shared by ATR, ADX and POLARITY, and a new pivot threshold
+# reruns vwap_pivot only, not the session sums. The series version holds
+# the forming bar, so every node still reruns when a tick moves the last
+# bar: the cache saves work on parameter changes and shared inputs, not on
+# new ticks. The cache keeps the max_entries nodes used last.
+#
+#   pipeline = Pipeline()
+#   param = {'vwap_begin_hour_list': [8, 16, 20], 'pivot_threshold': 0.6, 'pivot_left_len': 4, 'pivot_center_len': 4, 'pivot_right_len': 4}
+#   pipeline.compute(('NIKKEI', 'M1'), data, [Indicators.VWAP_SIGNAL, Indicators.VWAP_UPPER + '1'], param)
+#   data[Indicators.VWAP_SIGNAL]
+#
+# Outputs starting with '_' are intermediate and not written to the data.
+
+EPOCH = 'epoch'
+BARS = [Columns.OPEN, Columns.HIGH, Columns.LOW, Columns.CLOSE, Columns.VOLUME]
+
+
+class Node:
+    def __init__(self, name, outputs, inputs, params, function):
+        self.name = name
+        self.outputs = outputs
+        self.inputs = inputs
+        self.params = params
+        # function(*inputs, *params) returns the outputs in order
+        self.function = function
+
+
+def mid(op, cl):
+    return (array(op) + array(cl)) / 2
+
+def vwap_slope(vwap, epoch):
+    return slope(vwap, 10, (epoch[1] - epoch[0]) / 60)
+
+def vwap_bands(vwap, std):
+    out = []
+    for i in range(1, 5):
+        out += band(vwap, std, float(i))
+    return out
+
+def vwap_probability(mid, lower, vwap, upper):
+    pos = band_position(mid, lower, vwap, upper)
+    return probability(pos, [1, 2], 40), probability(pos, [-1, -2], 40)
+
+def dx(dip, dim):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.abs(dip - dim) / (dip + dim) * 100
+
+def polarity(dip, dim):
+    di = subtract(dip, dim)
+    pol = np.full(di.shape, np.nan)
+    pol[di > 0] = UP
+    pol[di < 0] = DOWN
+    return pol
+
+def vwap_band_names():
+    out = []
+    for i in range(1, 5):
+        out += [Indicators.VWAP_UPPER + str(i), Indicators.VWAP_LOWER + str(i)]
+    return out
+
+NODES = [
+    Node('MID', [Columns.MID], [Columns.OPEN, Columns.CLOSE], [], mid),
+    Node('TR', [Indicators.TR], [Columns.HIGH, Columns.LOW, Columns.CLOSE], [], true_range),
+    Node('ATR', [Indicators.ATR], [Indicators.TR], ['atr_window'], lambda tr, window: moving_average(tr, int(window))),
+    Node('DM', ['_DMP', '_DMM'], [Columns.HIGH, Columns.LOW], [], directional_movement),
+    Node('DI', [Indicators.DI_PLUS, Indicators.DI_MINUS], [Indicators.TR, '_DMP', '_DMM'], ['di_window'], directional_index),
+    Node('DX', [Indicators.DX], [Indicators.DI_PLUS, Indicators.DI_MINUS], [], dx),
+    Node('ADX', [Indicators.ADX], [Indicators.DX], ['adx_term'], moving_average),
+    Node('POLARITY', [Indicators.POLARITY], [Indicators.DI_PLUS, Indicators.DI_MINUS], [], polarity),
+    Node('SESSION', ['_SESSION'], [EPOCH], ['vwap_begin_hour_list'], session_begin),
+    Node('VWAP', [Indicators.VWAP, '_VWAP_STD'], [Columns.MID, Columns.VOLUME, '_SESSION'], [], session_vwap),
+    Node('VWAP_RATE', [Indicators.VWAP_RATE], [Columns.MID, Indicators.VWAP, '_VWAP_STD'], [], vwap_rate),
+    Node('VWAP_SLOPE', [Indicators.VWAP_SLOPE], [Indicators.VWAP, EPOCH], [], vwap_slope),
+    Node('VWAP_BANDS', vwap_band_names(), [Indicators.VWAP, '_VWAP_STD'], [], vwap_bands),
+    Node('VWAP_PROBABILITY', [Indicators.VWAP_UP, Indicators.VWAP_DOWN], [Columns.MID, Indicators.VWAP_LOWER + '4', Indicators.VWAP, Indicators.VWAP_UPPER + '4'], [], vwap_probability),
+    Node('VWAP_CROSS', [Indicators.VWAP_CROSS_UP, Indicators.VWAP_CROSS_DOWN, Indicators.VWAP_CROSS], [Indicators.VWAP_UP], [], lambda up: cross_value(up, 50)),
+    Node('VWAP_SIGNAL', [Indicators.VWAP_SIGNAL], [Indicators.VWAP_RATE], ['pivot_threshold', 'pivot_left_len', 'pivot_center_len', 'pivot_right_len'], vwap_pivot),
+    Node('ATR_TRAIL', [Indicators.ATR_TRAIL, Indicators.ATR_TRAIL_TREND, Indicators.ATR_TRAIL_UP, Indicators.ATR_TRAIL_DOWN], [Columns.HIGH, Columns.CLOSE, Indicators.ATR], ['atr_multiply', 'peak_hold_term'], atr_trail),
+    Node('SUPERTREND', [Indicators.SUPERTREND_UPPER, Indicators.SUPERTREND_LOWER, Indicators.SUPERTREND], [Columns.MID, Indicators.ATR], ['supertrend_multiply'], supertrend)
+]
+PRODUCER = {output: node for node in NODES for output in node.outputs}
+
+
+def series_version(data):
+    # closed bars do not change, the size, the first and last epoch and the
+    # forming bar identify the bars
+    if data.size == 0:
+        return (0, )
+    return (data.size, int(data.epoch[0]), int(data.epoch[-1])) + tuple(float(data[key][-1]) for key in BARS)
+
+def freeze(value):
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return tuple(value)
+    return value
+
+
+class Pipeline:
+    def __init__(self, max_entries=256):
+        # (series key, node name, params) -> (stamp, outputs), least
+        # recently used first
+        self.cache = OrderedDict()
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.computed = 0
+
+    def compute(self, key, data, names, param: dict):
+        # key: identifies the series, (symbol, timeframe) for instance
+        version = series_version(data)
+        values = {}
+        stamps = {}
+        with self.lock:
+            for name in names:
+                if name not in PRODUCER:
+                    raise Exception('Unknown indicator ' + name)
+                self.evaluate(PRODUCER[name], key, data, version, param, values, stamps)
+        for name, value in values.items():
+            if not name.startswith('_'):
+                data[name] = value
+        return data
+
+    def evaluate(self, node, key, data, version, param, values, stamps):
+        if node.name in stamps:
+            return stamps[node.name]
+        input_stamps = []
+        for name in node.inputs:
+            if name in PRODUCER:
+                input_stamps.append(self.evaluate(PRODUCER[name], key, data, version, param, values, stamps))
+        params = tuple(freeze(param[name]) for name in node.params)
+        stamp = (node.name, version, params, tuple(input_stamps))
+        cache_key = (key, node.name, params)
+        entry = self.cache.get(cache_key)
+        if entry is not None:
+            self.cache.move_to_end(cache_key)
+        if entry is None or entry[0] != stamp:
+            args = [values[name] if name in PRODUCER else self.column(data, name) for name in node.inputs]
+            outputs = node.function(*args, *[param[name] for name in node.params])
+            if len(node.outputs) == 1:
+                outputs = [outputs]
+            entry = (stamp, dict(zip(node.outputs, outputs)))
+            self.cache[cache_key] = entry
+            self.computed += 1
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+        values.update(entry[1])
+        stamps[node.name] = stamp
+        return stamp
+
+    def column(self, data, name):
+        if name == EPOCH:
+            return data.epoch
+        return data[name]
+
+    def clear(self, key=None):
+        with self.lock:
+            if key is None:
+                self.cache = OrderedDict()
+            else:
+                self.cache = OrderedDict((k, v) for k, v in self.cache.items() if k[0] != key)
+
+
+# the Pipeline of a worker process, see compute_columns
+process_pipeline = None
+
+def compute_columns(key, data, names, param):
+    # Pipeline.compute for a process pool: the bars come in pickled, the
+    # indicator columns go back with the span (pid, start, end) of the
+    # work. The cache of the process is kept between calls, send a series
+    # to the same process every time.
+    global process_pipeline
+    started = time.time()
+    if process_pipeline is None:
+        process_pipeline = Pipeline()
+    process_pipeline.compute(key, data, names, param)
+    columns = {name: data[name] for name in data.indicators}
+    return columns, (os.getpid(), started, time.time())
+
+
+def test():
+    from mt5_api import Mt5Api
+    from mt5_offline import SyntheticBackend
+
+    api = Mt5Api(backend=SyntheticBackend(seed=1))
+    data = api.get_rates('NIKKEI', 'M1', 20000)
+    param = {'vwap_begin_hour_list': [8, 16, 20], 'pivot_threshold': 0.6, 'pivot_left_len': 4, 'pivot_center_len': 4, 'pivot_right_len': 4,
+             'atr_window': 50, 'atr_multiply': 2.0, 'peak_hold_term': 10, 'di_window': 14, 'adx_term': 14}
+    names = [Indicators.VWAP_SIGNAL, Indicators.VWAP_UPPER + '1', Indicators.ATR_TRAIL, Indicators.ADX, Indicators.POLARITY]
+    pipeline = Pipeline()
+    for threshold in [0.6, 0.6, 0.8]:
+        param['pivot_threshold'] = threshold
+        t0 = time.time()
+        pipeline.compute(('NIKKEI', 'M1'), data, names, param)
+        print('threshold', threshold, 'nodes computed', pipeline.computed, 'Elapsed Time:', time.time() - t0)
+
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,133 @@
+import time
+import threading
+import numpy as np
+from concurrent.futures import wait
+
+
+# Background refresh of the data the dashboard draws. A job is a key and
+# a load function (fetch bars, compute indicators). get() returns the
+# latest snapshot of the job at once, only its first request runs load in
+# the caller. The poller thread reruns every job requested within expire
+# seconds each interval seconds and swaps in the new snapshot, so callers
+# never wait on the terminal. The thread starts on the first get() (in the
+# process serving the requests, also under gunicorn and the like). When it
+# is not running (stopped, died), get() reloads snapshots older than an
+# interval in the caller, so the data never freezes.
+#
+#   poller = Poller(5.0, 90.0, executor)
+#   snapshot = poller.get(('NIKKEI', 'M1', 400), lambda: load('NIKKEI', 'M1', 400))
+#   snapshot.value, snapshot.taken
+
+
+class Snapshot:
+    # value as loaded from taken (epoch seconds, start of the load), not
+    # changed afterwards
+    def __init__(self, value, taken: float):
+        self.value = value
+        self.taken = taken
+
+
+def frozen(frame):
+    # a BarFrame with read only columns, for snapshots shared by threads
+    frame.epoch.flags.writeable = False
+    for array in frame.columns.values():
+        array.flags.writeable = False
+    return frame
+
+
+class Poller:
+    def __init__(self, interval: float, expire: float, executor=None):
+        # executor: loads the jobs in parallel when given
+        self.interval = interval
+        self.expire = expire
+        self.executor = executor
+        # key -> [load, last request time]
+        self.jobs = {}
+        self.snapshots = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def get(self, key, load):
+        self.start()
+        now = time.time()
+        with self.lock:
+            job = self.jobs.get(key)
+            if job is None:
+                self.jobs[key] = [load, now]
+            else:
+                job[1] = now
+            snapshot = self.snapshots.get(key)
+        if snapshot is None or (not self.running() and now - snapshot.taken > self.interval):
+            snapshot = self.refresh(key, load)
+        return snapshot
+
+    def refresh(self, key, load):
+        started = time.time()
+        snapshot = Snapshot(load(), started)
+        with self.lock:
+            current = self.snapshots.get(key)
+            # a slower load started earlier does not replace a newer one
+            if key in self.jobs and (current is None or current.taken <= started):
+                self.snapshots[key] = snapshot
+        return snapshot
+
+    def poll(self):
+        # reload the active jobs, drop the ones not requested lately
+        now = time.time()
+        with self.lock:
+            for key in [key for key, job in self.jobs.items() if now - job[1] > self.expire]:
+                del self.jobs[key]
+                self.snapshots.pop(key, None)
+            jobs = [(key, job[0]) for key, job in self.jobs.items()]
+        if self.executor is None:
+            for key, load in jobs:
+                self.try_refresh(key, load)
+        else:
+            wait([self.executor.submit(self.try_refresh, key, load) for key, load in jobs])
+
+    def try_refresh(self, key, load):
+        # the last snapshot stays when the terminal fails
+        try:
+            self.refresh(key, load)
+        except Exception as e:
+            print('Poll error', key, e)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.poll()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None and not self.stopped.is_set():
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def running(self):
+        thread = self.thread
+        return thread is not None and thread.is_alive()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+def test():
+    count = [0]
+
+    def load():
+        count[0] += 1
+        return np.arange(count[0])
+
+    poller = Poller(0.1, 1.0)
+    first = poller.get('job', load)
+    time.sleep(0.35)
+    last = poller.get('job', load)
+    poller.stop()
+    print('loads', count[0], first.value, last.value, 'age', time.time() - last.taken)
+
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,211 @@
+import numpy as np
+from collections import deque
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+# Rolling window kernels used by technical.py
+#
+# Window sums are taken from cumulative sums, which makes every function
+# O(n) regardless of the window length. To keep the cumulative sums small
+# (prices around 40000 squared and accumulated over 1M bars lose most of
+# their digits) the series is cut into short overlapping blocks of about
+# two windows, every block is shifted by its own mean and the cumulative
+# sums restart at each block. Each value is visited about three times,
+# independent of the window length.
+#
+# Warmup semantics follow the list based indicators: the first window - 1
+# values are nan and any window that contains a nan gives nan.
+#
+# Every function runs along the last axis, a (symbols x bars) matrix is
+# computed row by row in the same numpy calls.
+
+BLOCK_SIZE = 16
+
+
+def as_array(vector):
+    return np.ascontiguousarray(vector, dtype=np.float64)
+
+def _blocks(vector, window: int):
+    # overlapping blocks of block + window - 1 values, one row per block
+    n = vector.shape[-1]
+    block = max(BLOCK_SIZE, 2 * window)
+    count = -(-(n - window + 1) // block)
+    length = count * block + window - 1
+    padded = np.full(vector.shape[:-1] + (length,), np.nan)
+    padded[..., :n] = vector
+    rows = sliding_window_view(padded, block + window - 1, axis=-1)[..., ::block, :]
+    return rows, block
+
+def _window_moments(vector, window: int, squared: bool, weighted=False):
+    # Window sums of y, y^2 and x*y (x = 0 .. window - 1 inside each window)
+    # of the block shifted values, plus the shift and the nan mask.
+    vector = as_array(vector)
+    n = vector.shape[-1]
+    window = int(window)
+    if window < 1 or window > n:
+        return None
+    rows, block = _blocks(vector, window)
+    invalid = np.isnan(rows)
+    valid_count = np.maximum((~invalid).sum(axis=-1, keepdims=True), 1)
+    values = np.where(invalid, 0.0, rows)
+    shift = values.sum(axis=-1, keepdims=True) / valid_count
+    values = np.where(invalid, 0.0, values - shift)
+
+    def window_sum(x):
+        c = np.zeros(x.shape[:-1] + (x.shape[-1] + 1,))
+        np.cumsum(x, axis=-1, out=c[..., 1:])
+        return c[..., window:] - c[..., :-window]
+
+    def flat(x):
+        return x.reshape(x.shape[:-2] + (-1,))[..., :n - window + 1]
+
+    s1 = window_sum(values)
+    s2 = flat(window_sum(values * values)) if squared else None
+    sxy = None
+    if weighted:
+        k = np.arange(rows.shape[-1], dtype=np.float64)
+        begin = np.arange(block, dtype=np.float64)
+        sxy = flat(window_sum(values * k) - begin * s1)
+    nan_count = window_sum(invalid.astype(np.float64))
+    shift = np.repeat(shift[..., 0], block, axis=-1)[..., :n - window + 1]
+    return flat(s1), s2, shift, flat(nan_count) > 0.5, sxy
+
+def rolling_sum(vector, window: int):
+    out = np.full(np.shape(vector), np.nan)
+    moments = _window_moments(vector, window, False)
+    if moments is None:
+        return out
+    s1, _, shift, invalid, _ = moments
+    s = s1 + window * shift
+    s[invalid] = np.nan
+    out[..., window - 1:] = s
+    return out
+
+def rolling_mean(vector, window: int):
+    out = np.full(np.shape(vector), np.nan)
+    moments = _window_moments(vector, window, False)
+    if moments is None:
+        return out
+    s1, _, shift, invalid, _ = moments
+    m = s1 / window + shift
+    m[invalid] = np.nan
+    out[..., window - 1:] = m
+    return out
+
+def rolling_var(vector, window: int, ddof=0):
+    out = np.full(np.shape(vector), np.nan)
+    if window - ddof < 1:
+        return out
+    moments = _window_moments(vector, window, True)
+    if moments is None:
+        return out
+    s1, s2, _, invalid, _ = moments
+    v = np.maximum(s2 - s1 * s1 / window, 0.0) / (window - ddof)
+    v[invalid] = np.nan
+    out[..., window - 1:] = v
+    return out
+
+def rolling_std(vector, window: int, ddof=0):
+    return np.sqrt(rolling_var(vector, window, ddof=ddof))
+
+def rolling_linear_regression(vector, window: int):
+    # Least squares line y = slope * x + intercept fitted to every window,
+    # x = 0 .. window - 1. Returns slope, intercept and the residual sum
+    # of squares, each aligned to the last bar of the window.
+    slope = np.full(np.shape(vector), np.nan)
+    intercept = np.full(np.shape(vector), np.nan)
+    rss = np.full(np.shape(vector), np.nan)
+    if window < 2:
+        return slope, intercept, rss
+    moments = _window_moments(vector, window, True, weighted=True)
+    if moments is None:
+        return slope, intercept, rss
+    sy, syy, shift, invalid, sxy = moments
+    w = float(window)
+    sx = w * (w - 1) / 2
+    sxx_c = w * (w * w - 1) / 12
+    sxy_c = sxy - sx * sy / w
+    syy_c = syy - sy * sy / w
+    m = sxy_c / sxx_c
+    b = (sy - m * sx) / w + shift
+    e = np.maximum(syy_c - m * sxy_c, 0.0)
+    m[invalid] = np.nan
+    b[invalid] = np.nan
+    e[invalid] = np.nan
+    slope[..., window - 1:] = m
+    intercept[..., window - 1:] = b
+    rss[..., window - 1:] = e
+    return slope, intercept, rss
+
+
+class RollingWindow:
+    # Welford style running mean / variance over the last `window` values.
+    # replace() overwrites the newest value, which is how a still forming
+    # bar is refreshed.
+    def __init__(self, window: int):
+        self.window = int(window)
+        self.values = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.nan_count = 0
+
+    def _add(self, value):
+        if np.isnan(value):
+            self.nan_count += 1
+            return
+        k = len(self.values) - self.nan_count
+        delta = value - self.mean
+        self.mean += delta / k
+        self.m2 += delta * (value - self.mean)
+
+    def _remove(self, value):
+        if np.isnan(value):
+            self.nan_count -= 1
+            return
+        k = len(self.values) - self.nan_count
+        if k == 0:
+            self.mean = 0.0
+            self.m2 = 0.0
+            return
+        delta = value - self.mean
+        self.mean -= delta / k
+        self.m2 -= delta * (value - self.mean)
+
+    def push(self, value):
+        value = float(value)
+        self.values.append(value)
+        self._add(value)
+        if len(self.values) > self.window:
+            old = self.values.popleft()
+            self._remove(old)
+
+    def replace(self, value):
+        if len(self.values) == 0:
+            self.push(value)
+            return
+        old = self.values.pop()
+        self._remove(old)
+        value = float(value)
+        self.values.append(value)
+        self._add(value)
+
+    def is_valid(self):
+        return len(self.values) == self.window and self.nan_count == 0
+
+    def sum(self):
+        if not self.is_valid():
+            return np.nan
+        return self.mean * self.window
+
+    def average(self):
+        if not self.is_valid():
+            return np.nan
+        return self.mean
+
+    def var(self, ddof=0):
+        if not self.is_valid() or self.window - ddof < 1:
+            return np.nan
+        return max(self.m2, 0.0) / (self.window - ddof)
+
+    def std(self, ddof=0):
+        return np.sqrt(self.var(ddof=ddof))
@@ -0,0 +1,164 @@
+import os
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from common import Indicators, Columns, Signal
+from technical import vwap_pivot, atr_trail, UP
+from pipeline import Pipeline
+
+
+# Parameter sweeps of the VWAP pivot signal and ATR_TRAIL over one history.
+# The intermediates shared by many combinations (MID, the session VWAP of
+# each begin hour list, TR, the ATR of each window) are computed once with
+# a Pipeline, copied into one shared memory block and read by the worker
+# processes without pickling, the workers run vwap_pivot / atr_trail for
+# each combination and return its summary row.
+#
+#   grid = {'vwap_begin_hour_list': [[8, 16, 20], [8]], 'pivot_threshold': [0.4, 0.6, 0.8],
+#           'pivot_left_len': [4], 'pivot_center_len': [4], 'pivot_right_len': [2, 4]}
+#   table = sweep_vwap_pivot(data, grid)
+#   table.sort_values('mean', ascending=False)
+
+VWAP_PARAMS = ['vwap_begin_hour_list', 'pivot_threshold', 'pivot_left_len', 'pivot_center_len', 'pivot_right_len']
+ATR_TRAIL_PARAMS = ['atr_window', 'atr_multiply', 'peak_hold_term']
+
+# arrays of the shared block in a worker
+shared = {}
+
+
+def share(arrays: dict):
+    # one shared memory block holding the arrays, layout: key -> (offset, shape, dtype)
+    size = sum([array.nbytes for array in arrays.values()])
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    layout = {}
+    offset = 0
+    for key, array in arrays.items():
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf, offset=offset)
+        view[...] = array
+        layout[key] = (offset, array.shape, array.dtype.str)
+        offset += array.nbytes
+    return shm, layout
+
+def attach(name, layout):
+    # worker initializer
+    shm = shared_memory.SharedMemory(name=name)
+    shared['shm'] = shm
+    for key, (offset, shape, dtype) in layout.items():
+        shared[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+
+def grid_combinations(grid: dict, names):
+    values = [grid[name] for name in names]
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+def hour_key(hours):
+    return 'rate_' + '_'.join([str(h) for h in hours])
+
+def run(arrays: dict, function, tasks, workers):
+    # function(task) -> dict, evaluated in a process pool reading the arrays
+    # from shared memory, in this process when workers is 0
+    if workers == 0:
+        # the arrays are released after the call
+        shared.update(arrays)
+        try:
+            return [function(task) for task in tasks]
+        finally:
+            shared.clear()
+    shm, layout = share(arrays)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=attach, initargs=(shm.name, layout)) as executor:
+            chunk = max(len(tasks) // (workers * 4), 1)
+            return list(executor.map(function, tasks, chunksize=chunk))
+    finally:
+        shm.close()
+        shm.unlink()
+
+def signal_stats(signal, close, horizon: int):
+    # number of signals and the close move horizon bars after them, in the
+    # direction of the signal
+    long = np.flatnonzero(signal == Signal.LONG)
+    short = np.flatnonzero(signal == Signal.SHORT)
+    n = len(close)
+    moves = np.concatenate([close[long[long < n - horizon] + horizon] - close[long[long < n - horizon]],
+                            close[short[short < n - horizon]] - close[short[short < n - horizon] + horizon]])
+    moves = moves[~np.isnan(moves)]
+    if len(moves) == 0:
+        return {'long': len(long), 'short': len(short), 'mean': np.nan, 'std': np.nan, 'win_rate': np.nan}
+    return {'long': len(long), 'short': len(short), 'mean': np.mean(moves), 'std': np.std(moves), 'win_rate': np.mean(moves > 0)}
+
+def trend_stats(trend, close):
+    # trend changes, share of up bars and the close move earned following
+    # the trend of the previous bar
+    valid = trend != 0
+    changes = np.count_nonzero(valid[1:] & valid[:-1] & (trend[1:] != trend[:-1]))
+    profit = np.nansum(trend[:-1] * np.diff(close))
+    up = np.count_nonzero(trend == UP) / max(np.count_nonzero(valid), 1)
+    return {'changes': changes, 'up_ratio': up, 'profit': profit}
+
+def vwap_pivot_task(task):
+    param, horizon = task
+    rate = shared[hour_key(param['vwap_begin_hour_list'])]
+    signal = vwap_pivot(rate, param['pivot_threshold'], param['pivot_left_len'], param['pivot_center_len'], param['pivot_right_len'])
+    return signal_stats(signal, shared[Columns.CLOSE], horizon)
+
+def atr_trail_task(task):
+    param = task
+    atr = shared['atr_' + str(int(param['atr_window']))]
+    _, trend, _, _ = atr_trail(shared[Columns.HIGH], shared[Columns.CLOSE], atr, param['atr_multiply'], param['peak_hold_term'])
+    return trend_stats(trend, shared[Columns.CLOSE])
+
+def table(combinations, rows):
+    out = pd.DataFrame(combinations)
+    return pd.concat([out, pd.DataFrame(rows)], axis=1)
+
+def sweep_vwap_pivot(data, grid: dict, horizon=10, workers=None):
+    # grid: VWAP_PARAMS -> list of values
+    combinations = grid_combinations(grid, VWAP_PARAMS)
+    frame = data.copy()
+    pipeline = Pipeline()
+    arrays = {Columns.CLOSE: np.asarray(frame[Columns.CLOSE], dtype=np.float64)}
+    for hours in grid['vwap_begin_hour_list']:
+        pipeline.compute('sweep', frame, [Indicators.VWAP_RATE], {'vwap_begin_hour_list': hours})
+        arrays[hour_key(hours)] = frame[Indicators.VWAP_RATE]
+    tasks = [(param, horizon) for param in combinations]
+    rows = run(arrays, vwap_pivot_task, tasks, default_workers(workers))
+    return table(combinations, rows)
+
+def sweep_atr_trail(data, grid: dict, workers=None):
+    # grid: ATR_TRAIL_PARAMS -> list of values
+    combinations = grid_combinations(grid, ATR_TRAIL_PARAMS)
+    frame = data.copy()
+    pipeline = Pipeline()
+    arrays = {Columns.HIGH: np.asarray(frame[Columns.HIGH], dtype=np.float64),
+              Columns.CLOSE: np.asarray(frame[Columns.CLOSE], dtype=np.float64)}
+    for window in grid['atr_window']:
+        pipeline.compute('sweep', frame, [Indicators.ATR], {'atr_window': window})
+        arrays['atr_' + str(int(window))] = frame[Indicators.ATR]
+    rows = run(arrays, atr_trail_task, combinations, default_workers(workers))
+    return table(combinations, rows)
+
+def default_workers(workers):
+    if workers is None:
+        return os.cpu_count() or 1
+    return workers
+
+
+def test():
+    import time
+    from mt5_api import Mt5Api
+    from mt5_offline import SyntheticBackend
+
+    api = Mt5Api(backend=SyntheticBackend(seed=1))
+    data = api.get_rates('NIKKEI', 'M1', 100000)
+    t0 = time.time()
+    grid = {'vwap_begin_hour_list': [[8, 16, 20], [8]], 'pivot_threshold': [0.4, 0.6, 0.8, 1.0],
+            'pivot_left_len': [3, 4, 6], 'pivot_center_len': [4], 'pivot_right_len': [2, 4]}
+    print(sweep_vwap_pivot(data, grid).sort_values('mean', ascending=False).head(10))
+    grid = {'atr_window': [20, 50, 100], 'atr_multiply': [1.0, 2.0, 3.0], 'peak_hold_term': [10, 20, 50]}
+    print(sweep_atr_trail(data, grid).sort_values('profit', ascending=False).head(10))
+    print('Elapsed Time:', time.time() - t0)
+
+
+if __name__ == '__main__':
+    test()
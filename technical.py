@@ -1,178 +1,239 @@
 import numpy as np 
+import pandas as pd
 import math
 import statistics as stat
 from common import Indicators, Signal, Columns, UP, DOWN, HIGH, LOW, HOLD
 from datetime import datetime, timedelta
-from utils import Utils
+from numpy.lib.stride_tricks import sliding_window_view
+from rolling import rolling_sum, rolling_mean, rolling_std, rolling_linear_regression
 from dateutil import tz
+try:
+    from numba import njit
+except ImportError:
+    # optional, the state machine kernels run as plain python without it
+    njit = None
 
 JST = tz.gettz('Asia/Tokyo')
 UTC = tz.gettz('utc') 
+JST_OFFSET = 9 * 60 * 60
+DAY = 24 * 60 * 60
 
+# The vectorized helpers (moving_average, slope, true_range, cross_value,
+# median, band_position, probability, vwap_rate ...) run along the last
+# axis, technical_batch.py passes (symbols x bars) matrices through them.
+
+
+def jit(function):
+    # compiled with numba when it is installed, the python function otherwise
+    if njit is None:
+        return function
+    return njit(cache=True)(function)
     
+def array(vector):
+    return np.ascontiguousarray(vector, dtype=np.float64)
+
 def nans(length):
-    return [np.nan for _ in range(length)]
+    return np.full(length, np.nan)
 
 def full(value, length):
-    return [value for _ in range(length)]
+    return np.full(length, value, dtype=np.float64)
 
 def moving_average(vector, window):
-    window = int(window)
-    n = len(vector)
-    out = nans(n)
-    ivalid = window- 1
-    if ivalid < 0:
-        return out
-    for i in range(ivalid, n):
-        d = vector[i - window + 1: i + 1]
-        out[i] = stat.mean(d)
-    return out
+    return rolling_mean(array(vector), int(window))
 
 def slope(signal: list, window: int, minutes: int, tolerance=0.0):
-    n = len(signal)
-    out = full(0, n)
-    for i in range(window - 1, n):
-        d = signal[i - window + 1: i + 1]
-        m, offset = np.polyfit(range(window), d, 1)
-        if abs(m) > tolerance:
-            out[i] = m / np.mean(d[:3]) * 100.0 / (window * minutes)  * 60 * 24
+    signal = array(signal)
+    n = signal.shape[-1]
+    out = full(0, signal.shape)
+    if window < 1 or window > n:
+        return out
+    m, _, _ = rolling_linear_regression(signal, window)
+    m = m[..., window - 1:]
+    # mean of the first 3 values of each window
+    head = min(3, window)
+    begin = rolling_mean(signal, head)[..., head - 1: n - window + head]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = m / begin * 100.0 / (window * minutes)  * 60 * 24
+    # nan windows and flat lines stay at 0
+    out[..., window - 1:] = np.where(np.abs(m) > tolerance, s, 0)
     return out
 
 def subtract(signal1: list, signal2:list):
     n = len(signal1)
     if len(signal2) != n:
         raise Exception('dont match list size')
-    out = nans(n)
-    for i in range(n):
-        if is_nan(signal1[i]) or is_nan(signal2[i]):
-            continue
-        out[i] = signal1[i] - signal2[i]
-    return out
+    return array(signal1) - array(signal2)
 
 
 def linearity(signal: list, window: int):
+    signal = array(signal)
     n = len(signal)
     out = nans(n)
-    for i in range(window, n):
-        data = signal[i - window + 1: i + 1]
-        if is_nans(data):
-            continue
-        m, offset = np.polyfit(range(window), data, 1)
-        e = 0
-        for j, d in enumerate(data):
-            estimate = m * j + offset
-            e += pow(estimate - d, 2)
-        error = np.sqrt(e) / window / data[0] * 100.0
-        if error == 0:
-            out[i] = 100.0
-        else:
-            out[i] = 1 / error
+    if window < 1 or window >= n:
+        return out
+    _, _, rss = rolling_linear_regression(signal, window)
+    first = signal[1: n - window + 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        error = np.sqrt(rss[window:]) / window / first * 100.0
+        out[window:] = np.where(error == 0, 100.0, 1 / error)
     return out
             
             
 def true_range(high, low, cl):
-    n = len(high)
-    out = nans(n)
-    ivalid = 1
-    for i in range(ivalid, n):
-        d = [ high[i] - low[i],
-              abs(high[i] - cl[i - 1]),
-              abs(low[i] - cl[i - 1])]
-        out[i] = max(d)
+    high = array(high)
+    low = array(low)
+    cl = array(cl)
+    out = nans(high.shape)
+    if high.shape[-1] < 2:
+        return out
+    d0 = high[..., 1:] - low[..., 1:]
+    d1 = np.abs(high[..., 1:] - cl[..., :-1])
+    d2 = np.abs(low[..., 1:] - cl[..., :-1])
+    # same as max([d0, d1, d2]) : nan is kept only when it comes first
+    tr = np.where(d1 > d0, d1, d0)
+    out[..., 1:] = np.where(d2 > tr, d2, tr)
     return out
 
 def roi(vector:list):
+    vector = array(vector)
     n = len(vector)
     out = nans(n)
-    for i in range(1, n):
-        if is_nan(vector[i - 1]) or is_nan(vector[i]):
-            continue
-        if vector[i - 1] == 0:
-            out[i] = 0.0
-        else:
-            out[i] = (vector[i] - vector[i - 1]) / vector[i - 1] * 100.0
+    if n < 2:
+        return out
+    prev = vector[:-1]
+    cur = vector[1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = (cur - prev) / prev * 100.0
+    r[prev == 0] = 0.0
+    r[np.isnan(cur)] = np.nan
+    out[1:] = r
     return out
 
 
+def list_max(windows):
+    # max() of python lists along the last axis: nan when the first value
+    # is nan, later nans are skipped
+    return np.where(np.isnan(windows[..., 0]), np.nan, np.fmax.reduce(windows, axis=-1))
+
+def list_min(windows):
+    return np.where(np.isnan(windows[..., 0]), np.nan, np.fmin.reduce(windows, axis=-1))
+
+def slice_has_nan(vector, start, stop):
+    # is_nans(vector[start: stop]) for arrays of start / stop, with python
+    # slice semantics: negative starts count from the end and empty slices
+    # count as nan
+    n = vector.shape[-1]
+    start = np.where(start < 0, np.maximum(start + n, 0), start)
+    count = np.zeros(vector.shape[:-1] + (n + 1,))
+    np.cumsum(np.isnan(vector), axis=-1, out=count[..., 1:])
+    return (start >= stop) | (count[..., stop] - count[..., np.minimum(start, n)] > 0)
+
+@jit
+def cooldown_kernel(index, values, out, last_long, last_short, term, long):
+    # index: candidate bars in order, values: their signals, last_*: bar of
+    # the last signal given
+    for j in range(len(index)):
+        i = index[j]
+        value = values[j]
+        if value == long:
+            if i - last_long > term:
+                out[i] = value
+                last_long = i
+        else:
+            if i - last_short > term:
+                out[i] = value
+                last_short = i
+
+def cooldown(candidate, out, begin=0, term=10):
+    # Linear pass over the candidate signals (LONG / SHORT, nan elsewhere)
+    # from begin on: a signal is written to out unless out already has the
+    # same signal in the previous term bars
+    n = candidate.shape[-1]
+    for c, o in zip(candidate.reshape(-1, n), out.reshape(-1, n)):
+        last = []
+        for value in [Signal.LONG, Signal.SHORT]:
+            given = np.flatnonzero(o[max(begin - term, 0): begin] == value)
+            last.append(int(given[-1]) + max(begin - term, 0) if len(given) > 0 else -term - 1)
+        index = np.flatnonzero(~np.isnan(c[begin:])) + begin
+        cooldown_kernel(index, c[index], o, last[0], last[1], term, Signal.LONG)
+    return out
+
 def pivot(vector: list, left_length: int, right_length: int, threshold: float):
-    n = len(vector)
-    high = nans(n)
-    low = nans(n)
-    state = full(0, n)
-    for i in range(left_length + right_length, n):
-        center = vector[i - right_length]
-        left = vector[i - left_length - right_length: i - right_length]
-        right = vector[i - right_length + 1: i + 1]
-        if threshold is not None:
-            if abs(center) < threshold:
-                continue
-        if center > max(left) and center > max(right):
-            high[i - right_length] = center
-            state[i] = HIGH
-        elif center < min(left) and center < min(right):
-            low[i - right_length] = center
-            state[i] = LOW
+    vector = array(vector)
+    n = vector.shape[-1]
+    high = nans(vector.shape)
+    low = nans(vector.shape)
+    state = full(0, vector.shape)
+    length = left_length + right_length + 1
+    if length > n:
+        return high, low, state
+    # windows around every center, the bar i is the last one of the window
+    windows = sliding_window_view(vector, length, axis=-1)
+    left = windows[..., :left_length]
+    center = windows[..., left_length]
+    right = windows[..., left_length + 1:]
+    candidate = np.ones(center.shape, dtype=bool)
+    if threshold is not None:
+        candidate = ~(np.abs(center) < threshold)
+    is_high = candidate & (center > list_max(left)) & (center > list_max(right))
+    is_low = candidate & ~is_high & (center < list_min(left)) & (center < list_min(right))
+    c = slice(left_length, n - right_length)
+    i = slice(length - 1, n)
+    high[..., c] = np.where(is_high, center, np.nan)
+    low[..., c] = np.where(is_low, center, np.nan)
+    state[..., i] = np.where(is_high, HIGH, np.where(is_low, LOW, 0))
     return high, low, state
 
 def cross_value(vector: list, value):
-    n = len(vector)
-    up = nans(n)
-    down = nans(n)
-    cross = full(HOLD, n)
-    for i in range(1, n):
-        if vector[i - 1] < value and vector[i] >= value:
-            up[i] = 1
-            cross[i] = UP
-        elif vector[i - 1] > value and vector[i] <= value:
-            down[i] = 1
-            cross[i] = DOWN
+    vector = array(vector)
+    up = nans(vector.shape)
+    down = nans(vector.shape)
+    cross = full(HOLD, vector.shape)
+    if vector.shape[-1] < 2:
+        return up, down, cross
+    prev = vector[..., :-1]
+    cur = vector[..., 1:]
+    i_up = np.zeros(vector.shape, dtype=bool)
+    i_down = np.zeros(vector.shape, dtype=bool)
+    i_up[..., 1:] = (prev < value) & (cur >= value)
+    i_down[..., 1:] = (prev > value) & (cur <= value)
+    up[i_up] = 1
+    cross[i_up] = UP
+    down[i_down] = 1
+    cross[i_down] = DOWN
     return up, down, cross
 
 
 def median(vector, window):
-    n = len(vector)
-    out = nans(n)
-    for i in range (window, n):
-        d = vector[i - window: i + 1]
-        if is_nans(d):
-            continue
-        med = np.median(d)
-        out[i] = med
+    # median of the last window + 1 values, nan when one of them is nan
+    vector = array(vector)
+    out = nans(vector.shape)
+    if window < 0 or window >= vector.shape[-1]:
+        return out
+    out[..., window:] = np.median(sliding_window_view(vector, window + 1, axis=-1), axis=-1)
     return out
         
 
     
 def band_position(data, lower, center, upper):
-    n = len(data)
-    pos = full(0, n)
-    for i in range(n):
-        if is_nan(data[i]):
-            continue 
-        if data[i] > upper[i]:
-            pos[i] = 2
-        else:
-            if data[i] > center[i]:
-                pos[i] = 1
-        if data[i] < lower[i]:
-            pos[i] = -2
-        else:
-            if data[i] < center[i]:
-                pos[i] = -1
+    data = array(data)
+    lower = array(lower)
+    center = array(center)
+    upper = array(upper)
+    # comparisons with nan are False, so nan data stays at 0
+    pos = np.where(data > upper, 2.0, np.where(data > center, 1.0, 0.0))
+    pos = np.where(data < lower, -2.0, np.where(data < center, -1.0, pos))
     return pos
 
 def probability(position, states, window):
-    n = len(position)
-    prob = full(0, n)
-    for i in range(window - 1, n):
-        s = 0
-        for j in range(i - window + 1, i + 1):
-            if is_nan(position[j]):
-                continue
-            for st in states:
-                if position[j] == st:
-                    s += 1
-                    break
-        prob[i] = float(s) / float(window) * 100.0 
+    position = array(position)
+    prob = full(0, position.shape)
+    if window < 1 or window > position.shape[-1]:
+        return prob
+    hit = np.isin(position, states).astype(np.float64)
+    # counts are integers, round off the shift used by rolling_sum
+    count = np.rint(rolling_sum(hit, window))
+    prob[..., window - 1:] = count[..., window - 1:] / float(window) * 100.0
     return prob      
         
 def MA( dic: dict, column: str, window: int):
@@ -196,34 +257,36 @@ def ATR(dic: dict, term: int, term_long:int):
         dic[Indicators.ATR_LONG] = atr_long
 
     
+def directional_movement(high, low):
+    high = array(high)
+    low = array(low)
+    dmp = nans(high.shape)
+    dmm = nans(high.shape)
+    if high.shape[-1] < 2:
+        return dmp, dmm
+    p = high[..., 1:] - high[..., :-1]
+    m = low[..., :-1] - low[..., 1:]
+    dmp[..., 1:] = np.where(p > m, p, 0.0)
+    dmm[..., 1:] = np.where(p < m, m, 0.0)
+    return dmp, dmm
+
+def directional_index(tr, dmp, dmm, window: int):
+    s_tr = rolling_sum(array(tr), window)
+    s_dmp = rolling_sum(dmp, window)
+    s_dmm = rolling_sum(dmm, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dip = s_dmp / s_tr * 100
+        dim = s_dmm / s_tr * 100
+    return dip, dim
+    
 def ADX(data: dict, di_window: int, adx_term: int, adx_term_long:int):
     hi = data[Columns.HIGH]
     lo = data[Columns.LOW]
     tr = data[Indicators.TR]
-    n = len(hi)
-    dmp = nans(n)     
-    dmm = nans(n)     
-    for i in range(1, n):
-        p = hi[i]- hi[i - 1]
-        m = lo[i - 1] - lo[i]
-        dp = dn = 0
-        if p >= 0 or n >= 0:
-            if p > m:
-                dp = p
-            if p < m:
-                dn = m
-        dmp[i] = dp
-        dmm[i] = dn
-    dip = nans(n)
-    dim = nans(n)
-    dx = nans(n)
-    for i in range(di_window - 1, n):
-        s_tr = sum(tr[i - di_window + 1: i + 1])
-        s_dmp = sum(dmp[i - di_window + 1: i + 1])
-        s_dmm = sum(dmm[i - di_window + 1: i + 1])
-        dip[i] = s_dmp / s_tr * 100 
-        dim[i] = s_dmm / s_tr * 100
-        dx[i] = abs(dip[i] - dim[i]) / (dip[i] + dim[i]) * 100
+    dmp, dmm = directional_movement(hi, lo)
+    dip, dim = directional_index(tr, dmp, dmm, di_window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dx = np.abs(dip - dim) / (dip + dim) * 100
     adx = moving_average(dx, adx_term)
     data[Indicators.DX] = dx
     data[Indicators.ADX] = adx
@@ -238,67 +301,30 @@ def POLARITY(data: dict, window: int):
     hi = data[Columns.HIGH]
     lo = data[Columns.LOW]
     tr = data[Indicators.TR]
-    n = len(hi)
-    dmp = nans(n)     
-    dmm = nans(n)     
-    for i in range(1, n):
-        p = hi[i]- hi[i - 1]
-        m = lo[i - 1] - lo[i]
-        dp = dn = 0
-        if p >= 0 or n >= 0:
-            if p > m:
-                dp = p
-            if p < m:
-                dn = m
-        dmp[i] = dp
-        dmm[i] = dn
-    dip = nans(n)
-    dim = nans(n)
-    for i in range(window - 1, n):
-        s_tr = sum(tr[i - window + 1: i + 1])
-        s_dmp = sum(dmp[i - window + 1: i + 1])
-        s_dmm = sum(dmm[i - window + 1: i + 1])
-        dip[i] = s_dmp / s_tr * 100 
-        dim[i] = s_dmm / s_tr * 100
-    
+    dmp, dmm = directional_movement(hi, lo)
+    dip, dim = directional_index(tr, dmp, dmm, window)
     di = subtract(dip, dim)
-    pol = nans(n)
-    for i in range(n):
-        if is_nan(di[i]):
-            continue
-        if di[i] > 0:
-            pol[i] = UP
-        elif di[i] < 0:
-            pol[i] = DOWN
+    pol = nans(di.shape)
+    pol[di > 0] = UP
+    pol[di < 0] = DOWN
     data[Indicators.POLARITY] = pol  
     
+def moving_std(vector, window):
+    return rolling_std(array(vector), int(window))
+
 def BBRATE(data: dict, window: int, ma_window):
-    cl = data[Columns.CLOSE]
-    n = len(cl)
-    std = nans(n)     
-    for i in range(window - 1, n):
-        d = cl[i - window + 1: i + 1]    
-        std[i] = np.std(d)   
+    cl = array(data[Columns.CLOSE])
+    std = moving_std(cl, window)
     ma = moving_average(cl, ma_window)     
-    rate = nans(n)
-    for i in range(n):
-        c = cl[i]
-        m = ma[i]
-        s = std[i]
-        if is_nans([c, m, s]):
-            continue
-        rate[i] = (cl[i] - ma[i]) / s * 100.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = (cl - ma) / std * 100.0
     data[Indicators.BBRATE] = rate
     
 
 def BB(data: dict, window: int, ma_window:int, band_multiply):
-    cl = data[Columns.CLOSE]
-    n = len(cl)
+    cl = array(data[Columns.CLOSE])
     #ro = roi(cl)
-    std = nans(n)     
-    for i in range(window - 1, n):
-        d = cl[i - window + 1: i + 1]    
-        std[i] = np.std(d)   
+    std = moving_std(cl, window)
     ma = moving_average(cl, ma_window)     
         
     upper, lower = band(ma, std, band_multiply)    
@@ -325,140 +351,141 @@ def time_jst(year, month, day, hour=0):
 
 
 def pivot2(signal, threshold, left_length=2, right_length=2):
-    n = len(signal)
-    out = full(np.nan, n) 
-    out_mid = full(np.nan, n)
-    for i in range(left_length + right_length, n):
-        if is_nans(signal[i - right_length - right_length: i + 1]):
-            continue
-        center = signal[i - right_length]
-        left = signal[i - left_length - right_length: i - right_length]
-        range_left = abs(max(left) - min(left))
-        right = signal[i - right_length + 1: i + 1]
-        d_right = np.mean(right) - center
-        
-        if range_left < 5:
-            if center >= 90 and d_right < -threshold:
-                if np.nanmin(out[i - 10: i]) != Signal.SHORT:
-                    out[i] = Signal.SHORT
-            elif center <= 10 and d_right > threshold:
-                if np.nanmax(out[i - 10: i]) != Signal.LONG:
-                    out[i] = Signal.LONG
-                                
-            if center >= 40 and center <= 60:
-                if d_right < -threshold:
-                    if np.nanmin(out_mid[i - 10: i]) != Signal.SHORT:
-                        out_mid[i] = Signal.SHORT 
-                elif d_right > threshold:
-                    if np.nanmax(out_mid[i - 10: i]) != Signal.LONG:
-                        out_mid[i] = Signal.LONG 
+    signal = array(signal)
+    n = signal.shape[-1]
+    out = full(np.nan, signal.shape) 
+    out_mid = full(np.nan, signal.shape)
+    first = left_length + right_length
+    if first >= n:
+        return out, out_mid
+    i = np.arange(first, n)
+    skip = slice_has_nan(signal, i - right_length - right_length, i + 1)
+    windows = sliding_window_view(signal, first + 1, axis=-1)
+    left = windows[..., :left_length]
+    center = windows[..., left_length]
+    right = windows[..., left_length + 1:]
+    range_left = np.abs(list_max(left) - list_min(left))
+    d_right = np.mean(right, axis=-1) - center
+    valid = ~skip & (range_left < 5)
+    
+    candidate = full(np.nan, out.shape)
+    short = valid & (center >= 90) & (d_right < -threshold)
+    long = valid & ~short & (center <= 10) & (d_right > threshold)
+    candidate[..., first:] = np.where(short, Signal.SHORT, np.where(long, Signal.LONG, np.nan))
+    cooldown(candidate, out)
+    
+    candidate = full(np.nan, out.shape)
+    mid = valid & (center >= 40) & (center <= 60)
+    short = mid & (d_right < -threshold)
+    long = mid & ~short & (d_right > threshold)
+    candidate[..., first:] = np.where(short, Signal.SHORT, np.where(long, Signal.LONG, np.nan))
+    cooldown(candidate, out_mid)
     return out, out_mid
 
 def vwap_rate(price, vwap, std):
-    n = len(price)
-    rate = nans(n)
-    i = -1
-    for p, v, s in zip(price, vwap, std):
-        i += 1
-        if is_nans(([p, v, s])):
-            continue
-        if s != 0.0:
-            r = (p - v) / s * 100.0
-            rate[i] = r #20 * int(r / 20)        
+    price = array(price)
+    vwap = array(vwap)
+    std = array(std)
+    # nan in any input gives nan, as a zero std does
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.where(std != 0.0, (price - vwap) / std * 100.0, np.nan) #20 * int(r / 20)
     med = median(rate, 10)        
     ma = moving_average(med, 20)
     return ma
 
-def vwap_pivot(signal, threshold, left_length, center_length, right_length):
-    n = len(signal)
-    out = full(np.nan, n) 
-    for i in range(left_length + center_length + right_length, n):
-        if is_nans(signal[i - right_length - center_length - right_length: i + 1]):
-            continue
-        l = i - left_length - center_length - right_length + 1
-        c = i - right_length - center_length + 1
-        r = i - right_length + 1
-        left = signal[l: c]
-        center = np.mean(signal[c: r])
-        right = signal[r: i + 1]
-        
-        polarity = 0
+def vwap_pivot(signal, threshold, left_length, center_length, right_length, out=None, begin=0):
+    # out / begin : continue a previous result, only bars from begin are
+    # evaluated and the signal cooldown looks back into out
+    signal = array(signal)
+    n = signal.shape[-1]
+    if out is None:
+        out = full(np.nan, signal.shape) 
+    else:
+        out[..., begin:] = np.nan
+    length = left_length + center_length + right_length
+    first = max(begin, length)
+    if first >= n:
+        return out
+    i = np.arange(first, n)
+    skip = slice_has_nan(signal, i - right_length - center_length - right_length, i + 1)
+    # left, center and right windows ending at bar i
+    windows = sliding_window_view(signal, length, axis=-1)[..., first - length + 1:, :]
+    left = windows[..., :left_length]
+    center = np.mean(windows[..., left_length: left_length + center_length], axis=-1)
+    right = windows[..., left_length + center_length:]
+    with np.errstate(invalid='ignore'):
         # V peak
-        d_left = np.nanmax(left) - center
-        d_right = np.nanmax(right) - center
-        if d_left > 0 or d_right > 0:
-            if d_left >= threshold and d_right >= threshold:
-                polarity = 1
+        d_left = np.fmax.reduce(left, axis=-1) - center
+        d_right = np.fmax.reduce(right, axis=-1) - center
+        long = ((d_left > 0) | (d_right > 0)) & (d_left >= threshold) & (d_right >= threshold)
         # ^ Peak
-        d_left = center - np.nanmin(left)
-        d_right = center - np.nanmin(right)
-        if d_left > 0 and d_right > 0:
-            if d_left >= threshold and d_right >= threshold:
-                polarity = -1
-        
-        if polarity == 0:      
-            sig = np.nan
-        elif polarity > 0:
-            sig = Signal.LONG
-        elif polarity < 0:
-            sig = Signal.SHORT
-
-        """
-        if center >= 200:
-            if sig == Signal.LONG:
-                sig = np.nan
-                    
-        if center > -50 and center < 50:
-            sig = np.nan
-    
-        if center <= -200:
-            if sig == Signal.SHORT:
-                sig = np.nan            
-        """
-        
-        if sig == Signal.SHORT:
-            if np.nanmin(out[i - 10: i]) == Signal.SHORT:
-                sig = np.nan
-        elif sig == Signal.LONG:
-            if np.nanmax(out[i - 10: i]) == Signal.LONG:
-                sig = np.nan
-                           
-        out[i] = sig
-    return out
-
-def VWAP(data: dict, begin_hour_list, pivot_threshold, pivot_left_len, pivot_center_len, pivot_right_len):
+        d_left = center - np.fmin.reduce(left, axis=-1)
+        d_right = center - np.fmin.reduce(right, axis=-1)
+        short = (d_left > 0) & (d_right > 0) & (d_left >= threshold) & (d_right >= threshold)
+    candidate = full(np.nan, signal.shape)
+    candidate[..., first:] = np.where(~skip & short, Signal.SHORT, np.where(~skip & long, Signal.LONG, np.nan))
+    return cooldown(candidate, out, begin)
+
+def session_begin(data: dict, begin_hour_list):
+    # bars opening a vwap session: on the hour (jst) at one of the begin
+    # hours. VWAP(session=) takes the result, so it is computed once for
+    # several parameter sets. data: bars or their epoch array
+    if isinstance(data, np.ndarray):
+        t = (data + JST_OFFSET) % DAY
+    elif hasattr(data, 'epoch'):
+        t = (data.epoch + JST_OFFSET) % DAY
+    else:
+        jst = pd.DatetimeIndex(data[Columns.JST])
+        t = np.asarray(jst.hour * 3600 + jst.minute * 60 + jst.second)
+    return (t % 3600 == 0) & np.isin(t // 3600, begin_hour_list)
+
+def session_cumsum(values, begin, carry=None):
+    # running sums restarting at every session begin along the last axis,
+    # nan before the first one. np.cumsum over each session adds in the
+    # same order as a bar loop, the sums are bit for bit the same.
+    # carry: sum of the session running before index 0 (1d values), it is
+    # continued up to the first begin
+    length = values.shape[-1]
+    flat = values.ravel()
+    out = np.full(flat.shape, np.nan)
+    starts = np.flatnonzero(begin.ravel())
+    ends = np.minimum(np.append(starts[1:], flat.size), (starts // length + 1) * length)
+    for s, e in zip(starts, ends):
+        np.cumsum(flat[s: e], out=out[s: e])
+    if carry is not None and not np.isnan(carry):
+        first = starts[0] if len(starts) > 0 else flat.size
+        out[:first] = np.cumsum(np.concatenate([[carry], flat[:first]]))[1:]
+    return out.reshape(values.shape)
+
+def session_sums(mid, volume, begin, carry=(None, None, None)):
+    # running volume, volume * price and volume * price^2 of each session,
+    # carry: the three sums of the session running before index 0
+    return (session_cumsum(volume, begin, carry[0]),
+            session_cumsum(volume * mid, begin, carry[1]),
+            session_cumsum(volume * mid * mid, begin, carry[2]))
+
+def sums_vwap(volume_sum, vwap_sum, power_sum):
+    # vwap and its standard deviation (0 where undefined) from session sums
+    traded = volume_sum > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vwap = np.where(traded, vwap_sum / volume_sum, np.nan)
+        deviation = power_sum / volume_sum - vwap * vwap
+        std = np.where(traded & (deviation > 0), np.sqrt(deviation), 0.0)
+    return vwap, std
+
+def session_vwap(mid, volume, begin):
+    # vwap and its standard deviation (0 where undefined) of each session
+    return sums_vwap(*session_sums(mid, volume, begin))
+
+def VWAP(data: dict, begin_hour_list, pivot_threshold, pivot_left_len, pivot_center_len, pivot_right_len, session=None):
+    # session: session_begin(data, begin_hour_list) computed before
     jst = data[Columns.JST]
-    n = len(jst)
     MID(data)
     mid = data[Columns.MID]
-    volume = data['tick_volume']
-    
-    vwap = full(np.nan, n)
-    power_acc = full(np.nan, n)
-    volume_acc = full(np.nan, n)
-    std = full(0, n)
-    valid = False
-    for i in range(n):
-        t = jst[i]
-        if t.hour in begin_hour_list:
-            if t.minute == 0 and t.second == 0:
-                power_sum = 0
-                vwap_sum = 0
-                volume_sum = 0
-                valid = True
-        if valid:
-            vwap_sum += volume[i] * mid[i]
-            volume_sum += volume[i]  
-            volume_acc[i] = volume_sum
-            power_sum += volume[i] * mid[i] * mid[i]  
-            if volume_sum > 0:
-                vwap[i] = vwap_sum / volume_sum
-                power_acc[i] = power_sum
-                deviation = power_sum / volume_sum - vwap[i] * vwap[i]
-                if deviation > 0:
-                    std[i] = np.sqrt(deviation)
-                else:
-                    std[i] = 0
+    volume = np.asarray(data[Columns.VOLUME])
+    if session is None:
+        session = session_begin(data, begin_hour_list)
+    vwap, std = session_vwap(mid, volume, session)
     data[Indicators.VWAP] = vwap
     rate = vwap_rate(mid, vwap, std)
     data[Indicators.VWAP_RATE] = rate
@@ -487,12 +514,10 @@ def VWAP(data: dict, begin_hour_list, pivot_threshold, pivot_left_len, pivot_cen
     #data[Indicators.VWAP_SIGNAL_MID] = signal_mid
        
 def band(vector, signal, multiply):
-    n = len(vector)
-    upper = nans(n)
-    lower = nans(n)
-    for i in range(n):
-        upper[i] = vector[i] + multiply * signal[i]
-        lower[i] = vector[i] - multiply * signal[i]
+    vector = array(vector)
+    signal = array(signal)
+    upper = vector + multiply * signal
+    lower = vector - multiply * signal
     return upper, lower
 
 def is_nan(value):
@@ -550,85 +575,46 @@ def TREND_ADX_DI(data: dict, adx_threshold: float):
     data[Indicators.TREND_ADX_DI] = trend
 
 def MID(data: dict):
-    cl = data[Columns.CLOSE]
-    op = data[Columns.OPEN]
-    n = len(cl)
-    md = nans(n)
-    for i in range(n):
-        o = op[i]
-        c = cl[i]
-        if is_nans([o, c]):
-            continue
-        md[i] = (o + c) / 2
-    data[Columns.MID] = md
+    cl = array(data[Columns.CLOSE])
+    op = array(data[Columns.OPEN])
+    data[Columns.MID] = (op + cl) / 2
     
     
 def ATR_TRAIL(data: dict, atr_window: int, atr_multiply: float, peak_hold_term: int):
-    atr_window = int(atr_window)
-    atr_multiply = int(atr_multiply)
-    peak_hold_term = int(peak_hold_term)
-    time = data[Columns.TIME]
-    op = data[Columns.OPEN]
-    hi = data[Columns.HIGH]
-    lo = data[Columns.LOW]
-    cl = data[Columns.CLOSE]
-    n = len(cl)
-    ATR(data, atr_window, None)
-    atr = data[Indicators.ATR]
-    stop = nans(n)
-    for i in range(n):
-        h = hi[i]
-        a = atr[i]
-        if is_nans([h, a]):
-            continue
-        stop[i] = h - a * atr_multiply
-        
-    trail_stop = nans(n)
-    for i in range(n):
-        d = stop[i - peak_hold_term + 1: i + 1]
-        if is_nans(d):
-            continue
-        trail_stop[i] = max(d)
-        
-    trend = full(0, n)
-    for i in range(n):
-        c = cl[i]
-        s = trail_stop[i]
-        if is_nans([c, s]):
-            continue
-        if c > s:
-            trend[i] = UP
-        else:
-            trend[i] = DOWN
-            
+    ATR(data, int(atr_window), None)
+    trail_stop, trend, up, down = atr_trail(data[Columns.HIGH], data[Columns.CLOSE], data[Indicators.ATR], atr_multiply, peak_hold_term)
     data[Indicators.ATR_TRAIL] = trail_stop
     data[Indicators.ATR_TRAIL_TREND] = trend
-    
-    up = nans(n)
-    down = nans(n)
-    for i in range(n):
-        if trend[i] == UP:
-            up[i] = trail_stop[i]    
-        if trend[i] == DOWN:
-            down[i] = trail_stop[i]
     data[Indicators.ATR_TRAIL_UP] = up
     data[Indicators.ATR_TRAIL_DOWN] = down
+
+def atr_trail(high, close, atr, atr_multiply: float, peak_hold_term: int):
+    atr_multiply = int(atr_multiply)
+    peak_hold_term = int(peak_hold_term)
+    hi = array(high)
+    cl = array(close)
+    stop = hi - array(atr) * atr_multiply
+    # highest stop of the last peak_hold_term bars, nan if one is nan
+    trail_stop = nans(stop.shape)
+    if peak_hold_term <= stop.shape[-1]:
+        trail_stop[..., peak_hold_term - 1:] = sliding_window_view(stop, peak_hold_term, axis=-1).max(axis=-1)
+    valid = ~(np.isnan(cl) | np.isnan(trail_stop))
+    trend = np.where(valid, np.where(cl > trail_stop, UP, DOWN), 0).astype(np.float64)
+    up = np.where(trend == UP, trail_stop, np.nan)
+    down = np.where(trend == DOWN, trail_stop, np.nan)
+    return trail_stop, trend, up, down
     
              
-def SUPERTREND(data: dict,  multiply, column=Columns.MID):
-    time = data[Columns.TIME]
-    if column == Columns.MID:
-        MID(data)
-    price = data[column]
-    n = len(time)
-    atr_u, atr_l = band(data[column], data[Indicators.ATR], multiply)
-    trend = nans(n)
-    super_upper = nans(n)
-    super_lower = nans(n)
-    is_valid = False
+@jit
+def supertrend_kernel(price, atr_u, atr_l, trend, super_upper, super_lower):
+    # trend state machine, continues from the state stored at index 0
+    n = len(price)
+    if n == 0:
+        return
+    is_valid = not np.isnan(trend[0])
     for i in range(1, n):
         if is_valid == False:
-            if is_nans([atr_l[i - 1], atr_u[i - 1]]):
+            if np.isnan(atr_l[i - 1]) or np.isnan(atr_u[i - 1]):
                 continue
             else:
                 super_lower[i - 1] = atr_l[i - 1]
@@ -662,12 +648,26 @@ def SUPERTREND(data: dict,  multiply, column=Columns.MID):
                 trend[i] = UP
             else:
                 trend[i] = DOWN
-           
+
+def SUPERTREND(data: dict,  multiply, column=Columns.MID):
+    if column == Columns.MID:
+        MID(data)
+    super_upper, super_lower, trend = supertrend(data[column], data[Indicators.ATR], multiply)
     data[Indicators.SUPERTREND_UPPER] = super_upper
     data[Indicators.SUPERTREND_LOWER] = super_lower
     data[Indicators.SUPERTREND] = trend    
     return 
 
+def supertrend(price, atr, multiply):
+    price = array(price)
+    n = len(price)
+    atr_u, atr_l = band(price, atr, multiply)
+    trend = nans(n)
+    super_upper = nans(n)
+    super_lower = nans(n)
+    supertrend_kernel(price, atr_u, atr_l, trend, super_upper, super_lower)
+    return super_upper, super_lower, trend
+
 def diff(data: dict, column: str):
     signal = data[column]
     time = data[Columns.TIME]
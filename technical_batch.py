@@ -0,0 +1,111 @@
+import numpy as np
+from common import Indicators, Columns
+from technical import array, nans, band, band_position, probability, cross_value, slope, vwap_rate, vwap_pivot, session_vwap, MID, JST_OFFSET, DAY
+# these run along the last axis and take the matrices as they are
+from technical import ATR, ADX, POLARITY, BB, BBRATE, ATR_TRAIL
+
+
+# Indicators of many symbols in one pass. stack() turns BarFrames into a
+# dict of (symbols x bars) matrices, one row per symbol holding its last
+# bars, and the functions here add indicator matrices to it like
+# technical.* do with a single series. Each row gets the same values as
+# the single series. When length is more than a frame has, its row is
+# padded with nan at the front and windows reaching into the padding may
+# warm up differently.
+#
+#   data = stack([api.get_rates(symbol, 'M1', 2000) for symbol in TICKERS])
+#   VWAP(data, [VWAP_BEGIN_HOUR, VWAP_BEGIN_HOUR, VWAP_BEGIN_HOUR, VWAP_BEGIN_HOUR_FX], 0.6, 4, 4, 4)
+#   BB(data, 20, 20, 2.0)
+#   ATR_TRAIL(data, 50, 2.0, 10)
+#   data[Indicators.VWAP_RATE][i]               # symbol i
+
+EPOCH = 'epoch'
+BARS = [Columns.OPEN, Columns.HIGH, Columns.LOW, Columns.CLOSE, Columns.VOLUME]
+
+
+def stack(frames, length=None):
+    if length is None:
+        length = min([frame.size for frame in frames])
+    count = len(frames)
+    data = {EPOCH: np.zeros((count, length), dtype=np.int64)}
+    for key in BARS:
+        data[key] = nans((count, length))
+    for i, frame in enumerate(frames):
+        last = frame.slice_last(length)
+        begin = length - last.size
+        data[EPOCH][i, begin:] = last.epoch
+        for key in BARS:
+            data[key][i, begin:] = last[key]
+    return data
+
+def row(data: dict, i: int):
+    # columns of symbol i (views)
+    return {key: value[i] for key, value in data.items()}
+
+def session_begin(epoch, valid, begin_hour_lists):
+    # bars opening a session: on the hour (jst) at one of the symbol's
+    # begin hours
+    table = np.zeros((len(begin_hour_lists), 24), dtype=bool)
+    for i, hours in enumerate(begin_hour_lists):
+        table[i, hours] = True
+    t = (epoch + JST_OFFSET) % DAY
+    rows = np.arange(len(begin_hour_lists))[:, np.newaxis]
+    return valid & (t % 3600 == 0) & table[rows, t // 3600]
+
+def VWAP(data: dict, begin_hour_lists, pivot_threshold, pivot_left_len, pivot_center_len, pivot_right_len):
+    # begin_hour_lists: session begin hours of each symbol
+    epoch = data[EPOCH]
+    MID(data)
+    mid = data[Columns.MID]
+    volume = array(data[Columns.VOLUME])
+    valid = ~(np.isnan(mid) | np.isnan(volume))
+    begin = session_begin(epoch, valid, begin_hour_lists)
+    vwap, std = session_vwap(mid, volume, begin)
+    data[Indicators.VWAP] = vwap
+    rate = vwap_rate(mid, vwap, std)
+    data[Indicators.VWAP_RATE] = rate
+
+    # bar interval of each symbol from its first two bars
+    rows = np.arange(epoch.shape[0])
+    first = np.argmax(valid, axis=-1)
+    second = np.minimum(first + 1, epoch.shape[-1] - 1)
+    minutes = (epoch[rows, second] - epoch[rows, first]) / 60
+    data[Indicators.VWAP_SLOPE] = slope(vwap, 10, minutes[:, np.newaxis])
+
+    for i in range(1, 5):
+        upper, lower = band(vwap, std, float(i))
+        data[Indicators.VWAP_UPPER + str(i)] = upper
+        data[Indicators.VWAP_LOWER + str(i)] = lower
+
+    pos = band_position(mid, lower, vwap, upper)
+    up = probability(pos, [1, 2], 40)
+    down = probability(pos, [-1, -2], 40)
+    data[Indicators.VWAP_UP] = up
+    data[Indicators.VWAP_DOWN] = down
+
+    cross_up, cross_down, cross = cross_value(up, 50)
+    data[Indicators.VWAP_CROSS] = cross
+    data[Indicators.VWAP_CROSS_UP] = cross_up
+    data[Indicators.VWAP_CROSS_DOWN] = cross_down
+
+    data[Indicators.VWAP_SIGNAL] = vwap_pivot(rate, pivot_threshold, pivot_left_len, pivot_center_len, pivot_right_len)
+
+
+def test():
+    import time
+    from mt5_api import Mt5Api
+    from mt5_offline import SyntheticBackend
+
+    symbols = ['S' + str(i) for i in range(32)]
+    api = Mt5Api(backend=SyntheticBackend(seed=1))
+    frames = [api.get_rates(symbol, 'M1', 3000) for symbol in symbols]
+    t0 = time.time()
+    data = stack(frames)
+    VWAP(data, [[8, 16, 20]] * len(symbols), 0.6, 4, 4, 4)
+    BB(data, 20, 20, 2.0)
+    ATR_TRAIL(data, 50, 2.0, 10)
+    print(len(symbols), 'symbols', 'Elapsed Time:', time.time() - t0)
+
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,292 @@
+import numpy as np
+from common import Indicators, Columns
+from technical import array, band, band_position, probability, cross_value, slope
+from technical import vwap_rate, vwap_pivot, supertrend_kernel, session_begin, session_sums, sums_vwap, ATR, ADX, ATR_TRAIL
+from data_buffer import DataBuffer
+
+
+# Incremental versions of VWAP, ATR, ATR_TRAIL, SUPERTREND and ADX.
+#
+# A stream writes its columns into a DataBuffer and, after every
+# DataBuffer.update(), recomputes only the bars the update replaced or
+# appended (DataBuffer.updated_length). Window indicators are evaluated on
+# the changed bars plus the lookback they need, state machines (VWAP
+# session sums, SUPERTREND) resume from the values stored at the bar just
+# before the changed ones. The result is the same as running the technical
+# function over the whole history.
+#
+#   buffer.initilize(data)
+#   streams = [AtrStream(14, 100), AdxStream(14, 14, 100)]
+#   for stream in streams:
+#       stream.initialize(buffer)
+#   ...
+#   buffer.update(new_data)
+#   for stream in streams:
+#       stream.update(buffer)
+
+
+def tail(buffer: DataBuffer, keys, begin: int):
+    dic = {}
+    for key in keys:
+        dic[key] = buffer.arrays[key][begin:]
+    return dic
+
+def write(buffer: DataBuffer, dic: dict, keys, offset: int):
+    for key in keys:
+        buffer.update_data(key, dic[key][offset:])
+
+
+class IndicatorStream:
+    # subclasses define inputs, outputs, lookback and compute(dic), which
+    # writes the outputs into dic
+    inputs = []
+    outputs = []
+    lookback = 0
+
+    def initialize(self, buffer: DataBuffer):
+        keys = [key for key in self.outputs if key not in buffer.arrays.keys()]
+        if len(keys) > 0:
+            buffer.add_empty(keys)
+        self.advance(buffer, buffer.size)
+
+    def update(self, buffer: DataBuffer):
+        if buffer.updated_length > 0:
+            self.advance(buffer, buffer.updated_length)
+
+    def advance(self, buffer: DataBuffer, length: int):
+        n = buffer.size
+        begin = max(n - length, 0)
+        s = max(begin - self.lookback, 0)
+        dic = tail(buffer, self.inputs, s)
+        self.compute(dic)
+        write(buffer, dic, self.outputs, begin - s)
+
+
+class AtrStream(IndicatorStream):
+    inputs = [Columns.HIGH, Columns.LOW, Columns.CLOSE]
+
+    def __init__(self, term: int, term_long: int):
+        self.term = int(term)
+        self.term_long = term_long
+        self.outputs = [Indicators.TR, Indicators.ATR]
+        self.lookback = self.term
+        if term_long is not None:
+            self.outputs.append(Indicators.ATR_LONG)
+            self.lookback = max(self.term, int(term_long))
+
+    def compute(self, dic: dict):
+        ATR(dic, self.term, self.term_long)
+
+
+class AdxStream(IndicatorStream):
+    # needs TR, keep an AtrStream in front of it
+    inputs = [Columns.HIGH, Columns.LOW, Indicators.TR]
+
+    def __init__(self, di_window: int, adx_term: int, adx_term_long: int):
+        self.di_window = di_window
+        self.adx_term = adx_term
+        self.adx_term_long = adx_term_long
+        self.outputs = [Indicators.DX, Indicators.ADX, Indicators.DI_PLUS, Indicators.DI_MINUS]
+        term = adx_term
+        if adx_term_long is not None:
+            self.outputs.append(Indicators.ADX_LONG)
+            term = max(adx_term, adx_term_long)
+        self.lookback = di_window + term
+
+    def compute(self, dic: dict):
+        ADX(dic, self.di_window, self.adx_term, self.adx_term_long)
+
+
+class AtrTrailStream(IndicatorStream):
+    inputs = [Columns.HIGH, Columns.LOW, Columns.CLOSE]
+    outputs = [ Indicators.TR,
+                Indicators.ATR,
+                Indicators.ATR_TRAIL,
+                Indicators.ATR_TRAIL_TREND,
+                Indicators.ATR_TRAIL_UP,
+                Indicators.ATR_TRAIL_DOWN]
+
+    def __init__(self, atr_window: int, atr_multiply: float, peak_hold_term: int):
+        self.atr_window = int(atr_window)
+        self.atr_multiply = atr_multiply
+        self.peak_hold_term = int(peak_hold_term)
+        self.lookback = self.atr_window + self.peak_hold_term
+
+    def compute(self, dic: dict):
+        ATR_TRAIL(dic, self.atr_window, self.atr_multiply, self.peak_hold_term)
+
+
+class SupertrendStream(IndicatorStream):
+    # needs ATR, keep an AtrStream in front of it
+    outputs = [ Indicators.SUPERTREND_UPPER,
+                Indicators.SUPERTREND_LOWER,
+                Indicators.SUPERTREND]
+
+    def __init__(self, multiply, column=Columns.MID):
+        self.multiply = multiply
+        self.column = column
+        if column == Columns.MID:
+            self.outputs = [Columns.MID] + self.outputs
+
+    def advance(self, buffer: DataBuffer, length: int):
+        n = buffer.size
+        begin = max(n - length, 0)
+        if self.column == Columns.MID:
+            op = array(buffer.arrays[Columns.OPEN][begin:])
+            cl = array(buffer.arrays[Columns.CLOSE][begin:])
+            buffer.update_data(Columns.MID, (op + cl) / 2)
+        # resume from the state of the bar before the changed ones
+        s = max(begin - 1, 0)
+        price = array(buffer.arrays[self.column][s:])
+        atr_u, atr_l = band(price, buffer.arrays[Indicators.ATR][s:], self.multiply)
+        dic = {}
+        for key in [Indicators.SUPERTREND, Indicators.SUPERTREND_UPPER, Indicators.SUPERTREND_LOWER]:
+            values = array(buffer.arrays[key][s:]).copy()
+            values[begin - s:] = np.nan
+            dic[key] = values
+        supertrend_kernel(price,
+                          atr_u,
+                          atr_l,
+                          dic[Indicators.SUPERTREND],
+                          dic[Indicators.SUPERTREND_UPPER],
+                          dic[Indicators.SUPERTREND_LOWER])
+        write(buffer, dic, dic.keys(), 0)
+
+
+class VwapStream(IndicatorStream):
+    # running session sums, kept in the buffer to resume from
+    VOLUME_ACC = Indicators.VWAP + '_VOLUME_ACC'
+    PRICE_ACC = Indicators.VWAP + '_PRICE_ACC'
+    POWER_ACC = Indicators.VWAP + '_POWER_ACC'
+    STD = Indicators.VWAP + '_STD'
+    # vwap_rate: median of 11 bars then 20 bar average, probability: 40 bars
+    # and one more for the crosses
+    LOOKBACK = 41
+    COOLDOWN = 10
+
+    def __init__(self, begin_hour_list, pivot_threshold, pivot_left_len, pivot_center_len, pivot_right_len):
+        self.begin_hour_list = begin_hour_list
+        self.pivot_threshold = pivot_threshold
+        self.pivot_left_len = pivot_left_len
+        self.pivot_center_len = pivot_center_len
+        self.pivot_right_len = pivot_right_len
+        self.bands = []
+        for i in range(1, 5):
+            self.bands += [Indicators.VWAP_UPPER + str(i), Indicators.VWAP_LOWER + str(i)]
+        self.outputs = [Columns.MID,
+                        self.VOLUME_ACC,
+                        self.PRICE_ACC,
+                        self.POWER_ACC,
+                        self.STD,
+                        Indicators.VWAP,
+                        Indicators.VWAP_RATE,
+                        Indicators.VWAP_SLOPE,
+                        Indicators.VWAP_UP,
+                        Indicators.VWAP_DOWN,
+                        Indicators.VWAP_CROSS,
+                        Indicators.VWAP_CROSS_UP,
+                        Indicators.VWAP_CROSS_DOWN,
+                        Indicators.VWAP_SIGNAL] + self.bands
+
+    def advance(self, buffer: DataBuffer, length: int):
+        n = buffer.size
+        begin = max(n - length, 0)
+        self.accumulate(buffer, begin)
+        self.derive(buffer, begin)
+        self.signal(buffer, begin)
+
+    def accumulate(self, buffer: DataBuffer, begin: int):
+        # session sums of the new bars, continuing the sums stored at the
+        # bar before them. Sessions are found on the epoch index, the cost
+        # is O(new bars)
+        arrays = buffer.arrays
+        op = array(arrays[Columns.OPEN][begin:])
+        cl = array(arrays[Columns.CLOSE][begin:])
+        volume = np.asarray(arrays[Columns.VOLUME][begin:])
+        mid = (op + cl) / 2
+        session = session_begin(buffer.time_index()[begin:], self.begin_hour_list)
+        carry = (None, None, None)
+        if begin > 0:
+            carry = (arrays[self.VOLUME_ACC][begin - 1], arrays[self.PRICE_ACC][begin - 1], arrays[self.POWER_ACC][begin - 1])
+        volume_acc, price_acc, power_acc = session_sums(mid, volume, session, carry)
+        vwap, std = sums_vwap(volume_acc, price_acc, power_acc)
+        buffer.update_data(Columns.MID, mid)
+        buffer.update_data(self.VOLUME_ACC, volume_acc)
+        buffer.update_data(self.PRICE_ACC, price_acc)
+        buffer.update_data(self.POWER_ACC, power_acc)
+        buffer.update_data(self.STD, std)
+        buffer.update_data(Indicators.VWAP, vwap)
+
+    def derive(self, buffer: DataBuffer, begin: int):
+        arrays = buffer.arrays
+        s = max(begin - self.LOOKBACK, 0)
+        offset = begin - s
+        mid = array(arrays[Columns.MID][s:])
+        vwap = array(arrays[Indicators.VWAP][s:])
+        std = array(arrays[self.STD][s:])
+        epoch = buffer.time_index()
+        minutes = (epoch[1] - epoch[0]) / 60
+        dic = {}
+        dic[Indicators.VWAP_RATE] = vwap_rate(mid, vwap, std)
+        dic[Indicators.VWAP_SLOPE] = slope(vwap, 10, minutes)
+        for i in range(1, 5):
+            upper, lower = band(vwap, std, float(i))
+            dic[Indicators.VWAP_UPPER + str(i)] = upper
+            dic[Indicators.VWAP_LOWER + str(i)] = lower
+        pos = band_position(mid, lower, vwap, upper)
+        up = probability(pos, [1, 2], 40)
+        down = probability(pos, [-1, -2], 40)
+        dic[Indicators.VWAP_UP] = up
+        dic[Indicators.VWAP_DOWN] = down
+        cross_up, cross_down, cross = cross_value(up, 50)
+        dic[Indicators.VWAP_CROSS] = cross
+        dic[Indicators.VWAP_CROSS_UP] = cross_up
+        dic[Indicators.VWAP_CROSS_DOWN] = cross_down
+        write(buffer, dic, dic.keys(), offset)
+
+    def signal(self, buffer: DataBuffer, begin: int):
+        arrays = buffer.arrays
+        length = self.pivot_left_len + self.pivot_center_len + self.pivot_right_len
+        s = max(begin - length - self.COOLDOWN, 0)
+        rate = array(arrays[Indicators.VWAP_RATE][s:])
+        out = array(arrays[Indicators.VWAP_SIGNAL][s:]).copy()
+        out = vwap_pivot(rate,
+                         self.pivot_threshold,
+                         self.pivot_left_len,
+                         self.pivot_center_len,
+                         self.pivot_right_len,
+                         out=out,
+                         begin=begin - s)
+        buffer.update_data(Indicators.VWAP_SIGNAL, out[begin - s:])
+
+
+def test():
+    import time
+    from mt5_api import Mt5Api
+    from technical import VWAP, SUPERTREND
+
+    symbol = 'NIKKEI'
+    timeframe = 'M1'
+    interval = 20
+    bars = 2000
+
+    api = Mt5Api()
+    buffer = DataBuffer(Columns.TIME)
+    buffer.initilize(api.get_rates(symbol, timeframe, bars))
+    streams = [AtrStream(14, 100),
+               AdxStream(14, 14, 100),
+               SupertrendStream(2.0),
+               VwapStream([8, 16, 20], 0.6, 4, 4, 4)]
+    for stream in streams:
+        stream.initialize(buffer)
+    for i in range(10):
+        time.sleep(interval)
+        n = buffer.update(api.get_rates(symbol, timeframe, 2))
+        t0 = time.time()
+        for stream in streams:
+            stream.update(buffer)
+        print('#', i, 'new bars', n, 'Elapsed Time:', time.time() - t0)
+
+
+if __name__ == '__main__':
+    test()
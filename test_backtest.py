@@ -0,0 +1,54 @@
+import numpy as np
+from common import Columns, Signal
+from bar_frame import BarFrame
+from backtest import backtest, signal_position, trend_position
+from technical import UP, DOWN
+
+
+# The vectorized backtest against a bar by bar loop, and its trades against
+# its equity.
+
+def random_frame(n, seed):
+    rng = np.random.default_rng(seed)
+    close = 30000 + np.cumsum(rng.normal(0, 10, n))
+    return BarFrame(60 * np.arange(n), {Columns.CLOSE: close})
+
+def backtest_loop(close, position, unit_cost):
+    equity = []
+    total = 0.0
+    held = 0.0
+    for i in range(len(close)):
+        if i > 0:
+            total += held * (close[i] - close[i - 1])
+        total -= abs(position[i] - held) * unit_cost
+        held = position[i]
+        equity.append(total)
+    return np.array(equity)
+
+
+def test_equity_matches_loop():
+    rng = np.random.default_rng(0)
+    data = random_frame(5000, 0)
+    position = rng.choice([-1.0, 0.0, 1.0], 5000, p=[0.02, 0.96, 0.02])
+    position = signal_position(np.where(position == 1, Signal.LONG, np.where(position == -1, Signal.SHORT, np.nan)))
+    result = backtest(data, position, spread=5.0, commission=1.0)
+    np.testing.assert_allclose(result['equity'], backtest_loop(data[Columns.CLOSE], position, 3.5))
+    assert np.all(result['drawdown'] <= 0)
+
+def test_trades_add_up_to_equity():
+    for seed in range(3):
+        rng = np.random.default_rng(seed)
+        data = random_frame(3000, seed)
+        trend = np.repeat(rng.choice([UP, DOWN, np.nan], 100), 30)
+        position = trend_position(trend)
+        result = backtest(data, position, spread=4.0)
+        trades = result['trades']
+        assert np.all(trades['side'] != 0)
+        # the open trade pays no exit cost, neither does the equity
+        assert np.isclose(trades['profit'].sum(), result['equity'][-1])
+        assert result['summary']['trades'] == len(trades)
+        assert np.isclose(result['summary']['profit'], result['equity'][-1])
+
+def test_signal_position_holds_until_the_next_signal():
+    signal = np.array([np.nan, Signal.LONG, np.nan, np.nan, Signal.SHORT, np.nan, Signal.SHORT])
+    np.testing.assert_array_equal(signal_position(signal), [0, 1, 1, 1, -1, -1, -1])
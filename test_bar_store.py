@@ -0,0 +1,53 @@
+import os
+import numpy as np
+from bar_frame import BarFrame
+from bar_store import BarStore, STORE_COLUMNS, EPOCH
+
+
+# BarStore appends, and its recovery from appends interrupted between the
+# column files.
+
+def frame(begin, end):
+    index = np.arange(begin, end)
+    return BarFrame(60 * index, {'open': index + 0.1,
+                                 'high': index + 0.5,
+                                 'low': index - 0.5,
+                                 'close': index + 0.2,
+                                 'tick_volume': index * 10})
+
+def assert_bars(loaded, begin, end):
+    expected = frame(begin, end)
+    np.testing.assert_array_equal(loaded.epoch, expected.epoch)
+    for key in ['open', 'high', 'low', 'close', 'tick_volume']:
+        np.testing.assert_array_equal(loaded[key], expected[key])
+
+
+def test_append_writes_only_new_bars(tmp_path):
+    store = BarStore(str(tmp_path))
+    assert store.load('NIKKEI', 'M1').size == 0
+    assert store.append('NIKKEI', 'M1', frame(0, 100)) == 100
+    # overlapping bars are skipped
+    assert store.append('NIKKEI', 'M1', frame(50, 150)) == 50
+    assert store.append('NIKKEI', 'M1', frame(10, 20)) == 0
+    assert store.last_epoch('NIKKEI', 'M1') == 149 * 60
+    assert_bars(store.load('NIKKEI', 'M1'), 0, 150)
+
+def test_interrupted_append_is_truncated(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.append('NIKKEI', 'M1', frame(0, 100))
+    # an append stopped after some columns, one of them half written
+    written = frame(100, 110)
+    for column in ['open', 'high']:
+        with open(store.path('NIKKEI', 'M1', column), 'ab') as f:
+            f.write(np.ascontiguousarray(written[column], dtype=STORE_COLUMNS[column]).tobytes())
+    with open(store.path('NIKKEI', 'M1', 'low'), 'ab') as f:
+        f.write(b'\x00' * 13)
+    # readers see the bars complete in every column
+    assert store.count('NIKKEI', 'M1') == 100
+    assert_bars(store.load('NIKKEI', 'M1'), 0, 100)
+    # the next append cuts the partial rows before writing
+    assert store.append('NIKKEI', 'M1', frame(90, 120)) == 20
+    for column, dtype in STORE_COLUMNS.items():
+        assert os.path.getsize(store.path('NIKKEI', 'M1', column)) == 120 * dtype.itemsize
+    assert_bars(store.load('NIKKEI', 'M1'), 0, 120)
+    assert store.load('NIKKEI', 'M1').epoch.dtype == STORE_COLUMNS[EPOCH]
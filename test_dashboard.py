@@ -0,0 +1,93 @@
+import os
+import json
+import numpy as np
+import pytest
+
+pytest.importorskip('dash')
+pytest.importorskip('ta')
+from plotly.io.json import to_json_plotly
+import dashboard
+from mt5_api import Mt5Api
+from mt5_offline import SyntheticBackend
+
+pytestmark = pytest.mark.filterwarnings('ignore::RuntimeWarning')
+
+
+# Figures patched on the client (dash Patch operations applied to the last
+# figure it received) against figures built from scratch, with two clients
+# polling at different times and one of them losing responses.
+
+def apply(figure, operations):
+    for operation in operations:
+        location = operation['location']
+        target = figure
+        for key in location[:-1]:
+            target = target[key]
+        key = location[-1]
+        if operation['operation'] == 'Assign':
+            target[key] = operation['params']['value']
+        elif operation['operation'] == 'Delete':
+            del target[key]
+        elif operation['operation'] == 'Extend':
+            target[key].extend(operation['params']['value'])
+        else:
+            raise Exception('Unknown operation ' + operation['operation'])
+
+def shown(figure):
+    layout = figure['layout']
+    return {'data': figure['data'],
+            'title': layout['title']['text'],
+            'ticktext': layout['xaxis']['ticktext'],
+            'tickvals': layout['xaxis']['tickvals']}
+
+
+def test_patches_match_rebuilds():
+    backend = SyntheticBackend(seed=3)
+    dashboard.api = Mt5Api(backend=backend)
+    for panel, param in [(dashboard.panel1, dashboard.technical_param1), (dashboard.panel2, dashboard.technical_param2)]:
+        # [figure, version] of each client
+        clients = [[None, None], [None, None]]
+        patches = 0
+        for step in range(16):
+            for c, client in enumerate(clients):
+                if c == 1 and step % 3 == 1:
+                    continue
+                out, version = panel('NIKKEI', 'M1', 400, dict(param), client[1])
+                if c == 0 and step % 5 == 2:
+                    # response lost, the client keeps its figure and version
+                    continue
+                out = json.loads(to_json_plotly(out))
+                if 'operations' in out:
+                    apply(client[0], out['operations'])
+                    patches += 1
+                else:
+                    client[0] = out
+                client[1] = version
+                full, _ = panel('NIKKEI', 'M1', 400, dict(param), None)
+                assert shown(client[0]) == shown(json.loads(to_json_plotly(full))), (step, c)
+            backend.advance([20, 45, 200, 3][step % 4])
+            dashboard.poller.poll()
+        assert patches > 0
+    dashboard.poller.stop()
+
+def test_panels_compute_in_parallel_processes():
+    from pipeline import Pipeline
+    dashboard.api = Mt5Api(backend=SyntheticBackend(seed=5))
+    param = dict(dashboard.technical_param1)
+    # start the processes
+    for panel in range(2):
+        dashboard.compute_indicators(panel, ('WARMUP', 'M1'), dashboard.api.get_rates('NIKKEI', 'M1', 1000), dashboard.CHART1_INDICATORS, param)
+    data = [dashboard.api.get_rates('NIKKEI', 'M1', 500000) for panel in range(2)]
+    futures = [dashboard.executor.submit(dashboard.compute_indicators, panel, ('NIKKEI', 'M1'), data[panel], dashboard.CHART1_INDICATORS, param) for panel in range(2)]
+    spans = [future.result() for future in futures]
+    # one process per panel, the computations overlap
+    assert len({span[0] for span in spans}) == 2
+    assert os.getpid() not in [span[0] for span in spans]
+    assert spans[0][1] < spans[1][2] and spans[1][1] < spans[0][2]
+    expected = dashboard.api.get_rates('NIKKEI', 'M1', 500000)
+    Pipeline().compute(('NIKKEI', 'M1'), expected, dashboard.CHART1_INDICATORS, param)
+    assert len(expected.indicators) > 0
+    for frame in data:
+        assert frame.indicators == expected.indicators
+        for key in expected.indicators:
+            np.testing.assert_array_equal(frame[key], expected[key], err_msg=key)
@@ -0,0 +1,74 @@
+import numpy as np
+from data_buffer import DataBuffer
+from bar_frame import BarFrame
+
+
+# DataBuffer against a plain model: the bars by time, the last size of them
+# kept.
+
+def bars(epoch, seed):
+    rng = np.random.default_rng(seed)
+    epoch = np.asarray(epoch, dtype=np.int64)
+    return {'time': epoch, 'close': rng.normal(0, 1, len(epoch)), 'tick_volume': rng.integers(1, 100, len(epoch))}
+
+def merge(model, data):
+    for i, t in enumerate(data['time']):
+        model[int(t)] = (data['close'][i], data['tick_volume'][i])
+
+def assert_model(buffer, model):
+    times = sorted(model.keys())[-buffer.size:]
+    np.testing.assert_array_equal(buffer.time_index(), times)
+    np.testing.assert_array_equal(buffer.arrays['close'], [model[t][0] for t in times])
+    np.testing.assert_array_equal(buffer.arrays['tick_volume'], [model[t][1] for t in times])
+
+
+def test_update_replaces_and_appends():
+    rng = np.random.default_rng(0)
+    size = 50
+    data = bars(60 * np.arange(size), 0)
+    buffer = DataBuffer('time', capacity=2 * size + 7)
+    buffer.initilize(data)
+    model = {}
+    merge(model, data)
+    last = size - 1
+    for i in range(300):
+        # a few known bars again (replaced) and 0-30 new ones
+        first = last - int(rng.integers(0, 4))
+        new = int(rng.integers(0, 30))
+        data = bars(60 * np.arange(first, last + new + 1), i + 1)
+        added = buffer.update(data)
+        merge(model, data)
+        assert added == new
+        assert buffer.size == size
+        assert_model(buffer, model)
+        # bars touched by the update at the end of the buffer
+        assert buffer.updated_length == min(last + new - first + 1, size)
+        last += new
+
+def test_replace_only_known_bars():
+    data = bars(60 * np.arange(10), 0)
+    buffer = DataBuffer('time')
+    buffer.initilize(data)
+    # bars 3 and 7 are known, 30 is after the last one and left to update()
+    replace = bars(60 * np.array([3, 7]), 1)
+    first = buffer.replace(BarFrame.from_dict(replace, 'time'))
+    assert first == 3
+    np.testing.assert_array_equal(buffer.arrays['close'][[3, 7]], replace['close'])
+    assert buffer.replace(BarFrame.from_dict(bars([30], 2), 'time')) is None
+
+def test_shift_keeps_the_time_index_sorted():
+    data = bars(60 * np.arange(6), 0)
+    buffer = DataBuffer('time', capacity=12)
+    buffer.initilize(data)
+    for i in range(6):
+        buffer.shift(2)
+        index = buffer.time_index()
+        assert buffer.size == 6
+        assert np.all(np.diff(index) == 60)
+        assert np.isnan(buffer.arrays['close'][-1])
+    # a later update fills the empty bars by time
+    last = int(buffer.time_index()[-1])
+    data = bars([last - 60, last, last + 60], 1)
+    assert buffer.update(data) == 1
+    np.testing.assert_array_equal(buffer.arrays['close'][-3:], data['close'])
+    assert np.all(np.diff(buffer.time_index()) == 60)
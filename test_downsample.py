@@ -0,0 +1,60 @@
+import numpy as np
+from downsample import lttb, downsample
+
+
+# lttb against a point by point version of the algorithm, and the gaps
+# downsample() keeps.
+
+def lttb_loop(x, y, threshold):
+    n = len(y)
+    every = (n - 2) / (threshold - 2)
+    index = [0]
+    a = 0
+    for i in range(threshold - 2):
+        begin = int(np.floor(i * every)) + 1
+        end = int(np.floor((i + 1) * every)) + 1
+        next_begin = end
+        next_end = min(int(np.floor((i + 2) * every)) + 1, n)
+        if i == threshold - 3:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        else:
+            avg_x = np.mean(x[next_begin: next_end])
+            avg_y = np.mean(y[next_begin: next_end])
+        best = -1.0
+        for j in range(begin, end):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best:
+                best = area
+                kept = j
+        index.append(kept)
+        a = kept
+    index.append(n - 1)
+    return np.array(index)
+
+
+def test_lttb_matches_loop():
+    rng = np.random.default_rng(0)
+    for n, threshold in [(100, 10), (1000, 101), (3001, 1100), (50, 3)]:
+        x = np.arange(n, dtype=np.float64)
+        y = np.cumsum(rng.normal(0, 1, n))
+        index = lttb(x, y, threshold)
+        assert len(index) == threshold
+        np.testing.assert_array_equal(index, lttb_loop(x, y, threshold))
+
+def test_lttb_keeps_short_series():
+    np.testing.assert_array_equal(lttb(np.arange(5), np.arange(5.0), 10), np.arange(5))
+
+def test_downsample_keeps_gaps():
+    rng = np.random.default_rng(1)
+    y = np.cumsum(rng.normal(0, 1, 3000))
+    y[1000: 1100] = np.nan
+    y[:20] = np.nan
+    index = downsample(y, 1100)
+    assert np.all(np.diff(index) > 0)
+    assert index[0] == 0 and index[-1] == len(y) - 1
+    # the gaps take no share of the points
+    assert 1000 < len(index) <= 1100
+    # one nan for each gap, the ends of every finite run kept
+    assert np.count_nonzero(np.isnan(y[index])) == 2
+    for i in [20, 999, 1100]:
+        assert i in index
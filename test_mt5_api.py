@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+from bar_frame import BarFrame
+from mt5_api import Mt5Api, TimeFrame, RESAMPLE_TIMEFRAMES, RATE_DTYPE, resample_rates, utc_to_server, server_to_utc
+from mt5_offline import SyntheticBackend, CLOCK
+
+
+# Mt5Api against the synthetic feed, counting the bars downloaded.
+
+class CountingBackend(SyntheticBackend):
+    def __init__(self, *args, **kwargs):
+        SyntheticBackend.__init__(self, *args, **kwargs)
+        self.calls = []
+
+    def copy_rates_from_pos(self, symbol, timeframe, pos, count):
+        self.calls.append((timeframe, count))
+        return SyntheticBackend.copy_rates_from_pos(self, symbol, timeframe, pos, count)
+
+
+def test_cache_downloads_only_new_bars():
+    backend = CountingBackend(seed=1)
+    api = Mt5Api(backend=backend)
+    first = api.get_rates('NIKKEI', TimeFrame.M1, 1000)
+    backend.advance(5 * 60)
+    data = api.get_rates('NIKKEI', TimeFrame.M1, 1000)
+    assert backend.calls[0] == (TimeFrame.M1, 1000)
+    assert backend.calls[1][1] < 10
+    fresh = Mt5Api(backend=SyntheticBackend(seed=1, clock=backend.clock)).get_rates('NIKKEI', TimeFrame.M1, 1000)
+    np.testing.assert_array_equal(data.epoch, fresh.epoch)
+    np.testing.assert_array_equal(data['close'], fresh['close'])
+    # the returned columns are copies, later updates leave them as they were
+    close = first['close'].copy()
+    backend.advance(3 * 60)
+    api.get_rates('NIKKEI', TimeFrame.M1, 1000)
+    np.testing.assert_array_equal(first['close'], close)
+
+def test_cache_survives_closed_sessions():
+    # H1 bars through a weekend: the clock runs 50 hours, 2 bars arrive
+    friday = CLOCK + 4 * 24 * 3600 + 12 * 3600 + 30 * 60
+    backend = CountingBackend(seed=1, clock=friday)
+    api = Mt5Api(backend=backend)
+    api.get_rates('NIKKEI', TimeFrame.H1, 30)
+    buffer = api.cache.get(('NIKKEI', TimeFrame.H1))
+    for hours in [12, 24, 14]:
+        backend.advance(hours * 3600)
+        data = api.get_rates('NIKKEI', TimeFrame.H1, 30)
+    assert api.cache.get(('NIKKEI', TimeFrame.H1)) is buffer
+    assert all(count <= 30 for timeframe, count in backend.calls)
+    fresh = Mt5Api(backend=SyntheticBackend(seed=1, clock=backend.clock)).get_rates('NIKKEI', TimeFrame.H1, 30)
+    np.testing.assert_array_equal(data.epoch, fresh.epoch)
+    np.testing.assert_array_equal(data['close'], fresh['close'])
+
+def test_resample_matches_pandas_across_dst():
+    # two months of M1 bars back from April cover the March DST change
+    clock = int(pd.Timestamp('2024-04-02 10:00:30').value // 10 ** 9)
+    api = Mt5Api(backend=SyntheticBackend(seed=1, clock=clock), resample=True)
+    for timeframe in RESAMPLE_TIMEFRAMES:
+        data = api.get_rates('NIKKEI', timeframe, 40)
+        seconds = TimeFrame.seconds(timeframe)
+        server = utc_to_server(data.epoch)
+        assert data.size == 40
+        assert np.all(server % seconds == 0)
+        m1 = api.get_rates('NIKKEI', TimeFrame.M1, 2 * 41 * TimeFrame.minutes[timeframe])
+        frame = pd.DataFrame({'open': m1['open'], 'high': m1['high'], 'low': m1['low'], 'close': m1['close'], 'tick_volume': m1['tick_volume']},
+                             index=pd.to_datetime(utc_to_server(m1.epoch), unit='s'))
+        expected = frame.resample(str(seconds) + 's').agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'tick_volume': 'sum'})
+        expected = expected.loc[pd.to_datetime(server, unit='s')]
+        for key in ['open', 'high', 'low', 'close', 'tick_volume']:
+            np.testing.assert_array_equal(data[key], expected[key].to_numpy(), err_msg=timeframe + ' ' + key)
+
+def test_resample_keeps_complete_first_bucket():
+    # sessions opening 2 hours after the server midnight
+    api = Mt5Api(backend=SyntheticBackend(seed=1))
+    m1 = api.get_rates('NIKKEI', TimeFrame.M1, 6000)
+    keep = np.flatnonzero(utc_to_server(m1.epoch) % (24 * 3600) >= 2 * 3600)
+    m1 = BarFrame(m1.epoch[keep], {key: m1[key][keep] for key in ['open', 'high', 'low', 'close', 'tick_volume']})
+    day = utc_to_server(m1.epoch) // (24 * 3600)
+    # from the last bar of the first day: the second day is complete
+    last = int(np.flatnonzero(np.diff(day))[0])
+    data = resample_rates(m1.slice(last, m1.size), TimeFrame.D1)
+    assert utc_to_server(data.epoch[:1])[0] // (24 * 3600) == day[last + 1]
+    assert data['open'][0] == m1['open'][last + 1]
+    assert data.size == len(np.unique(day[last + 1:]))
+    # from the second bar of a day: that day is incomplete and dropped
+    data = resample_rates(m1.slice(last + 2, m1.size), TimeFrame.D1)
+    assert utc_to_server(data.epoch[:1])[0] // (24 * 3600) > day[last + 1]
+    # the whole history: nothing is missing before it
+    data = resample_rates(m1.slice(last + 2, m1.size), TimeFrame.D1, partial=False)
+    assert data['open'][0] == m1['open'][last + 2]
+
+def test_resample_keeps_the_m1_cache():
+    backend = CountingBackend(seed=1)
+    api = Mt5Api(backend=backend, resample=True)
+    for i in range(6):
+        api.get_rates('NIKKEI', TimeFrame.H1, 400)
+        backend.advance(7 * 3600)
+    # one download of the history, then the new bars only
+    counts = [count for timeframe, count in backend.calls]
+    assert all(timeframe == TimeFrame.M1 for timeframe, count in backend.calls)
+    assert counts[0] >= 401 * 60
+    assert all(count <= 7 * 60 + 2 for count in counts[1:])
+
+def epoch(text):
+    return int(pd.Timestamp(text).value // 10 ** 9)
+
+def test_server_time_offsets_around_dst_changes():
+    # server time is GMT+2, GMT+3 from 00:00 of the 2nd sunday of March to
+    # 00:00 of the 1st sunday of November (server time)
+    for server, offset in [('2024-03-09 23:59', 2), ('2024-03-10 01:00', 3), ('2024-06-01 12:00', 3),
+                           ('2024-11-02 22:59', 3), ('2024-11-03 00:00', 2), ('2025-01-15 12:00', 2)]:
+        utc = server_to_utc([epoch(server)])
+        assert epoch(server) - utc[0] == offset * 3600, server
+        assert utc_to_server(utc)[0] == epoch(server), server
+
+def test_server_time_round_trips_over_weekends():
+    # every minute from friday to monday across both changes of 2024
+    for friday, repeated_hours in [('2024-03-08', 0), ('2024-11-01', 1)]:
+        utc = epoch(friday) + 60 * np.arange(4 * 24 * 60)
+        server = utc_to_server(utc)
+        back = server_to_utc(server)
+        # november repeats the last server hour of saturday, markets are
+        # closed then and it is read as summer time
+        repeated = np.zeros(len(utc), dtype=bool)
+        repeated[1:] = np.maximum.accumulate(server)[:-1] >= server[1:]
+        assert np.count_nonzero(repeated) == repeated_hours * 60
+        np.testing.assert_array_equal(back[~repeated], utc[~repeated])
+        np.testing.assert_array_equal(back[repeated], utc[repeated] - 3600)
+
+def test_parse_rates():
+    rates = np.zeros(3, dtype=RATE_DTYPE)
+    # server time around the March change
+    rates['time'] = [epoch('2024-03-08 23:00'), epoch('2024-03-11 01:00'), epoch('2024-03-11 01:01')]
+    rates['open'] = [1.5, 2.5, 3.5]
+    rates['high'] = [2.0, 3.0, 4.0]
+    rates['low'] = [1.0, 2.0, 3.0]
+    rates['close'] = [1.75, 2.75, 3.75]
+    rates['tick_volume'] = [10, 20, 30]
+    data = Mt5Api(backend=SyntheticBackend(seed=1)).parse_rates(rates)
+    np.testing.assert_array_equal(data.epoch, [epoch('2024-03-08 21:00'), epoch('2024-03-10 22:00'), epoch('2024-03-10 22:01')])
+    assert data.epoch.dtype == np.int64
+    for key in ['open', 'high', 'low', 'close']:
+        assert data[key].dtype == np.float64
+        np.testing.assert_array_equal(data[key], rates[key])
+    assert data['tick_volume'].dtype == np.int64
+    np.testing.assert_array_equal(data['tick_volume'], [10, 20, 30])
+    assert [str(t) for t in data['jst']] == ['2024-03-09 06:00:00+09:00', '2024-03-11 07:00:00+09:00', '2024-03-11 07:01:00+09:00']
+    assert data['time'][0] == pd.Timestamp('2024-03-08 21:00', tz='utc')
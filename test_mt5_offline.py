@@ -0,0 +1,28 @@
+import numpy as np
+from mt5_api import Mt5Api, TimeFrame, RATE_DTYPE, TICK_DTYPE
+from mt5_offline import SyntheticBackend, ReplayBackend, save_history
+
+
+# History recorded with save_history and replayed by ReplayBackend, as
+# .npy and .csv files.
+
+def test_replay_round_trips_rates_and_ticks(tmp_path):
+    source = SyntheticBackend(seed=2)
+    rates = source.copy_rates_from_pos('NIKKEI', TimeFrame.M1, 0, 500)
+    ticks = source.copy_ticks_range('NIKKEI', source.clock - 3600, source.clock + 1)
+    assert len(ticks) > 0
+    for csv in [False, True]:
+        directory = str(tmp_path / ('csv' if csv else 'npy'))
+        save_history(directory, 'NIKKEI', TimeFrame.M1, rates, csv=csv)
+        save_history(directory, 'NIKKEI', TimeFrame.TICK, ticks, csv=csv)
+        backend = ReplayBackend(directory)
+        replayed = backend.copy_rates_from_pos('NIKKEI', TimeFrame.M1, 0, 500)
+        assert replayed.dtype == RATE_DTYPE
+        np.testing.assert_array_equal(replayed, rates)
+        replayed = backend.copy_ticks_range('NIKKEI', source.clock - 3600, source.clock + 1)
+        assert replayed.dtype == TICK_DTYPE
+        np.testing.assert_array_equal(replayed, ticks)
+        # through the api as TickBars reads them
+        got = Mt5Api(backend=backend).get_ticks('NIKKEI', source.clock - 3600, end=source.clock + 1)
+        np.testing.assert_array_equal(got['time_msc'], ticks['time_msc'])
+        np.testing.assert_array_equal(got['bid'], ticks['bid'])
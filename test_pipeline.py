@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+import technical
+from common import Indicators
+from mt5_api import Mt5Api
+from mt5_offline import SyntheticBackend
+from pipeline import Pipeline, NODES
+
+pytestmark = pytest.mark.filterwarnings('ignore::RuntimeWarning')
+
+
+# Pipeline nodes against the technical functions on the same bars, and the
+# nodes its cache lets it skip.
+
+PARAM = {'vwap_begin_hour_list': [8, 16, 20],
+         'pivot_threshold': 0.6,
+         'pivot_left_len': 4,
+         'pivot_center_len': 4,
+         'pivot_right_len': 4,
+         'atr_window': 50,
+         'atr_multiply': 2.0,
+         'peak_hold_term': 10,
+         'di_window': 14,
+         'adx_term': 14,
+         'supertrend_multiply': 2.0}
+OUTPUTS = [name for node in NODES for name in node.outputs if not name.startswith('_')]
+
+
+def bars(size, seed=1):
+    return Mt5Api(backend=SyntheticBackend(seed=seed)).get_rates('NIKKEI', 'M1', size)
+
+
+def test_nodes_match_technical():
+    data = bars(5000)
+    reference = data.copy()
+    technical.VWAP(reference, PARAM['vwap_begin_hour_list'], PARAM['pivot_threshold'], PARAM['pivot_left_len'], PARAM['pivot_center_len'], PARAM['pivot_right_len'])
+    technical.ATR_TRAIL(reference, PARAM['atr_window'], PARAM['atr_multiply'], PARAM['peak_hold_term'])
+    technical.ADX(reference, PARAM['di_window'], PARAM['adx_term'], None)
+    technical.POLARITY(reference, PARAM['di_window'])
+    technical.SUPERTREND(reference, PARAM['supertrend_multiply'])
+    Pipeline().compute(('NIKKEI', 'M1'), data, OUTPUTS, PARAM)
+    for name in OUTPUTS:
+        assert name in reference, name
+        np.testing.assert_array_equal(np.asarray(data[name], dtype=float), np.asarray(reference[name], dtype=float), err_msg=name)
+    assert np.nansum(np.abs(data[Indicators.VWAP_SIGNAL])) > 0
+
+def test_only_stale_nodes_run():
+    data = bars(3000)
+    pipeline = Pipeline()
+    # TR and the directional movement once for ATR, ADX and POLARITY
+    pipeline.compute(('NIKKEI', 'M1'), data, [Indicators.ATR, Indicators.ADX, Indicators.POLARITY], PARAM)
+    assert pipeline.computed == len(['TR', 'ATR', 'DM', 'DI', 'DX', 'ADX', 'POLARITY'])
+    pipeline.compute(('NIKKEI', 'M1'), data, [Indicators.ATR_TRAIL, Indicators.POLARITY], PARAM)
+    assert pipeline.computed == 8
+    # a new pivot threshold reruns the pivot only
+    pipeline.compute(('NIKKEI', 'M1'), data, [Indicators.VWAP_SIGNAL, Indicators.VWAP_UPPER + '1'], PARAM)
+    computed = pipeline.computed
+    param = dict(PARAM)
+    param['pivot_threshold'] = 0.8
+    pipeline.compute(('NIKKEI', 'M1'), data, [Indicators.VWAP_SIGNAL, Indicators.VWAP_UPPER + '1'], param)
+    assert pipeline.computed == computed + 1
+    expected = data.copy()
+    Pipeline().compute(('NIKKEI', 'M1'), expected, [Indicators.VWAP_SIGNAL], param)
+    np.testing.assert_array_equal(data[Indicators.VWAP_SIGNAL], expected[Indicators.VWAP_SIGNAL])
+    # a new bar reruns everything
+    computed = pipeline.computed
+    pipeline.compute(('NIKKEI', 'M1'), bars(3001), [Indicators.ATR], PARAM)
+    assert pipeline.computed == computed + 2
+
+def test_cache_keeps_the_last_entries():
+    data = bars(1000)
+    pipeline = Pipeline(max_entries=4)
+
+    def compute(symbol):
+        # TR and ATR, 2 entries
+        pipeline.compute((symbol, 'M1'), data, [Indicators.ATR], PARAM)
+        return [key[0][0] for key in pipeline.cache.keys()]
+
+    assert compute('A') == ['A', 'A']
+    assert compute('B') == ['A', 'A', 'B', 'B']
+    assert pipeline.computed == 4
+    # a hit moves the entries to the end
+    assert compute('A') == ['B', 'B', 'A', 'A']
+    assert pipeline.computed == 4
+    # the least recently used go first, and run again when asked for
+    assert compute('C') == ['A', 'A', 'C', 'C']
+    assert pipeline.computed == 6
+    assert compute('B') == ['C', 'C', 'B', 'B']
+    assert pipeline.computed == 8
@@ -0,0 +1,101 @@
+import time
+import threading
+import numpy as np
+import pytest
+from bar_frame import BarFrame
+from poller import Poller, frozen
+
+
+# Poller with a load function counting its calls.
+
+class Load:
+    def __init__(self):
+        self.calls = []
+        self.fail = False
+
+    def __call__(self):
+        self.calls.append(threading.current_thread())
+        if self.fail:
+            raise Exception('terminal error')
+        return len(self.calls)
+
+
+def test_first_get_loads_in_the_caller():
+    load = Load()
+    poller = Poller(60.0, 60.0)
+    try:
+        first = poller.get('job', load)
+        assert first.value == 1
+        assert load.calls == [threading.current_thread()]
+        # the next gets return the snapshot
+        for i in range(3):
+            assert poller.get('job', load) is first
+        assert len(load.calls) == 1
+        assert poller.running()
+        # the poller reloads it
+        poller.poll()
+        assert poller.get('job', load).value == 2
+    finally:
+        poller.stop()
+
+def test_poll_drops_expired_jobs():
+    load = Load()
+    other = Load()
+    poller = Poller(60.0, 0.2)
+    try:
+        poller.get('old', load)
+        time.sleep(0.3)
+        poller.get('new', other)
+        poller.poll()
+        assert len(load.calls) == 1
+        assert len(other.calls) == 2
+        assert list(poller.jobs.keys()) == ['new']
+        assert list(poller.snapshots.keys()) == ['new']
+        # an expired job loads again in the caller
+        assert poller.get('old', load).value == 2
+    finally:
+        poller.stop()
+
+def test_failing_load_keeps_the_snapshot():
+    load = Load()
+    poller = Poller(60.0, 60.0)
+    try:
+        first = poller.get('job', load)
+        load.fail = True
+        poller.poll()
+        assert len(load.calls) == 2
+        assert poller.get('job', load) is first
+    finally:
+        poller.stop()
+
+def test_stopped_poller_reloads_stale_snapshots():
+    load = Load()
+    poller = Poller(0.5, 60.0)
+    first = poller.get('job', load)
+    poller.stop()
+    assert not poller.running()
+    # fresh snapshots are returned, stale ones reloaded in the caller
+    assert poller.get('job', load) is first
+    time.sleep(0.6)
+    calls = len(load.calls)
+    snapshot = poller.get('job', load)
+    assert len(load.calls) == calls + 1
+    assert load.calls[-1] is threading.current_thread()
+    assert snapshot.value == calls + 1
+    assert not poller.running()
+
+def test_snapshots_are_read_only():
+    def load():
+        return frozen(BarFrame([60, 120], {'close': [1.0, 2.0], 'VWAP': [np.nan, 1.5]}))
+
+    poller = Poller(60.0, 60.0)
+    try:
+        data = poller.get('job', load).value
+        for array in [data.epoch, data['close'], data['VWAP']]:
+            assert not array.flags.writeable
+        with pytest.raises(ValueError):
+            data['close'][0] = 3.0
+        with pytest.raises(ValueError):
+            data.slice_last(1)['VWAP'][0] = 3.0
+    finally:
+        poller.stop()
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+import sweep
+import technical
+from common import Indicators, Columns
+from mt5_api import Mt5Api
+from mt5_offline import SyntheticBackend
+
+pytestmark = pytest.mark.filterwarnings('ignore::RuntimeWarning')
+
+
+# Each row of the sweep tables against the technical function run with
+# that combination, in this process and in a process pool.
+
+def assert_row(row, expected, columns):
+    for column in columns:
+        a = float(row[column])
+        b = float(expected[column])
+        assert (np.isnan(a) and np.isnan(b)) or a == b, (column, a, b)
+
+def test_rows_match_direct_runs():
+    data = Mt5Api(backend=SyntheticBackend(seed=2)).get_rates('NIKKEI', 'M1', 6000)
+    close = np.asarray(data[Columns.CLOSE])
+    vwap_grid = {'vwap_begin_hour_list': [[8, 16, 20], [8]], 'pivot_threshold': [0.4, 0.8],
+                 'pivot_left_len': [3, 4], 'pivot_center_len': [4], 'pivot_right_len': [2]}
+    atr_grid = {'atr_window': [20, 50], 'atr_multiply': [1.0, 2.0], 'peak_hold_term': [10, 20]}
+    for workers in [0, 2]:
+        table = sweep.sweep_vwap_pivot(data, vwap_grid, horizon=10, workers=workers)
+        assert len(table) == 8
+        for _, row in table.iterrows():
+            frame = data.copy()
+            technical.VWAP(frame, row['vwap_begin_hour_list'], row['pivot_threshold'], row['pivot_left_len'], row['pivot_center_len'], row['pivot_right_len'])
+            assert_row(row, sweep.signal_stats(frame[Indicators.VWAP_SIGNAL], close, 10), ['long', 'short', 'mean', 'std', 'win_rate'])
+        assert table['long'].sum() > 0
+        table = sweep.sweep_atr_trail(data, atr_grid, workers=workers)
+        assert len(table) == 8
+        for _, row in table.iterrows():
+            frame = data.copy()
+            technical.ATR_TRAIL(frame, row['atr_window'], row['atr_multiply'], row['peak_hold_term'])
+            assert_row(row, sweep.trend_stats(frame[Indicators.ATR_TRAIL_TREND], close), ['changes', 'up_ratio', 'profit'])
+        # nothing stays pinned after the call
+        assert sweep.shared == {}
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+import technical
+import technical_batch
+from mt5_api import Mt5Api
+from mt5_offline import SyntheticBackend
+
+
+# Each row of the (symbols x bars) matrices against the technical functions
+# run on that symbol alone.
+
+SYMBOLS = ['NIKKEI', 'DOW', 'NSDQ', 'USDJPY', 'A', 'B']
+HOURS = [[8, 16, 20], [8, 16, 20], [8, 16, 20], [8], [9], [0, 12]]
+
+pytestmark = pytest.mark.filterwarnings('ignore::RuntimeWarning')
+
+
+def test_rows_match_single_series():
+    api = Mt5Api(backend=SyntheticBackend(seed=4))
+    frames = [api.get_rates(symbol, 'M1', 3000) for symbol in SYMBOLS]
+    data = technical_batch.stack(frames)
+    technical_batch.VWAP(data, HOURS, 0.6, 4, 4, 4)
+    technical_batch.BB(data, 20, 20, 2.0)
+    technical_batch.ATR_TRAIL(data, 50, 2.0, 10)
+    technical_batch.ATR(data, 14, 100)
+    technical_batch.ADX(data, 14, 14, 100)
+    technical_batch.POLARITY(data, 14)
+    for i, frame in enumerate(frames):
+        single = frame.copy()
+        technical.VWAP(single, HOURS[i], 0.6, 4, 4, 4)
+        technical.BB(single, 20, 20, 2.0)
+        technical.ATR_TRAIL(single, 50, 2.0, 10)
+        technical.ATR(single, 14, 100)
+        technical.ADX(single, 14, 14, 100)
+        technical.POLARITY(single, 14)
+        row = technical_batch.row(data, i)
+        assert len(single.indicators) > 0
+        for key in single.indicators:
+            np.testing.assert_array_equal(np.asarray(row[key], dtype=float), np.asarray(single[key], dtype=float), err_msg=SYMBOLS[i] + ' ' + key)
+    assert np.nansum(np.abs(data['VWAP_SIGNAL'])) > 0
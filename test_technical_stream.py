@@ -0,0 +1,78 @@
+import copy
+import numpy as np
+import pytest
+import technical
+from data_buffer import DataBuffer
+from technical_stream import AtrStream, AdxStream, AtrTrailStream, SupertrendStream, VwapStream
+from test_technical import random_bars, assert_same
+
+pytestmark = pytest.mark.filterwarnings('ignore::RuntimeWarning')
+
+
+# Streams fed bar by bar (with a forming last bar) against the technical
+# functions run once over the whole history.
+
+def bars(data, begin, end):
+    return {key: list(value[begin: end]) for key, value in data.items()}
+
+def forming(data, i):
+    # bar i before it closes
+    bar = bars(data, i, i + 1)
+    bar['close'][0] = (bar['close'][0] + bar['open'][0]) / 2
+    bar['high'][0] = max(bar['open'][0], bar['close'][0]) + 1
+    bar['low'][0] = min(bar['open'][0], bar['close'][0]) - 1
+    bar['tick_volume'][0] = max(1, bar['tick_volume'][0] // 2)
+    return bar
+
+def join(a, b):
+    return {key: a[key] + b[key] for key in a.keys()}
+
+def feed(history, buffers, streams, start):
+    rng = np.random.default_rng(0)
+    n = len(history['close'])
+    i = start
+    while i < n:
+        k = min(int(rng.integers(1, 4)), n - i)
+        # the last known bar closed, k new bars, the last one forming
+        data = join(bars(history, i - 1, i + k - 1), forming(history, i + k - 1))
+        for buffer, buffer_streams in zip(buffers, streams):
+            buffer.update(copy.deepcopy(data))
+            for stream in buffer_streams:
+                stream.update(buffer)
+        i += k
+    for buffer, buffer_streams in zip(buffers, streams):
+        buffer.update(bars(history, n - 2, n))
+        for stream in buffer_streams:
+            stream.update(buffer)
+
+
+def test_streams_match_full_computation():
+    n, size = 2600, 1500
+    history = random_bars(n, 5)
+    buffer = DataBuffer('time')
+    buffer.initilize(bars(history, 0, size))
+    streams = [AtrStream(14, 100), AdxStream(14, 14, 100), SupertrendStream(2.0), VwapStream([8, 16, 20], 0.6, 4, 4, 4)]
+    # ATR_TRAIL writes ATR with its own window
+    trail_buffer = DataBuffer('time')
+    trail_buffer.initilize(bars(history, 0, size))
+    trail_streams = [AtrTrailStream(50, 2.0, 10)]
+    for stream in streams:
+        stream.initialize(buffer)
+    for stream in trail_streams:
+        stream.initialize(trail_buffer)
+    feed(history, [buffer, trail_buffer], [streams, trail_streams], size)
+
+    full = copy.deepcopy(history)
+    technical.ATR(full, 14, 100)
+    technical.ADX(full, 14, 14, 100)
+    technical.SUPERTREND(full, 2.0)
+    technical.VWAP(full, [8, 16, 20], 0.6, 4, 4, 4)
+    trail_full = copy.deepcopy(history)
+    technical.ATR_TRAIL(trail_full, 50, 2.0, 10)
+    assert buffer.arrays['time'][-1] == history['time'][-1]
+    for reference, target, target_streams in [(full, buffer, streams), (trail_full, trail_buffer, trail_streams)]:
+        for stream in target_streams:
+            for key in stream.outputs:
+                if key in reference:
+                    assert_same(target.arrays[key], np.asarray(reference[key], dtype=float)[-size:], key, rtol=1e-9)
+    assert np.nansum(np.abs(buffer.arrays['VWAP_SIGNAL'])) > 0
@@ -0,0 +1,85 @@
+import numpy as np
+from mt5_api import Mt5Api, TimeFrame, TICK_DTYPE
+from mt5_offline import SyntheticBackend, ReplayBackend, save_history
+from tick_bars import TickBars, TIMEFRAMES, START, aggregate
+
+KEYS = ['open', 'high', 'low', 'close', 'tick_volume', 'bid', 'ask']
+
+
+# Bars built from ticks in batches against the same ticks in one batch and
+# a direct aggregation per timeframe.
+
+def ticks_with_repeated_msc(n, seed):
+    rng = np.random.default_rng(seed)
+    ticks = np.zeros(n, dtype=TICK_DTYPE)
+    # several ticks share a millisecond
+    ticks['time_msc'] = 1717408800000 + np.cumsum(rng.integers(0, 3, n)) * 7
+    ticks['time'] = ticks['time_msc'] // 1000
+    ticks['bid'] = 30000 + np.cumsum(rng.normal(0, 1, n))
+    ticks['ask'] = ticks['bid'] + 5
+    return ticks
+
+def assert_same_bars(a, b):
+    for timeframe in TIMEFRAMES:
+        x = a.frame(timeframe)
+        y = b.frame(timeframe)
+        np.testing.assert_array_equal(x.epoch, y.epoch)
+        for key in KEYS:
+            np.testing.assert_array_equal(x[key], y[key], err_msg=timeframe + ' ' + key)
+
+
+def test_batches_match_one_batch():
+    ticks = ticks_with_repeated_msc(20000, 1)
+    one = TickBars()
+    one.add(ticks)
+    assert one.frame(TimeFrame.M1)['tick_volume'].sum() == len(ticks)
+    # batches ending anywhere, each read again from the second of the last
+    # tick added as update() does
+    rng = np.random.default_rng(2)
+    many = TickBars()
+    seconds = ticks['time_msc'] // 1000
+    position = 0
+    while position < len(ticks):
+        end = min(position + int(rng.integers(1, 500)), len(ticks))
+        begin = 0 if position == 0 else int(np.searchsorted(seconds, seconds[position - 1]))
+        many.add(ticks[begin: end])
+        position = end
+    assert_same_bars(one, many)
+
+def test_bars_match_direct_aggregation():
+    backend = SyntheticBackend(seed=4)
+    api = Mt5Api(backend=backend)
+    begin = backend.clock - 3 * 24 * 3600
+    ticks = api.get_ticks('NIKKEI', begin, end=backend.clock + 1)
+    bars = TickBars()
+    bars.update(api, 'NIKKEI', begin, count=5000)
+    for timeframe in TIMEFRAMES:
+        direct = aggregate({START: ticks['time_msc'] // 1000,
+                            'open': ticks['bid'],
+                            'high': ticks['bid'],
+                            'low': ticks['bid'],
+                            'close': ticks['bid'],
+                            'tick_volume': np.ones(len(ticks), dtype=np.int64),
+                            'bid': ticks['bid'],
+                            'ask': ticks['ask']}, TimeFrame.seconds(timeframe))
+        frame = bars.frame(timeframe)
+        for key in KEYS:
+            np.testing.assert_array_equal(frame[key], direct[key], err_msg=timeframe + ' ' + key)
+
+def test_update_reads_seconds_with_more_ticks_than_count(tmp_path):
+    ticks = ticks_with_repeated_msc(3000, 3)
+    # 200 ticks in one second, more than a batch
+    second = ticks['time'][1000]
+    busy = np.zeros(200, dtype=TICK_DTYPE)
+    busy['time'] = second
+    busy['time_msc'] = second * 1000 + np.arange(200) * 5
+    busy['bid'] = 30000 + np.arange(200)
+    busy['ask'] = busy['bid'] + 5
+    ticks = np.concatenate([ticks[ticks['time'] < second], busy, ticks[ticks['time'] > second]])
+    save_history(str(tmp_path), 'NIKKEI', TimeFrame.TICK, ticks)
+    api = Mt5Api(backend=ReplayBackend(str(tmp_path)))
+    many = TickBars()
+    assert many.update(api, 'NIKKEI', int(ticks['time'][0]), count=50) == len(ticks)
+    one = TickBars()
+    one.add(ticks)
+    assert_same_bars(one, many)
@@ -0,0 +1,192 @@
+import threading
+import numpy as np
+from common import Columns
+from bar_frame import BarFrame
+from mt5_api import TimeFrame, server_to_utc
+
+
+# Bars of several timeframes built from ticks as they arrive. Each batch
+# of ticks is reduced once into M1 bars, and those M1 bars are folded into
+# M5 ... D1. Bars start on server time boundaries like the bars MT5 serves
+# (D1 at server midnight). OHLC follow the bid by default (as MT5 rates),
+# bid and ask columns hold the last quote of each bar, tick_volume counts
+# the ticks. The forming bar of every timeframe moves with each batch, so
+# it is as fresh as the last tick.
+#
+#   bars = TickBars()
+#   bars.update(api, 'NIKKEI', begin)               # ticks from begin (server time)
+#   bars.update(api, 'NIKKEI')                      # ticks after the last one
+#   bars.frame(TimeFrame.M5)                        # BarFrame, forming bar last
+#   bars.last_bar(TimeFrame.H1)
+
+TIMEFRAMES = [TimeFrame.M1, TimeFrame.M5, TimeFrame.M15, TimeFrame.M30, TimeFrame.H1, TimeFrame.H4, TimeFrame.D1]
+START = 'start'
+BAR_KEYS = [START, Columns.OPEN, Columns.HIGH, Columns.LOW, Columns.CLOSE, Columns.VOLUME, Columns.BID, Columns.ASK]
+
+
+def aggregate(bars: dict, seconds: int):
+    # bars (START sorted) into bars of the timeframe starting at the
+    # multiples of seconds
+    ids = bars[START] // seconds
+    n = len(ids)
+    first = np.flatnonzero(np.diff(ids, prepend=ids[0] - 1) != 0)
+    last = np.append(first[1:], n) - 1
+    return {START: ids[first] * seconds,
+            Columns.OPEN: bars[Columns.OPEN][first],
+            Columns.HIGH: np.maximum.reduceat(bars[Columns.HIGH], first),
+            Columns.LOW: np.minimum.reduceat(bars[Columns.LOW], first),
+            Columns.CLOSE: bars[Columns.CLOSE][last],
+            Columns.VOLUME: np.add.reduceat(bars[Columns.VOLUME], first),
+            Columns.BID: bars[Columns.BID][last],
+            Columns.ASK: bars[Columns.ASK][last]}
+
+def concat_bars(bars_list):
+    return {key: np.concatenate([bars[key] for bars in bars_list]) for key in BAR_KEYS}
+
+def take(bars: dict, begin: int, end: int):
+    return {key: value[begin: end] for key, value in bars.items()}
+
+
+class BarSeries:
+    # closed bars of one timeframe and the forming one (1 bar dict)
+    def __init__(self, seconds: int):
+        self.seconds = seconds
+        self.closed = []
+        self.live = None
+
+    def add(self, bars: dict):
+        if self.live is not None:
+            bars = concat_bars([self.live, bars])
+        bars = aggregate(bars, self.seconds)
+        n = len(bars[START])
+        if n > 1:
+            self.closed.append(take(bars, 0, n - 1))
+        self.live = take(bars, n - 1, n)
+
+    def bars(self):
+        chunks = self.closed
+        if len(chunks) > 1:
+            self.closed = chunks = [concat_bars(chunks)]
+        if self.live is not None:
+            chunks = chunks + [self.live]
+        if len(chunks) == 0:
+            return None
+        return concat_bars(chunks)
+
+
+class TickBars:
+    def __init__(self, timeframes=TIMEFRAMES, price=Columns.BID):
+        # price: the quote OHLC follow, Columns.BID, Columns.ASK or Columns.MID
+        self.series = {timeframe: BarSeries(TimeFrame.seconds(timeframe)) for timeframe in timeframes}
+        self.price = price
+        self.last_msc = None
+        # ticks at last_msc already added, MT5 stamps several ticks with
+        # the same millisecond and a batch can end between them
+        self.last_count = 0
+        self.lock = threading.Lock()
+
+    def add(self, ticks):
+        # ticks: TICK_DTYPE array (server time), ticks before the last one
+        # added are skipped, of the ticks at its millisecond the ones
+        # already added
+        time_msc = np.asarray(ticks['time_msc'], dtype=np.int64)
+        bid = np.asarray(ticks['bid'], dtype=np.float64)
+        ask = np.asarray(ticks['ask'], dtype=np.float64)
+        if self.last_msc is not None:
+            new = time_msc > self.last_msc
+            new[np.flatnonzero(time_msc == self.last_msc)[self.last_count:]] = True
+            time_msc = time_msc[new]
+            bid = bid[new]
+            ask = ask[new]
+        if len(time_msc) == 0:
+            return 0
+        if self.price == Columns.BID:
+            price = bid
+        elif self.price == Columns.ASK:
+            price = ask
+        else:
+            price = (bid + ask) / 2
+        ones = np.ones(len(price), dtype=np.int64)
+        m1 = aggregate({START: time_msc // 1000,
+                        Columns.OPEN: price,
+                        Columns.HIGH: price,
+                        Columns.LOW: price,
+                        Columns.CLOSE: price,
+                        Columns.VOLUME: ones,
+                        Columns.BID: bid,
+                        Columns.ASK: ask}, 60)
+        with self.lock:
+            for series in self.series.values():
+                series.add(m1)
+            last = int(time_msc[-1])
+            count = int(np.count_nonzero(time_msc == last))
+            if last == self.last_msc:
+                self.last_count += count
+            else:
+                self.last_count = count
+            self.last_msc = last
+        return len(time_msc)
+
+    def update(self, api, symbol: str, begin=None, count=100000):
+        # ticks after the last one added (from begin, server time epoch
+        # seconds, on the first call)
+        if self.last_msc is not None:
+            begin = self.last_msc // 1000
+        if begin is None:
+            raise Exception('begin is needed on the first update')
+        total = 0
+        while True:
+            ticks = api.get_ticks(symbol, begin, count=count)
+            added = self.add(ticks)
+            total += added
+            if len(ticks) < count:
+                return total
+            if added == 0:
+                # one second holds count ticks or more, read it whole and
+                # go on after it
+                total += self.add(api.get_ticks(symbol, begin, end=begin + 1))
+                begin += 1
+            else:
+                begin = self.last_msc // 1000
+
+    def frame(self, timeframe: str):
+        # bars as a BarFrame (utc epoch), the forming bar last
+        with self.lock:
+            bars = self.series[timeframe].bars()
+        if bars is None:
+            return BarFrame(np.zeros(0, dtype=np.int64))
+        columns = {key: bars[key] for key in BAR_KEYS if key != START}
+        return BarFrame(server_to_utc(bars[START]), columns)
+
+    def last_bar(self, timeframe: str):
+        # the forming bar, START is server time
+        with self.lock:
+            live = self.series[timeframe].live
+        if live is None:
+            return None
+        return {key: value[0] for key, value in live.items()}
+
+
+def test():
+    import time
+    from mt5_api import Mt5Api
+    from mt5_offline import SyntheticBackend
+
+    backend = SyntheticBackend(seed=1)
+    api = Mt5Api(backend=backend)
+    bars = TickBars()
+    t0 = time.time()
+    count = bars.update(api, 'NIKKEI', backend.clock - 5 * 24 * 60 * 60)
+    print('ticks', count, 'Elapsed Time:', time.time() - t0)
+    for i in range(3):
+        backend.advance(20)
+        t0 = time.time()
+        count = bars.update(api, 'NIKKEI')
+        print('ticks', count, bars.last_bar(TimeFrame.M1), 'Elapsed Time:', time.time() - t0)
+    for timeframe in TIMEFRAMES:
+        frame = bars.frame(timeframe)
+        print(timeframe, frame.size, frame['jst'][-1])
+
+
+if __name__ == '__main__':
+    test()